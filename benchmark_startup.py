@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RW Tech PPTX Generator - Startup Benchmark
+Замер времени запуска генератора: -X importtime и время --help / --dry-run
+
+Использование:
+    python benchmark_startup.py                    # отчет и проверка бюджета 100 мс
+    python benchmark_startup.py --budget-ms 150    # другой бюджет
+    python benchmark_startup.py --output startup_history.jsonl  # дописать результат в историю
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE = "rwtech_pptx_generator"
+
+# Замеряемые вызовы: подробный вывод не нужен, важно только время до выхода
+COMMANDS = {
+    "help": ["-m", MODULE, "--help"],
+    "dry-run": ["-m", MODULE, "--dry-run", "--no-ai",
+                "--content", os.path.join(SCRIPT_DIR, "pptx_content", "slide_content.txt"),
+                "--template", os.path.join(SCRIPT_DIR, "pptx_template", "Шаблон презентации 16х9.pptx")],
+}
+
+
+def parse_importtime(stderr):
+    """Разбор вывода -X importtime: [(модуль, self_us, cumulative_us, глубина)] в порядке вывода"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_part, cumulative_part, name_part = line[len("import time:"):].split("|")
+            self_us, cumulative_us = int(self_part), int(cumulative_part)
+        except ValueError:
+            continue  # строка заголовка
+        depth = (len(name_part) - len(name_part.lstrip()) - 1) // 2
+        modules.append((name_part.strip(), self_us, cumulative_us, depth))
+    return modules
+
+
+def module_imports(modules):
+    """Импорты, выполненные самим модулем генератора (site и прочее окружение отбрасываются)"""
+    children = []
+    for name, self_us, cumulative_us, depth in modules:
+        if depth == 0:
+            if name == MODULE:
+                return (self_us, cumulative_us), children
+            children = []  # дочерние модули печатаются перед родителем
+        elif depth == 1:
+            children.append((name, cumulative_us))
+    return (0, 0), []
+
+
+def measure_import(python):
+    """Время импорта модуля генератора по -X importtime"""
+    # Прогрев: первый запуск создает __pycache__ и не показателен
+    subprocess.run([python, "-c", f"import {MODULE}"], cwd=SCRIPT_DIR, capture_output=True)
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {MODULE}"],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"импорт {MODULE} завершился с ошибкой:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def measure_command(python, args, repeats):
+    """Медиана времени выполнения команды в отдельном процессе, мс"""
+    # Временный рабочий каталог: логи пробного запуска не попадают в репозиторий
+    env = dict(os.environ, PYTHONPATH=SCRIPT_DIR)
+    timings = []
+    with tempfile.TemporaryDirectory(prefix="rwtech_startup_") as workdir:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            subprocess.run([python] + args, cwd=workdir, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска RW Tech PPTX Generator")
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help="бюджет времени запуска для --help и --dry-run, мс (по умолчанию: 100)")
+    parser.add_argument('--repeats', type=int, default=7,
+                        help="число запусков каждой команды (по умолчанию: 7)")
+    parser.add_argument('--top', type=int, default=10,
+                        help="сколько самых тяжелых импортов показать (по умолчанию: 10)")
+    parser.add_argument('--output', metavar='FILE',
+                        help="дописать результат JSON-строкой в файл истории")
+    args = parser.parse_args()
+
+    python = sys.executable
+    (module_self, module_total), children = module_imports(measure_import(python))
+
+    print(f"⏱️  Импорт {MODULE}: {module_total / 1000:.1f} мс (собственный код: {module_self / 1000:.1f} мс)")
+    print("📦 Самые тяжелые импорты модуля (cumulative):")
+    top_level = sorted(children, key=lambda item: item[1], reverse=True)
+    for name, cumulative in top_level[:args.top]:
+        print(f"   {cumulative / 1000:8.1f} мс  {name}")
+
+    baseline = measure_command(python, ["-c", "pass"], args.repeats)
+    print(f"🐍 Пустой интерпретатор: {baseline:.0f} мс")
+
+    timings = {}
+    over_budget = []
+    for label, command in COMMANDS.items():
+        timings[label] = measure_command(python, command, args.repeats)
+        status = "✅" if timings[label] <= args.budget_ms else "❌"
+        if timings[label] > args.budget_ms:
+            over_budget.append(label)
+        print(f"{status} {label}: {timings[label]:.0f} мс (бюджет {args.budget_ms:.0f} мс)")
+
+    if args.output:
+        record = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'import_ms': round(module_total / 1000, 1),
+            'baseline_ms': round(baseline, 1),
+            'timings_ms': {label: round(value, 1) for label, value in timings.items()},
+            'budget_ms': args.budget_ms,
+            'top_imports': {name: round(cumulative / 1000, 1) for name, cumulative in top_level[:args.top]},
+        }
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"💾 Результат добавлен в {args.output}")
+
+    if over_budget:
+        print(f"⚠️  Превышен бюджет запуска: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RW Tech PPTX Generator - Mock Provider Server
+Локальная замена API Anthropic, OpenAI и Google для офлайн-бенчмарков и тестов
+
+Эндпоинты:
+    POST /v1/messages                      - Claude Messages API
+    GET  /v1/models                        - список моделей OpenAI (проверка ключа)
+    POST /v1/images/generations            - DALL-E 3 / GPT-Image-1 (b64_json)
+    GET  /v1beta/models                    - список моделей Gemini (проверка ключа)
+    POST /v1beta/models/<model>:predict    - Imagen 3
+    GET  /stats, POST /stats/reset         - счетчики запросов по провайдерам
+
+Использование:
+    python mock_provider_server.py --port 8765 --latency openai=lognormal:8:0.3 \\
+        --error-rate 0.02 --burst openai=20:3:2 --rpm anthropic=50
+    python -m rwtech_pptx_generator --ai --api-base-url http://127.0.0.1:8765
+
+Любой непустой ключ API считается действительным.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+PROVIDERS = ('anthropic', 'openai', 'google')
+
+# Размер изображения по параметру size (OpenAI) или aspect_ratio (Imagen)
+IMAGE_SIZES = {
+    '1792x1024': (1792, 1024),
+    '1536x1024': (1536, 1024),
+    '1024x1024': (1024, 1024),
+    '16:9': (1408, 768),
+    '1:1': (1024, 1024),
+}
+DEFAULT_IMAGE_SIZE = (1792, 1024)
+
+
+class LatencyModel:
+    """Распределение задержки ответа, секунды
+
+    fixed:S, uniform:A:B, normal:MU:SIGMA, lognormal:MEDIAN:SIGMA (SIGMA - в логарифмах)
+    """
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+
+    def __init__(self, spec='fixed:0'):
+        kind, *params = str(spec).split(':')
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"неизвестное распределение задержки: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(param) for param in params]
+
+    def sample(self, rng):
+        """Случайная задержка (не меньше нуля)"""
+        if self.kind == 'fixed':
+            value = self.params[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(*self.params)
+        elif self.kind == 'normal':
+            value = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return max(0.0, value)
+
+
+class ProviderBehavior:
+    """Поведение одного провайдера: задержка, доля ошибок, всплески 429 и лимит запросов в минуту"""
+
+    def __init__(self, latency='fixed:0', error_rate=0.0, burst_every=0, burst_length=0,
+                 retry_after=1.0, requests_per_minute=None):
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency)
+        self.error_rate = float(error_rate)
+        self.burst_every = int(burst_every)
+        self.burst_length = int(burst_length)
+        self.retry_after = float(retry_after)
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._count = 0
+        self._window = deque()  # время принятых запросов за последнюю минуту
+
+    def decide(self, rng):
+        """Исход очередного запроса: (HTTP-статус, задержка, заголовки лимитов)"""
+        with self._lock:
+            self._count += 1
+            count = self._count
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+
+            limits = {}
+            if self.requests_per_minute:
+                if len(self._window) >= self.requests_per_minute:
+                    reset = 60 - (now - self._window[0])
+                    return 429, 0.0, {'remaining': 0, 'reset': reset, 'retry_after': reset}
+                self._window.append(now)
+                limits = {'remaining': self.requests_per_minute - len(self._window),
+                          'reset': 60 - (now - self._window[0])}
+
+            # Всплеск 429: запросы [k*every, k*every + length) для k >= 1
+            if self.burst_every and count >= self.burst_every and count % self.burst_every < self.burst_length:
+                return 429, 0.0, dict(limits, retry_after=self.retry_after)
+
+            error = rng.random() < self.error_rate
+            latency = self.latency.sample(rng)
+        return (rng.choice((500, 503)) if error else 200), latency, limits
+
+
+class PNGPayloads:
+    """PNG-ответы заданного размера; пиксели строятся один раз на размер, каждый ответ уникален по tEXt"""
+
+    def __init__(self, image_kb=None):
+        self.image_kb = image_kb
+        self._lock = threading.Lock()
+        self._bodies = {}  # (ширина, высота) -> (заголовок и IHDR, IDAT + IEND)
+
+    @staticmethod
+    def _chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    def _build(self, width, height):
+        """Строит PNG: часть строк - шум (несжимаемые), остальные - белые"""
+        row_length = width * 3
+        # По умолчанию ~60% несжатого размера - как у типичного PNG от DALL-E 3
+        target = self.image_kb * 1024 if self.image_kb else int(row_length * height * 0.6)
+        noisy_rows = min(height, max(1, target // row_length))
+        white_row = b'\x00' + b'\xff' * row_length
+        raw = b''.join(b'\x00' + os.urandom(row_length) if y < noisy_rows else white_row for y in range(height))
+        header = b'\x89PNG\r\n\x1a\n' + self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        return header, self._chunk(b'IDAT', zlib.compress(raw, 1)) + self._chunk(b'IEND', b'')
+
+    def get(self, width, height, request_id):
+        """PNG-байты; request_id попадает в tEXt, чтобы изображения не совпадали побайтно"""
+        key = (width, height)
+        with self._lock:
+            if key not in self._bodies:
+                self._bodies[key] = self._build(width, height)
+            header, body = self._bodies[key]
+        return header + self._chunk(b'tEXt', b'Comment\x00' + request_id.encode('ascii')) + body
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """HTTP-сервер mock: обрыв соединения клиентом (таймаут, дедлайн генерации) - не ошибка"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockProviderServer:
+    """Локальный HTTP-сервер с эндпоинтами Claude, OpenAI Images и Imagen"""
+
+    def __init__(self, host='127.0.0.1', port=0, behaviors=None, image_kb=None, time_scale=1.0, seed=None):
+        self.behaviors = {provider: ProviderBehavior() for provider in PROVIDERS}
+        self.behaviors.update(behaviors or {})
+        self.payloads = PNGPayloads(image_kb)
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = MockHTTPServer((host, port), MockRequestHandler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        """Обнуляет счетчики запросов"""
+        with self._stats_lock:
+            self.stats = {provider: {'requests': 0, 'ok': 0, 'rate_limited': 0, 'errors': 0,
+                                     'bytes_sent': 0, 'latency_total': 0.0} for provider in PROVIDERS}
+
+    def record(self, provider, status, latency, size):
+        """Учитывает обработанный запрос"""
+        with self._stats_lock:
+            stats = self.stats[provider]
+            stats['requests'] += 1
+            stats['bytes_sent'] += size
+            stats['latency_total'] += latency
+            if status == 200:
+                stats['ok'] += 1
+            elif status == 429:
+                stats['rate_limited'] += 1
+            else:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        """Копия счетчиков"""
+        with self._stats_lock:
+            return {provider: dict(stats) for provider, stats in self.stats.items()}
+
+    def decide(self, provider):
+        """Исход запроса к провайдеру (один генератор случайных чисел - воспроизводимо с --seed)"""
+        with self._rng_lock:
+            status, latency, limits = self.behaviors[provider].decide(self._rng)
+        return status, latency * self.time_scale, limits
+
+    def start(self):
+        """Запускает сервер в фоновом потоке, возвращает базовый адрес"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-provider-server', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        """Останавливает сервер"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Маршрутизация запросов по эндпоинтам провайдеров"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящих API
+
+    def log_message(self, format, *args):
+        pass  # Вывод каждого запроса мешает бенчмаркам
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            return {}
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    @staticmethod
+    def _limit_headers(provider, limits):
+        """Заголовки лимитов в формате провайдера"""
+        headers = {}
+        if 'remaining' in limits:
+            reset = limits['reset']
+            if provider == 'anthropic':
+                reset_at = datetime.fromtimestamp(time.time() + reset, tz=timezone.utc)
+                headers['anthropic-ratelimit-requests-remaining'] = limits['remaining']
+                headers['anthropic-ratelimit-requests-reset'] = reset_at.isoformat().replace('+00:00', 'Z')
+            else:
+                headers['x-ratelimit-remaining-requests'] = limits['remaining']
+                headers['x-ratelimit-reset-requests'] = f"{reset:.3f}s"
+        if 'retry_after' in limits:
+            headers['Retry-After'] = f"{limits['retry_after']:.3f}"
+        return headers
+
+    def _has_key(self, provider):
+        if provider == 'anthropic':
+            return bool(self.headers.get('x-api-key'))
+        if provider == 'openai':
+            return len(self.headers.get('Authorization', '')) > len('Bearer ')
+        return bool(self.headers.get('x-goog-api-key') or 'key=' in self.path)
+
+    def _handle(self, provider, respond):
+        """Общий путь: проверка ключа, исход по поведению провайдера, задержка, ответ"""
+        request = self._read_json() if self.command == 'POST' else {}
+        if not self._has_key(provider):
+            size = self._send_json(401, {'error': {'type': 'authentication_error', 'message': 'missing API key'}})
+            self.mock.record(provider, 401, 0.0, size)
+            return
+
+        status, latency, limits = self.mock.decide(provider)
+        headers = self._limit_headers(provider, limits)
+        if status == 429:
+            size = self._send_json(429, {'error': {'type': 'rate_limit_error', 'message': 'mock rate limit'}}, headers)
+            self.mock.record(provider, 429, 0.0, size)
+            return
+
+        time.sleep(latency)
+        if status != 200:
+            size = self._send_json(status, {'error': {'type': 'api_error', 'message': 'mock server error'}}, headers)
+        else:
+            size = self._send_json(200, respond(request), headers)
+        self.mock.record(provider, status, latency, size)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/stats':
+            self._send_json(200, self.mock.snapshot())
+        elif path == '/v1/models':
+            self._handle('openai', lambda request: {
+                'object': 'list',
+                'data': [{'id': model, 'object': 'model'} for model in ('dall-e-3', 'gpt-image-1')]
+            })
+        elif path == '/v1beta/models':
+            self._handle('google', lambda request: {
+                'models': [{'name': 'models/imagen-3.0-generate-002', 'supportedGenerationMethods': ['predict']}]
+            })
+        else:
+            self._send_json(404, {'error': {'message': f'unknown endpoint {path}'}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == '/stats/reset':
+            self._read_json()
+            self.mock.reset_stats()
+            self._send_json(200, {'reset': True})
+        elif path == '/v1/messages':
+            self._handle('anthropic', self._claude_message)
+        elif path == '/v1/images/generations':
+            self._handle('openai', self._openai_image)
+        elif re.fullmatch(r'/v1beta/models/[^/:]+:predict', path):
+            self._handle('google', self._imagen_predict)
+        else:
+            self._read_json()
+            self._send_json(404, {'error': {'message': f'unknown endpoint {path}'}})
+
+    @staticmethod
+    def _request_id(request):
+        return hashlib.sha1(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def _claude_message(self, request):
+        """Ответ Claude: английский промпт, уникальный для содержимого запроса"""
+        request_id = self._request_id(request.get('messages', []))
+        text = (f"Photorealistic isometric business illustration, variant {request_id}, clean corporate "
+                f"design style, studio lighting, high quality 4K, pure white background #FFFFFF")
+        return {
+            'id': f"msg_mock_{request_id}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'mock'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': {'input_tokens': len(json.dumps(request)) // 4, 'output_tokens': len(text) // 4}
+        }
+
+    def _openai_image(self, request):
+        """Ответ OpenAI Images: PNG размера из параметра size в b64_json"""
+        width, height = IMAGE_SIZES.get(request.get('size'), DEFAULT_IMAGE_SIZE)
+        request_id = self._request_id(request)
+        image = self.mock.payloads.get(width, height, request_id)
+        response = {
+            'created': int(time.time()),
+            'data': [{'b64_json': base64.b64encode(image).decode('ascii'),
+                      'revised_prompt': request.get('prompt', '')}]
+        }
+        if request.get('model') == 'gpt-image-1':
+            response['usage'] = {'input_tokens': 50, 'output_tokens': 4160, 'total_tokens': 4210}
+        return response
+
+    def _imagen_predict(self, request):
+        """Ответ Imagen (:predict): predictions с bytesBase64Encoded"""
+        parameters = request.get('parameters', {})
+        width, height = IMAGE_SIZES.get(parameters.get('aspectRatio'), IMAGE_SIZES['16:9'])
+        count = int(parameters.get('sampleCount', 1))
+        request_id = self._request_id(request)
+        return {'predictions': [
+            {'mimeType': 'image/png',
+             'bytesBase64Encoded': base64.b64encode(
+                 self.mock.payloads.get(width, height, f"{request_id}-{index}")).decode('ascii')}
+            for index in range(count)
+        ]}
+
+
+def parse_provider_values(values, convert, option):
+    """Разбирает значения вида [PROVIDER=]VALUE: без провайдера - для всех"""
+    result = {}
+    for value in values or []:
+        provider, separator, rest = value.partition('=')
+        targets = [provider] if separator else list(PROVIDERS)
+        if separator and provider not in PROVIDERS:
+            raise ValueError(f"{option}: неизвестный провайдер {provider} (ожидается: {', '.join(PROVIDERS)})")
+        for target in targets:
+            result[target] = convert(rest if separator else value)
+    return result
+
+
+def build_behaviors(args):
+    """Поведение провайдеров из аргументов командной строки"""
+    latency = parse_provider_values(args.latency, LatencyModel, '--latency')
+    error_rate = parse_provider_values(args.error_rate, float, '--error-rate')
+    bursts = parse_provider_values(args.burst, lambda value: [float(part) for part in value.split(':')], '--burst')
+    rpm = parse_provider_values(args.rpm, int, '--rpm')
+
+    behaviors = {}
+    for provider in PROVIDERS:
+        burst = bursts.get(provider, [0, 0])
+        behaviors[provider] = ProviderBehavior(
+            latency=latency.get(provider, 'fixed:0'),
+            error_rate=error_rate.get(provider, 0.0),
+            burst_every=burst[0],
+            burst_length=burst[1] if len(burst) > 1 else 1,
+            retry_after=burst[2] if len(burst) > 2 else 1.0,
+            requests_per_minute=rpm.get(provider)
+        )
+    return behaviors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена API Anthropic, OpenAI и Google")
+    parser.add_argument('--host', default='127.0.0.1', help="адрес (по умолчанию: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="порт (по умолчанию: 8765)")
+    parser.add_argument('--latency', action='append', metavar='[PROVIDER=]SPEC',
+                        help="задержка: fixed:S, uniform:A:B, normal:MU:SIGMA, lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--error-rate', action='append', metavar='[PROVIDER=]P',
+                        help="доля ответов 500/503 (0..1)")
+    parser.add_argument('--burst', action='append', metavar='[PROVIDER=]EVERY:LENGTH[:RETRY_AFTER]',
+                        help="каждые EVERY запросов - LENGTH ответов 429 с Retry-After (по умолчанию 1 с)")
+    parser.add_argument('--rpm', action='append', metavar='[PROVIDER=]N',
+                        help="лимит запросов в минуту с заголовками лимитов провайдера")
+    parser.add_argument('--image-kb', type=int, default=None,
+                        help="размер PNG в ответе, КБ (по умолчанию ~60%% несжатого, как у DALL-E 3)")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="множитель всех задержек (например, 0.01 для быстрых тестов)")
+    parser.add_argument('--seed', type=int, default=None, help="seed для воспроизводимых задержек и ошибок")
+    args = parser.parse_args()
+
+    try:
+        behaviors = build_behaviors(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = MockProviderServer(args.host, args.port, behaviors, args.image_kb, args.time_scale, args.seed)
+    print(f"🧪 Mock-сервер провайдеров: {server.base_url}")
+    for provider, behavior in behaviors.items():
+        print(f"   {provider}: задержка {behavior.latency.spec}, ошибки {behavior.error_rate:.0%}, "
+              f"429 каждые {behavior.burst_every or '-'}, лимит {behavior.requests_per_minute or '-'}/мин")
+    print(f"   Генератор: --api-base-url {server.base_url} (ключи API - любые непустые)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n📊 Статистика:")
+        for provider, stats in server.snapshot().items():
+            if stats['requests']:
+                print(f"   {provider}: {stats['requests']} запросов, {stats['ok']} успешно, "
+                      f"{stats['rate_limited']} × 429, {stats['errors']} ошибок")
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -543,7 +543,8 @@ EOF
     sleep 1
     
     # Запуск основного скрипта
-    exec "$VENV_DIR/bin/python" "$SCRIPT_DIR/rwtech_pptx_generator.py"
+    # -m берет байткод из __pycache__: при запуске файла напрямую модуль компилируется заново
+    exec "$VENV_DIR/bin/python" -m rwtech_pptx_generator "$@"
     
 else
     print_error "Система не готова к запуску!"
@@ -9,21 +9,66 @@ RW Tech PPTX Generator - Universal PowerPoint Creator
 import os
 import re
 import sys
+import builtins
+import copy
 import json
-import base64
+import binascii
+import hashlib
+import shutil
+import tempfile
 import time
+import uuid
 import logging
 import threading
 import queue
+import zipfile
+import posixpath
+import concurrent.futures
 from datetime import datetime
+from contextlib import contextmanager
 from io import BytesIO
-import requests
-from tqdm import tqdm
-from pptx import Presentation
-from pptx.util import Pt, Inches
-from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-from pptx.dml.color import RGBColor
+
+# requests и python-pptx импортируются в методах, которым они нужны:
+# --help, --dry-run и проверка файлов не платят за их загрузку
+
+# Родитель логгеров генераторов (имя не зависит от запуска через -m)
+LOGGER_NAME = "rwtech_pptx_generator"
+
+# Каталог проекта: шаблон, конфигурация и кэши для библиотечного вызова (generate_deck)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Число идущих библиотечных вызовов generate_deck: пока оно не ноль, консольный вывод модуля
+# подавляется во всех его потоках. sys.stdout приложения не подменяется
+_silent_calls = 0
+_silent_lock = threading.Lock()
+
+
+def print(*args, **kwargs):
+    """print модуля: во время generate_deck молчит (кроме вывода в явно заданный file)"""
+    if _silent_calls and kwargs.get('file') is None:
+        return
+    builtins.print(*args, **kwargs)
+
+
+@contextmanager
+def _silenced_output():
+    """Подавляет консольный вывод модуля на время библиотечного вызова"""
+    global _silent_calls
+    with _silent_lock:
+        _silent_calls += 1
+    try:
+        yield
+    finally:
+        with _silent_lock:
+            _silent_calls -= 1
+
+
+class GenerationError(Exception):
+    """Критическая ошибка генерации; exit_code - код завершения командной строки"""
+
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
 
 
 class ProgressBar:
@@ -111,6 +156,9 @@ class ASCIIArt:
     def animate_text(text, color="\033[1;36m", delay=0.03):
         """Анимированный вывод текста по символам"""
         import time
+        if not ColorfulUI.ANIMATIONS:
+            print(f"{color}{text}\033[0m")
+            return
         for char in text:
             print(f"{color}{char}\033[0m", end='', flush=True)
             time.sleep(delay)
@@ -219,12 +267,15 @@ class ColorfulUI:
     # Анимированный спиннер
     SPINNER_FRAMES = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧"]
     
+    # False - без анимаций и косметических пауз (headless-режим, CI)
+    ANIMATIONS = True
+    
     @classmethod
     def animate_spinner(cls, text, duration=2):
         """Показывает анимированный спиннер"""
         import time
         frame = 0
-        end_time = time.time() + duration
+        end_time = time.time() + duration if cls.ANIMATIONS else 0
         
         while time.time() < end_time:
             spinner = cls.SPINNER_FRAMES[frame % len(cls.SPINNER_FRAMES)]
@@ -271,6 +322,8 @@ class ColorfulUI:
             f"{cls.EMOJI['workflow']} Streamlined Digital Workflows"
         ]
         
+        if not cls.ANIMATIONS:
+            return
         for slogan in slogans:
             print(f"\r{cls.RW_TECH_COLORS['secondary']}{slogan:^70}{cls.COLORS['reset']}", end='', flush=True)
             time.sleep(0.8)
@@ -306,7 +359,7 @@ class ColorfulUI:
         import time
         frames = ["⚙️", "🔧", "⚡", "🌟", "💫", "✨"]
         frame = 0
-        end_time = time.time() + duration
+        end_time = time.time() + duration if cls.ANIMATIONS else 0
         
         while time.time() < end_time:
             emoji = frames[frame % len(frames)]
@@ -420,7 +473,7 @@ class ColorfulUI:
         
         start_time = time.time()
         i = 0
-        while time.time() - start_time < duration:
+        while cls.ANIMATIONS and time.time() - start_time < duration:
             frame = frames[i % len(frames)]
             print(f"\r{color}{frame} {text}...{reset}", end='', flush=True)
             time.sleep(0.1)
@@ -504,9 +557,15 @@ class PromptTemplates:
 
 
 class ExecutionStats:
-    """Класс для подробной статистики выполнения"""
+    """Класс для подробной статистики выполнения (потокобезопасные счетчики, показатели и таймеры)
+    
+    У каждого события один владелец: попытки и результаты промптов учитывает
+    _generate_image_prompt, изображений - _generate_image_with_dalle, вызовы API
+    и повторы - обертки запросов. Воркеры только читают статистику.
+    """
     
     def __init__(self):
+        self._lock = threading.Lock()
         self.stats = {
             'start_time': datetime.now(),
             'api_validation_attempts': 0,
@@ -521,82 +580,150 @@ class ExecutionStats:
             'images_inserted': 0,
             'total_api_calls': 0,
             'total_errors': 0,
+            'total_retries': 0,
+            'slides_reused': 0,
+            'slides_resumed': 0,
+            'prompt_cache_hits': 0,
+            'prompt_cache_misses': 0,
+            'image_cache_hits': 0,
+            'image_cache_misses': 0,
+            'image_cache_evictions': 0,
             'end_time': None,
             'total_duration': None
         }
+        # Таймеры: имя -> {'count', 'total', 'max'} в секундах
+        self.timers = {}
     
     def increment(self, stat_name, amount=1):
         """Увеличивает значение статистики"""
-        if stat_name in self.stats:
-            self.stats[stat_name] += amount
+        with self._lock:
+            if stat_name in self.stats:
+                self.stats[stat_name] += amount
     
     def set(self, stat_name, value):
         """Устанавливает значение статистики"""
-        self.stats[stat_name] = value
+        with self._lock:
+            self.stats[stat_name] = value
     
     def get(self, stat_name, default=0):
         """Получает значение статистики"""
-        return self.stats.get(stat_name, default)
+        with self._lock:
+            return self.stats.get(stat_name, default)
+    
+    def observe(self, timer_name, seconds):
+        """Учитывает длительность операции в таймере"""
+        with self._lock:
+            timer = self.timers.setdefault(timer_name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timer['count'] += 1
+            timer['total'] += seconds
+            timer['max'] = max(timer['max'], seconds)
     
-    def _calculate_success_rate(self, operation_type):
+    @contextmanager
+    def timer(self, timer_name):
+        """Контекстный менеджер для замера длительности операции"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(timer_name, time.monotonic() - started)
+    
+    def snapshot(self):
+        """Возвращает согласованную копию статистики и таймеров"""
+        with self._lock:
+            snapshot = dict(self.stats)
+            snapshot['timers'] = {name: dict(timer) for name, timer in self.timers.items()}
+            return snapshot
+    
+    def _calculate_success_rate(self, operation_type, stats=None):
         """Вычисляет коэффициент успешности"""
+        stats = stats if stats is not None else self.snapshot()
         if operation_type == 'prompts':
-            total = self.stats['prompts_attempted']
-            success = self.stats['prompts_generated']
+            total = stats['prompts_attempted']
+            success = stats['prompts_generated']
         elif operation_type == 'images':
-            total = self.stats['images_attempted']
-            success = self.stats['images_generated']
+            total = stats['images_attempted']
+            success = stats['images_generated']
         else:
             return 0.0
         
         return (success / total) if total > 0 else 0.0
     
-    def _is_execution_successful(self):
+    def _is_execution_successful(self, stats=None):
         """Определяет, было ли выполнение успешным"""
-        prompts_rate = self._calculate_success_rate('prompts')
-        images_rate = self._calculate_success_rate('images')
-        
-        # Требуем минимум 80% успешности
-        return (self.stats['api_validation_success'] and 
-                prompts_rate >= 0.8 and 
-                images_rate >= 0.8 and
-                self.stats['images_inserted'] > 0)
+        stats = stats if stats is not None else self.snapshot()
+        prompts_rate = self._calculate_success_rate('prompts', stats)
+        images_rate = self._calculate_success_rate('images', stats)
+        
+        # Требуем минимум 80% успешности (если все иллюстрации взяты из прошлой сборки, попыток нет)
+        return (stats['api_validation_success'] and 
+                (prompts_rate >= 0.8 or stats['prompts_attempted'] == 0) and 
+                (images_rate >= 0.8 or stats['images_attempted'] == 0) and
+                stats['images_inserted'] > 0)
     
     def print_final_report(self):
         """Выводит детальный финальный отчет"""
-        self.stats['end_time'] = datetime.now()
-        self.stats['total_duration'] = self.stats['end_time'] - self.stats['start_time']
+        with self._lock:
+            self.stats['end_time'] = datetime.now()
+            self.stats['total_duration'] = self.stats['end_time'] - self.stats['start_time']
+        stats = self.snapshot()
         
         print("\n" + "="*60)
         print("📊 ФИНАЛЬНЫЙ ОТЧЕТ ВЫПОЛНЕНИЯ")
         print("="*60)
         
-        print(f"\n⏱️  Время выполнения: {self.stats['total_duration']}")
+        print(f"\n⏱️  Время выполнения: {stats['total_duration']}")
         print(f"\n🔑 Валидация API:")
-        print(f"   Попыток: {self.stats['api_validation_attempts']}")
-        print(f"   Результат: {'✅ Успешно' if self.stats['api_validation_success'] else '❌ Неудачно'}")
+        print(f"   Попыток: {stats['api_validation_attempts']}")
+        print(f"   Результат: {'✅ Успешно' if stats['api_validation_success'] else '❌ Неудачно'}")
         
-        if self.stats['slides_to_process'] > 0:
+        if stats['slides_to_process'] > 0:
             print(f"\n📝 Генерация промптов:")
-            print(f"   Запланировано: {self.stats['slides_to_process']}")
-            print(f"   Попыток: {self.stats['prompts_attempted']}")
-            print(f"   Успешно: {self.stats['prompts_generated']}")
-            print(f"   Неудачно: {self.stats['prompts_failed']}")
-            print(f"   Успешность: {self._calculate_success_rate('prompts'):.1%}")
+            print(f"   Запланировано: {stats['slides_to_process']}")
+            print(f"   Попыток: {stats['prompts_attempted']}")
+            print(f"   Успешно: {stats['prompts_generated']}")
+            print(f"   Неудачно: {stats['prompts_failed']}")
+            print(f"   Успешность: {self._calculate_success_rate('prompts', stats):.1%}")
             
             print(f"\n🎨 Генерация изображений:")
-            print(f"   Попыток: {self.stats['images_attempted']}")
-            print(f"   Успешно: {self.stats['images_generated']}")
-            print(f"   Неудачно: {self.stats['images_failed']}")
-            print(f"   Вставлено в презентацию: {self.stats['images_inserted']}")
-            print(f"   Успешность: {self._calculate_success_rate('images'):.1%}")
+            print(f"   Попыток: {stats['images_attempted']}")
+            print(f"   Успешно: {stats['images_generated']}")
+            print(f"   Неудачно: {stats['images_failed']}")
+            print(f"   Вставлено в презентацию: {stats['images_inserted']}")
+            print(f"   Успешность: {self._calculate_success_rate('images', stats):.1%}")
         
         print(f"\n📊 Общая статистика:")
-        print(f"   API вызовов: {self.stats['total_api_calls']}")
-        print(f"   Ошибок: {self.stats['total_errors']}")
+        print(f"   API вызовов: {stats['total_api_calls']}")
+        print(f"   Ошибок: {stats['total_errors']}")
+        print(f"   Повторов запросов: {stats['total_retries']}")
+        if stats['slides_reused']:
+            print(f"   Слайдов из прошлой сборки: {stats['slides_reused']}")
+        if stats['slides_resumed']:
+            print(f"   Изображений из журнала прерванного запуска: {stats['slides_resumed']}")
+        
+        if stats['prompt_cache_hits'] or stats['prompt_cache_misses']:
+            print(f"\n💾 Кэш промптов:")
+            print(f"   Попаданий: {stats['prompt_cache_hits']}")
+            print(f"   Промахов: {stats['prompt_cache_misses']}")
+        
+        if stats['image_cache_hits'] or stats['image_cache_misses']:
+            print(f"\n💾 Кэш изображений:")
+            print(f"   Попаданий: {stats['image_cache_hits']}")
+            print(f"   Промахов: {stats['image_cache_misses']}")
+            print(f"   Вытеснено: {stats['image_cache_evictions']}")
+        
+        if 'prompt_workers' in stats:
+            print(f"\n⚙️  Параллелизм ({stats.get('generation_engine', 'threads')}):")
+            print(f"   Воркеров промптов: {stats['prompt_workers']}")
+            print(f"   Воркеров изображений ({stats.get('image_model', '-')}): {stats['image_workers']}")
+        
+        if stats['timers']:
+            print(f"\n⏱️  Длительность операций:")
+            for name, timer in sorted(stats['timers'].items()):
+                average = timer['total'] / timer['count'] if timer['count'] else 0.0
+                print(f"   {name}: {timer['count']} шт., среднее {average:.2f} с, максимум {timer['max']:.2f} с")
         
         # Итоговый вердикт
-        if self._is_execution_successful():
+        if self._is_execution_successful(stats):
             print("\n✅ ВЫПОЛНЕНИЕ УСПЕШНО ЗАВЕРШЕНО")
             return True
         else:
@@ -622,45 +749,48 @@ class ExecutionCheckpoints:
         """Валидирует контрольную точку"""
         print(f"\n🔍 Проверка контрольной точки: {checkpoint_name}")
         
+        # Решения принимаются по согласованному снимку статистики
+        stats = self.stats.snapshot()
+        
         if checkpoint_name == 'api_validation':
-            success = self.stats.get('api_validation_success')
+            success = stats.get('api_validation_success')
             if not success:
                 print(f"⛔ КРИТИЧЕСКАЯ ОШИБКА: API ключи не прошли валидацию")
                 return False
         
         elif checkpoint_name == 'prompts_generation':
-            total = self.stats.get('prompts_attempted')
-            success = self.stats.get('prompts_generated')
+            total = stats.get('prompts_attempted')
+            success = stats.get('prompts_generated')
             success_rate = (success / total) if total > 0 else 0.0
             
             if success_rate < required_success_rate:
                 print(f"⛔ КРИТИЧЕСКАЯ ОШИБКА на этапе '{checkpoint_name}'")
                 print(f"   Успешность: {success_rate:.1%} (требуется минимум {required_success_rate:.1%})")
                 print(f"   Успешно: {success}")
-                print(f"   Неудачно: {self.stats.get('prompts_failed')}")
+                print(f"   Неудачно: {stats.get('prompts_failed')}")
                 print(f"   Из {total} попыток")
                 return False
         
         elif checkpoint_name == 'images_generation':
-            total = self.stats.get('images_attempted')
-            success = self.stats.get('images_generated')
+            total = stats.get('images_attempted')
+            success = stats.get('images_generated')
             success_rate = (success / total) if total > 0 else 0.0
             
             if success_rate < required_success_rate:
                 print(f"⛔ КРИТИЧЕСКАЯ ОШИБКА на этапе '{checkpoint_name}'")
                 print(f"   Успешность: {success_rate:.1%} (требуется минимум {required_success_rate:.1%})")
                 print(f"   Успешно: {success}")
-                print(f"   Неудачно: {self.stats.get('images_failed')}")
+                print(f"   Неудачно: {stats.get('images_failed')}")
                 print(f"   Из {total} попыток")
                 return False
         
         elif checkpoint_name == 'presentation_update':
-            inserted = self.stats.get('images_inserted')
-            generated = self.stats.get('images_generated')
+            inserted = stats.get('images_inserted')
+            generated = stats.get('images_generated')
             
             # Получаем путь к result_dir от родительского объекта
-            if self.parent and hasattr(self.parent, 'result_dir'):
-                illustrated_path = os.path.join(self.parent.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
+            if self.parent and hasattr(self.parent, 'illustrated_file'):
+                illustrated_path = self.parent.illustrated_file
             else:
                 illustrated_path = os.path.join(os.getcwd(), "pptx_result", "RWTech_Universal_Presentation_Illustrated.pptx")
             
@@ -674,19 +804,23 @@ class ExecutionCheckpoints:
                 else:
                     # Проверяем что презентация действительно содержит изображения
                     try:
-                        from pptx import Presentation
-                        from pptx.enum.shapes import MSO_SHAPE_TYPE
-                        
-                        prs = Presentation(illustrated_path)
-                        images_found = 0
-                        
-                        for slide in prs.slides:
-                            for shape in slide.shapes:
-                                if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                                    images_found += 1
+                        # Проверка пакета без загрузки python-pptx; результат переиспользует финальная валидация
+                        if self.parent and hasattr(self.parent, 'inspect_package'):
+                            package = self.parent.inspect_package(illustrated_path)
+                        else:
+                            package = PackageValidator(illustrated_path).validate()
+                        if not package['ok']:
+                            print(f"⛔ ОШИБКА проверки презентации: {'; '.join(package['errors'][:3])}")
+                            return False
+                        images_found = sum(package['pictures'])
                         
                         # Проверяем количество изображений (должно быть больше шаблонных)
-                        template_images_count = len(prs.slides) * 2  # 2 изображения на слайд из шаблона
+                        # Изображения шаблона на каждом слайде (в режиме 'layout' они в макете)
+                        if self.parent and hasattr(self.parent, '_template_pictures_for_slides'):
+                            pictures_per_slide = len(self.parent._template_pictures_for_slides())
+                        else:
+                            pictures_per_slide = 2  # 2 изображения на слайд из шаблона
+                        template_images_count = package['slide_count'] * pictures_per_slide
                         ai_images_found = images_found - template_images_count
                         
                         if ai_images_found < inserted:
@@ -708,63 +842,1224 @@ class ExecutionCheckpoints:
         return self.checkpoints.copy()
 
 
-class RWTechPPTXGenerator:
+class PackageValidator:
+    """Проверка .pptx на уровне zip-пакета, без построения объектной модели python-pptx"""
+
+    NS = {
+        'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+        'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+        'ct': 'http://schemas.openxmlformats.org/package/2006/content-types',
+    }
+    SLIDE_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.slide+xml'
+    SLIDE_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide'
+    IMAGE_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _rels_path(part_name):
+        """Путь к .rels-файлу части пакета"""
+        directory, name = posixpath.split(part_name)
+        return posixpath.join(directory, '_rels', f"{name}.rels")
+
+    def _relationships(self, zf, part_name):
+        """Связи части: {rId: (тип, абсолютное имя целевой части)}; внешние ссылки пропускаются"""
+        import xml.etree.ElementTree as ET
+        rels_path = self._rels_path(part_name)
+        if rels_path not in zf.NameToInfo:
+            return {}
+        base_dir = posixpath.dirname(part_name)
+        relationships = {}
+        for rel in ET.fromstring(zf.read(rels_path)).findall('rel:Relationship', self.NS):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = posixpath.normpath(posixpath.join(base_dir, rel.get('Target', '')))
+            relationships[rel.get('Id')] = (rel.get('Type'), target.lstrip('/'))
+        return relationships
+
+    def validate(self):
+        """Проверяет пакет: части слайдов, связи слайд→медиа, размеры и CRC медиа, типы содержимого
+        
+        Returns:
+            словарь: ok, errors, slide_count, pictures (по слайдам), media_count, media_bytes
+        """
+        import zlib
+        import xml.etree.ElementTree as ET
+        report = {
+            'path': self.path,
+            'ok': False,
+            'errors': [],
+            'slide_count': 0,
+            'pictures': [],
+            'media_count': 0,
+            'media_bytes': 0,
+        }
+        errors = report['errors']
+        ns = self.NS
+        started = time.perf_counter()
+        
+        try:
+            with zipfile.ZipFile(self.path) as zf:
+                names = zf.NameToInfo
+                
+                # Типы содержимого: умолчания по расширению и переопределения по части
+                content_types = ET.fromstring(zf.read('[Content_Types].xml'))
+                defaults = {d.get('Extension', '').lower(): d.get('ContentType')
+                            for d in content_types.findall('ct:Default', ns)}
+                overrides = {o.get('PartName', '').lstrip('/'): o.get('ContentType')
+                             for o in content_types.findall('ct:Override', ns)}
+                
+                def content_type(part_name):
+                    return overrides.get(part_name) or defaults.get(posixpath.splitext(part_name)[1][1:].lower())
+                
+                # Слайды в порядке sldIdLst презентации
+                presentation_part = 'ppt/presentation.xml'
+                presentation_rels = self._relationships(zf, presentation_part)
+                presentation = ET.fromstring(zf.read(presentation_part))
+                slide_parts = []
+                for slide_id in presentation.findall('p:sldIdLst/p:sldId', ns):
+                    rel_type, target = presentation_rels.get(slide_id.get(f"{{{ns['r']}}}id"), (None, None))
+                    if rel_type != self.SLIDE_REL_TYPE or target not in names:
+                        errors.append(f"слайд {len(slide_parts) + 1}: часть слайда не найдена ({target})")
+                    slide_parts.append(target)
+                report['slide_count'] = len(slide_parts)
+                
+                media_parts = set()
+                for index, slide_part in enumerate(slide_parts, 1):
+                    if slide_part not in names:
+                        report['pictures'].append(0)
+                        continue
+                    if content_type(slide_part) != self.SLIDE_CONTENT_TYPE:
+                        errors.append(f"слайд {index}: неверный тип содержимого {content_type(slide_part)}")
+                    relationships = self._relationships(zf, slide_part)
+                    for rel_type, target in relationships.values():
+                        if rel_type == self.IMAGE_REL_TYPE:
+                            if target in names:
+                                media_parts.add(target)
+                            else:
+                                errors.append(f"слайд {index}: изображение {target} отсутствует в пакете")
+                    
+                    # Изображения верхнего уровня - то же, что PICTURE в slide.shapes
+                    pictures = 0
+                    sp_tree = ET.fromstring(zf.read(slide_part)).find('p:cSld/p:spTree', ns)
+                    for pic in (sp_tree.findall('p:pic', ns) if sp_tree is not None else []):
+                        blip = pic.find('p:blipFill/a:blip', ns)
+                        embed = blip.get(f"{{{ns['r']}}}embed") if blip is not None else None
+                        if embed not in relationships:
+                            errors.append(f"слайд {index}: изображение ссылается на отсутствующую связь {embed}")
+                        pictures += 1
+                    report['pictures'].append(pictures)
+                
+                # Медиа: тип содержимого, ненулевой размер и CRC (zipfile проверяет его при чтении)
+                for media_part in sorted(media_parts):
+                    info = names[media_part]
+                    if not content_type(media_part):
+                        errors.append(f"{media_part}: не задан тип содержимого")
+                    if info.file_size == 0:
+                        errors.append(f"{media_part}: пустой файл")
+                    with zf.open(info) as f:
+                        while f.read(1024 * 1024):
+                            pass
+                    report['media_bytes'] += info.file_size
+                report['media_count'] = len(media_parts)
+        except (zipfile.BadZipFile, zlib.error, KeyError, ET.ParseError, OSError) as e:
+            # BadZipFile выбрасывается и при несовпадении CRC
+            errors.append(f"пакет поврежден: {e}")
+        
+        report['ok'] = not errors
+        report['elapsed'] = time.perf_counter() - started
+        return report
+
+
+class ProviderSessions:
+    """Пул HTTP-сессий с keep-alive: одна requests.Session на каждого AI-провайдера"""
+
+    def __init__(self, pool_sizes=None, max_retries=3, backoff_factor=0.5):
+        self.pool_sizes = dict(pool_sizes or {})
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._session_pool_sizes = {}
+        self._lock = threading.Lock()
+
+    def configure_pool(self, provider, pool_size):
+        """Задает размер пула соединений провайдера (по числу воркеров)"""
+        pool_size = max(1, int(pool_size))
+        with self._lock:
+            self.pool_sizes[provider] = pool_size
+            session = self._sessions.get(provider)
+            # Уже созданную сессию перемонтируем, если пул стал больше
+            if session is not None and self._session_pool_sizes.get(provider, 0) < pool_size:
+                self._mount_adapter(session, pool_size)
+                self._session_pool_sizes[provider] = pool_size
+
+    def get(self, provider):
+        """Возвращает общую сессию провайдера, создавая ее при первом обращении"""
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                pool_size = self.pool_sizes.get(provider, 1)
+                import requests
+                session = requests.Session()
+                self._mount_adapter(session, pool_size)
+                self._sessions[provider] = session
+                self._session_pool_sizes[provider] = pool_size
+            return session
+
+    def _mount_adapter(self, session, pool_size):
+        """Подключает адаптер с пулом соединений и повторами на уровне urllib3"""
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Повторяем только сбои соединения и 5xx шлюзов для идемпотентных методов:
+        # POST к генерации изображений платный, его повторы решаются выше
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            backoff_factor=self.backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+            pool_block=False
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def close(self):
+        """Закрывает все сессии и освобождает соединения"""
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions.clear()
+            self._session_pool_sizes.clear()
+
+
+class SDKClientRegistry:
+    """Ленивый потокобезопасный реестр SDK-клиентов (OpenAI, Google GenAI)"""
+
     def __init__(self):
-        self.base_path = os.getcwd()  # Use current working directory
+        self._lock = threading.Lock()
+        self._modules = {}
+        self._clients = {}
+
+    def module(self, name):
+        """Импортирует модуль SDK один раз за время работы"""
+        mod = self._modules.get(name)
+        if mod is None:
+            with self._lock:
+                mod = self._modules.get(name)
+                if mod is None:
+                    import importlib
+                    mod = importlib.import_module(name)
+                    self._modules[name] = mod
+        return mod
+
+    def _get_client(self, key, factory):
+        """Возвращает клиента по ключу, создавая его один раз"""
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    self._clients[key] = client
+        return client
+
+    def openai_client(self, api_key, base_url=None):
+        """Клиент OpenAI со своим пулом соединений (base_url - адрес API вместе с /v1)"""
+        openai = self.module('openai')
+        # Повторы выполняет RetryPolicy генератора, встроенные повторы SDK отключены
+        return self._get_client(('openai', api_key, base_url),
+                                lambda: openai.OpenAI(api_key=api_key, max_retries=0, base_url=base_url))
+
+    def genai_client(self, api_key, base_url=None):
+        """Клиент Google GenAI (Gemini / Imagen 3); base_url - None для адреса по умолчанию"""
+        genai = self.module('google.genai')
+        if base_url:
+            http_options = self.genai_types().HttpOptions(base_url=base_url)
+            return self._get_client(('google.genai', api_key, base_url),
+                                    lambda: genai.Client(api_key=api_key, http_options=http_options))
+        return self._get_client(('google.genai', api_key), lambda: genai.Client(api_key=api_key))
+
+    def genai_types(self):
+        """Модуль типов google.genai"""
+        return self.module('google.genai.types')
+
+    def close(self):
+        """Закрывает всех созданных клиентов"""
+        with self._lock:
+            for client in self._clients.values():
+                close = getattr(client, 'close', None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception:
+                        pass
+            self._clients.clear()
+
+
+class RateLimiter:
+    """Token bucket лимитер запросов и токенов в минуту для одного провайдера
+
+    Ёмкость корзины - 10 секунд лимита, чтобы не отправлять весь минутный
+    бюджет одним залпом. Заголовки ответа (Retry-After, x-ratelimit-*,
+    anthropic-ratelimit-*) корректируют состояние и ставят паузу ровно
+    до момента сброса лимита.
+    """
+
+    BURST_SECONDS = 10
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._request_capacity = self._capacity(requests_per_minute)
+        self._token_capacity = self._capacity(tokens_per_minute)
+        self._request_tokens = self._request_capacity
+        self._token_tokens = self._token_capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+
+    @classmethod
+    def _capacity(cls, per_minute):
+        """Ёмкость корзины для лимита в минуту (None - без ограничения)"""
+        if not per_minute:
+            return None
+        return max(1.0, per_minute * cls.BURST_SECONDS / 60.0)
+
+    def _refill(self, now):
+        """Пополняет корзины пропорционально прошедшему времени"""
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self._request_capacity is not None:
+            self._request_tokens = min(self._request_capacity,
+                                       self._request_tokens + elapsed * self.requests_per_minute / 60.0)
+        if self._token_capacity is not None:
+            self._token_tokens = min(self._token_capacity,
+                                     self._token_tokens + elapsed * self.tokens_per_minute / 60.0)
+
+    def _reserve(self, tokens):
+        """Забирает разрешение на запрос или возвращает время ожидания в секундах"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            wait = max(0.0, self._paused_until - now)
+            if self._request_capacity is not None and self._request_tokens < 1:
+                wait = max(wait, (1 - self._request_tokens) * 60.0 / self.requests_per_minute)
+            if self._token_capacity is not None and tokens:
+                # Запрос больше ёмкости корзины ждет ее полного наполнения
+                needed = min(tokens, self._token_capacity)
+                if self._token_tokens < needed:
+                    wait = max(wait, (needed - self._token_tokens) * 60.0 / self.tokens_per_minute)
+
+            if wait > 0:
+                return wait
+
+            if self._request_capacity is not None:
+                self._request_tokens -= 1
+            if self._token_capacity is not None and tokens:
+                self._token_tokens -= tokens
+            return 0.0
+
+    def acquire(self, tokens=0):
+        """Блокирует поток до появления разрешения на запрос"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=0):
+        """Асинхронный вариант acquire для asyncio-движка"""
+        import asyncio
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Учитывает разницу между оценкой и фактическим расходом токенов"""
+        if self._token_capacity is None or actual_tokens is None:
+            return
+        with self._lock:
+            self._token_tokens -= (actual_tokens - estimated_tokens)
+
+    def pause(self, seconds):
+        """Приостанавливает выдачу разрешений на указанное время"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers, status_code=None):
+        """Корректирует лимитер по заголовкам ответа, возвращает назначенную паузу"""
+        headers = {k.lower(): v for k, v in dict(headers or {}).items()}
+        pause = 0.0
+
+        # Оставшиеся запросы/токены и время сброса (OpenAI и Anthropic)
+        for kind, remaining_keys, reset_keys in (
+            ('requests',
+             ('x-ratelimit-remaining-requests', 'anthropic-ratelimit-requests-remaining'),
+             ('x-ratelimit-reset-requests', 'anthropic-ratelimit-requests-reset')),
+            ('tokens',
+             ('x-ratelimit-remaining-tokens', 'anthropic-ratelimit-tokens-remaining'),
+             ('x-ratelimit-reset-tokens', 'anthropic-ratelimit-tokens-reset'))
+        ):
+            remaining = self._first_number(headers, remaining_keys)
+            if remaining is None:
+                continue
+            with self._lock:
+                if kind == 'requests' and self._request_capacity is not None:
+                    self._request_tokens = min(self._request_tokens, remaining)
+                elif kind == 'tokens' and self._token_capacity is not None:
+                    self._token_tokens = min(self._token_tokens, remaining)
+            if remaining <= 0:
+                for key in reset_keys:
+                    if key in headers:
+                        pause = max(pause, self.parse_reset(headers[key]))
+                        break
+
+        # Retry-After имеет приоритет при 429/503
+        retry_after = self.parse_retry_after(headers)
+        if retry_after is not None:
+            pause = max(pause, retry_after)
+        elif status_code == 429 and pause == 0:
+            pause = 1.0
+
+        self.pause(pause)
+        return pause
+
+    @staticmethod
+    def _first_number(headers, keys):
+        """Возвращает первое числовое значение из списка заголовков"""
+        for key in keys:
+            if key in headers:
+                try:
+                    return float(headers[key])
+                except (TypeError, ValueError):
+                    return None
+        return None
+
+    @staticmethod
+    def parse_retry_after(headers):
+        """Разбирает Retry-After (секунды или HTTP-дата) и retry-after-ms"""
+        if 'retry-after-ms' in headers:
+            try:
+                return float(headers['retry-after-ms']) / 1000.0
+            except (TypeError, ValueError):
+                pass
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            from email.utils import parsedate_to_datetime
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except Exception:
+            return None
+
+    @staticmethod
+    def parse_reset(value):
+        """Разбирает время сброса: длительность OpenAI ('6m0s', '20ms') или RFC 3339 Anthropic"""
+        value = str(value).strip()
+        parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+        if parts and ''.join(number + unit for number, unit in parts) == value:
+            multipliers = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+            return sum(float(number) * multipliers[unit] for number, unit in parts)
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return max(0.0, reset_at.timestamp() - time.time())
+        except ValueError:
+            return 0.0
+
+
+class RetryPolicy:
+    """Политика повторов: экспоненциальная задержка с jitter и бюджеты повторов
+
+    Бюджет на слайд общий для промпта и изображения, бюджет на запуск - общий
+    для всех воркеров, поэтому массовый сбой провайдера не растягивает запуск.
+    """
+
+    # 529 - перегрузка Anthropic, 408/409/425 - временные конфликты и таймауты
+    RETRYABLE_STATUSES = (408, 409, 425, 429, 500, 502, 503, 504, 529)
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0,
+                 per_slide_budget=4, per_run_budget=30, retryable_statuses=None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.per_slide_budget = per_slide_budget
+        self.per_run_budget = per_run_budget
+        self.retryable_statuses = frozenset(retryable_statuses or self.RETRYABLE_STATUSES)
+        self._lock = threading.Lock()
+        self._run_spent = 0
+        self._slide_spent = {}
+
+    def is_retryable_status(self, status_code):
+        """Временная ли HTTP-ошибка"""
+        return status_code in self.retryable_statuses
+
+    def is_retryable_exception(self, exc):
+        """Временный ли сбой: таймаут, обрыв соединения или повторяемый HTTP-статус SDK"""
+        status_code = getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+        if isinstance(status_code, int):
+            return self.is_retryable_status(status_code)
+        if isinstance(exc, (TimeoutError, ConnectionError)):
+            return True
+        # requests не импортирован - исключение не может быть его исключением
+        requests = sys.modules.get('requests')
+        if requests is not None and isinstance(exc, (requests.exceptions.Timeout,
+                                                     requests.exceptions.ConnectionError)):
+            return True
+        # Таймауты и ошибки соединения SDK (openai, httpx, google-genai)
+        name = type(exc).__name__
+        return 'Timeout' in name or 'Connect' in name
+
+    def backoff(self, attempt):
+        """Задержка перед повтором: экспонента с equal jitter"""
+        import random
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def try_spend(self, attempt, slide_key=None):
+        """Разрешает повтор, если не исчерпаны попытки и бюджеты слайда и запуска"""
+        if attempt >= self.max_attempts:
+            return False
+        with self._lock:
+            if self.per_run_budget is not None and self._run_spent >= self.per_run_budget:
+                return False
+            spent = self._slide_spent.get(slide_key, 0)
+            if slide_key is not None and self.per_slide_budget is not None and spent >= self.per_slide_budget:
+                return False
+            self._run_spent += 1
+            if slide_key is not None:
+                self._slide_spent[slide_key] = spent + 1
+            return True
+
+    def reset(self):
+        """Сбрасывает бюджеты перед новым запуском"""
+        with self._lock:
+            self._run_spent = 0
+            self._slide_spent.clear()
+
+
+class ImageCache:
+    """Дисковый кэш изображений с адресацией по содержимому и LRU-вытеснением по размеру
+
+    Ключ - sha256 от (модель, размер, качество, очищенный промпт). Файлы пишутся
+    атомарно (временный файл + os.replace), время последнего использования - mtime.
+    """
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None  # ключ -> размер файла, загружается при первом обращении
+
+    @staticmethod
+    def make_key(model, size, quality, clean_prompt):
+        """Ключ кэша для параметров генерации"""
+        payload = '\x1f'.join([model, str(size), str(quality), clean_prompt])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _load_index(self):
+        """Читает содержимое каталога кэша (вызывается под блокировкой)"""
+        if self._index is not None:
+            return
+        self._index = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.png'):
+                self._index[name[:-4]] = os.path.getsize(os.path.join(self.cache_dir, name))
+
+    def read(self, key):
+        """Возвращает байты изображения из кэша; None, если ключа нет"""
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            cached_path = self._path(key)
+            try:
+                os.utime(cached_path)  # Отмечаем использование для LRU
+            except OSError:
+                self._index.pop(key, None)
+                return None
+        try:
+            with open(cached_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """Сохраняет байты изображения в кэш и вытесняет давно не использованные записи"""
+        cached_path = self._path(key)
+        with self._lock:
+            self._load_index()
+        self._atomic_write(cached_path, data)
+        with self._lock:
+            self._index[key] = os.path.getsize(cached_path)
+            return self._evict()
+
+    def _evict(self):
+        """Удаляет самые старые записи, пока кэш больше max_bytes (под блокировкой)"""
+        total = sum(self._index.values())
+        if not self.max_bytes or total <= self.max_bytes:
+            return 0
+        entries = []
+        for key in self._index:
+            try:
+                entries.append((os.path.getmtime(self._path(key)), key))
+            except OSError:
+                entries.append((0, key))
+        evicted = 0
+        for _, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            evicted += 1
+        return evicted
+
+    @staticmethod
+    def _atomic_write(dest_path, data):
+        """Пишет файл через временный файл, чтобы не оставить частично записанный"""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, dest_path)
+
+
+class Base64FieldDecoder:
+    """Потоковое извлечение base64-поля из JSON-ответа (b64_json)
+
+    Ответ подается кусками через feed(); строка base64 декодируется блоками,
+    кратными 4 символам, сразу в выходной буфер - ни полный текст ответа,
+    ни разобранный JSON, ни строка base64 целиком в памяти не хранятся.
+    """
+
+    CONTEXT_LIMIT = 64 * 1024  # Сколько байт вокруг поля сохранять (usage и прочие метаданные)
+    VALUE_START = re.compile(rb'\s*:\s*"')
+    VALUE_PREFIX = re.compile(rb'\s*(?::\s*)?')
+
+    def __init__(self, field='b64_json'):
+        self._marker = f'"{field}"'.encode('ascii')
+        self._state = 'search'  # search -> value -> done
+        self._buffer = bytearray()  # текст до начала значения
+        self._pending = bytearray()  # base64-символы, не вошедшие в полный блок
+        self._output = BytesIO()
+        self.head = bytearray()  # начало ответа до поля
+        self.tail = bytearray()  # остаток ответа после поля
+
+    @classmethod
+    def _keep(cls, target, data):
+        """Сохраняет метаданные ответа в пределах CONTEXT_LIMIT"""
+        if len(target) < cls.CONTEXT_LIMIT:
+            target += data[:cls.CONTEXT_LIMIT - len(target)]
+
+    def feed(self, chunk):
+        """Обрабатывает очередной кусок ответа"""
+        if self._state == 'done':
+            self._keep(self.tail, chunk)
+            return
+        if self._state == 'search':
+            self._buffer += chunk
+            index = self._buffer.find(self._marker)
+            if index < 0:
+                # Маркер может оказаться разрезан между кусками
+                cut = max(0, len(self._buffer) - len(self._marker) + 1)
+                self._keep(self.head, self._buffer[:cut])
+                del self._buffer[:cut]
+                return
+            match = self.VALUE_START.match(self._buffer, index + len(self._marker))
+            if match is None:
+                if self.VALUE_PREFIX.fullmatch(self._buffer, index + len(self._marker)):
+                    return  # двоеточие и кавычка еще не пришли
+                raise ValueError(f"поле {self._marker.decode()} не является строкой")
+            self._keep(self.head, self._buffer[:index])
+            chunk = bytes(self._buffer[match.end():])
+            self._buffer = bytearray()
+            self._state = 'value'
+        self._feed_value(chunk)
+
+    def _feed_value(self, chunk):
+        """Декодирует очередную часть строки base64"""
+        end = chunk.find(b'"')
+        self._pending += chunk if end < 0 else chunk[:end]
+        
+        # JSON может экранировать "/" как "\/" и переносы строк как "\n"; незавершенный "\" ждет следующий кусок
+        carry = b''
+        if end < 0 and self._pending.endswith(b'\\'):
+            carry = b'\\'
+            del self._pending[-1:]
+        if b'\\' in self._pending:
+            self._pending = bytearray(self._pending.replace(b'\\/', b'/').replace(b'\\n', b''))
+        
+        usable = len(self._pending) if end >= 0 else len(self._pending) - len(self._pending) % 4
+        if usable:
+            self._output.write(binascii.a2b_base64(self._pending[:usable]))
+            del self._pending[:usable]
+        self._pending += carry
+        
+        if end >= 0:
+            self._state = 'done'
+            self._keep(self.tail, chunk[end + 1:])
+
+    def close(self):
+        """Завершает разбор и возвращает декодированные байты"""
+        if self._state != 'done':
+            raise ValueError(f"в ответе нет полного поля {self._marker.decode()}")
+        return self._output.getvalue()
+
+    def metadata(self):
+        """Текст ответа без base64-значения - для usage и диагностики"""
+        return (bytes(self.head) + b'""' + bytes(self.tail)).decode('utf-8', errors='replace')
+
+
+class ImageStore:
+    """Изображения текущего запуска в памяти; запись на диск - фоновая и необязательная
+
+    Путь файла остается идентификатором изображения (журнал, манифест, история),
+    но вставка в презентацию берет байты из памяти и не ждет записи на диск.
+    """
+
+    # Сигнатуры форматов изображений (первые байты файла)
+    SIGNATURES = (
+        (b'\x89PNG\r\n\x1a\n', 'png'),
+        (b'\xff\xd8\xff', 'jpeg'),
+        (b'GIF87a', 'gif'),
+        (b'GIF89a', 'gif'),
+        (b'BM', 'bmp'),
+        (b'II*\x00', 'tiff'),
+        (b'MM\x00*', 'tiff'),
+    )
+
+    def __init__(self, persist=True):
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._images = {}
+        self._pending = []
+        self._writer = None
+
+    @classmethod
+    def sniff_format(cls, data):
+        """Формат изображения по сигнатуре ('png', 'jpeg', ...); 'webp' или None для прочих"""
+        for signature, image_format in cls.SIGNATURES:
+            if data.startswith(signature):
+                return image_format
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return 'webp'
+        return None
+
+    def put(self, path, data):
+        """Запоминает изображение и ставит его запись в файл в очередь; возвращает path"""
+        data = bytes(data)  # Для bytes - тот же объект, без копирования
+        with self._lock:
+            self._images[path] = data
+            if self.persist:
+                if self._writer is None:
+                    self._writer = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix='image-writer')
+                self._pending.append(self._writer.submit(ImageCache._atomic_write, path, data))
+        return path
+
+    def get(self, path):
+        """Байты изображения из памяти или с диска; None, если изображения нет"""
+        with self._lock:
+            data = self._images.get(path)
+        if data is not None:
+            return data
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def exists(self, path):
+        """Есть ли изображение в памяти или на диске"""
+        with self._lock:
+            if path in self._images:
+                return True
+        return os.path.exists(path)
+
+    def flush(self):
+        """Дожидается фоновой записи; возвращает список ошибок записи"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        errors = []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def release(self):
+        """Дожидается записи и освобождает память"""
+        errors = self.flush()
+        with self._lock:
+            self._images.clear()
+        return errors
+
+    def close(self):
+        """Освобождает память и останавливает поток записи (следующий put создаст его заново)"""
+        errors = self.release()
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+        return errors
+
+
+class PromptCache:
+    """Кэш промптов Claude по содержимому слайда (JSON-файл на ключ, атомарная запись)"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Ключ кэша из частей (заголовок, тело, описание иллюстрации, версия, модель)"""
+        payload = '\x1f'.join(str(part) for part in parts)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Возвращает сохраненный промпт или None"""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f).get('prompt')
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, prompt, slide_number=None):
+        """Сохраняет промпт"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'prompt': prompt,
+                'slide_number': slide_number,
+                'created': datetime.now().isoformat()
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        """Удаляет все сохраненные промпты"""
+        with self._lock:
+            if os.path.exists(self.cache_dir):
+                shutil.rmtree(self.cache_dir)
+
+
+class GenerationJournal:
+    """Журнал AI-генерации (JSONL): запись о каждом готовом промпте, изображении и вставке"""
+
+    def __init__(self, path):
+        self.path = path
+        self.active = False  # События пишутся только в начатый или продолженный журнал
+        self._lock = threading.Lock()
+
+    def start(self, header):
+        """Начинает новый журнал с заголовком запуска"""
+        with self._lock:
+            self.active = True
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'event': 'start', **header}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, event, slide_number, **fields):
+        """Дописывает событие слайда и сбрасывает его на диск"""
+        if not self.active:
+            return
+        record = {'event': event, 'slide': slide_number, 'ts': datetime.now().isoformat(), **fields}
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self):
+        """Возвращает (заголовок, {номер слайда: состояние}); оборванная последняя строка пропускается"""
+        header = None
+        slides = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('event') == 'start':
+                        header = record
+                        continue
+                    state = slides.setdefault(record.get('slide'), {})
+                    state[record['event']] = record
+        except OSError:
+            pass
+        return header, slides
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def remove(self):
+        """Удаляет журнал после успешного завершения"""
+        with self._lock:
+            self.active = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class RWTechPPTXGenerator:
+    # Число воркеров параллельного конвейера по умолчанию (переопределяется workers в config.json и CLI)
+    PROMPT_WORKERS = 1
+    IMAGE_WORKERS = 2
+
+    # Максимум одновременных запросов для промптов и каждой модели изображений
+    MAX_WORKERS = {
+        'prompt': 8,
+        'dall-e-3': 16,
+        'gpt-image-1': 16,
+        'gemini-2.0-flash': 8,
+        'imagen-3': 8
+    }
+
+    # Провайдер, к которому обращается каждая модель генерации изображений
+    IMAGE_MODEL_PROVIDERS = {
+        'dall-e-3': 'openai',
+        'gpt-image-1': 'openai',
+        'gemini-2.0-flash': 'google',
+        'imagen-3': 'google'
+    }
+
+    # Модель Claude для промптов и версия системного промпта
+    # (увеличивайте PROMPT_VERSION при изменении системного промпта - это сбросит кэш промптов)
+    PROMPT_MODEL = "claude-3-5-sonnet-20241022"
+    PROMPT_VERSION = 1
+
+    # Версия раскладки слайдов: увеличивайте при изменении кода построения слайдов,
+    # чтобы инкрементальная сборка не переиспользовала устаревшие результаты
+    LAYOUT_VERSION = 1
+    MANIFEST_VERSION = 1
+
+    # Размер куска при потоковом чтении ответов с изображениями (b64_json)
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # Форматы, которые python-pptx вставляет без конвертации
+    PPTX_IMAGE_FORMATS = ('png', 'jpeg', 'gif', 'bmp', 'tiff')
+
+    # Параметры запроса каждой модели, влияющие на результат (часть ключа кэша изображений)
+    IMAGE_CACHE_PARAMS = {
+        'dall-e-3': ('1792x1024', 'standard'),
+        'gpt-image-1': ('1536x1024', 'high'),
+        'gemini-2.0-flash': ('16:9', 'imagen-3.0-generate-002'),
+        'imagen-3': ('16:9', 'imagen-3.0-generate-002')
+    }
+
+    # Общий дедлайн генерации AI-иллюстраций в секундах (None - без ограничения)
+    GENERATION_DEADLINE_SECONDS = 3600
+    IMAGE_DPI = 150  # Разрешение AI-изображений на слайде по умолчанию
+    WORKER_JOIN_TIMEOUT = 10  # Общее ожидание остановки воркеров, секунды
+
+    # Лимиты одновременных запросов к провайдерам в asyncio-движке
+    ASYNC_CONCURRENCY = {
+        'anthropic': 4,
+        'openai': 4,
+        'google': 4
+    }
+
+    # Лимиты запросов/токенов в минуту по умолчанию (переопределяются rate_limits в config.json)
+    DEFAULT_RATE_LIMITS = {
+        'anthropic': {'requests_per_minute': 50, 'tokens_per_minute': 40000},
+        'openai': {'requests_per_minute': 50, 'tokens_per_minute': None},
+        'google': {'requests_per_minute': 20, 'tokens_per_minute': None}
+    }
+
+    # Базовые адреса API (api_base_urls в config.json, переменные окружения или --api-base-url,
+    # например для mock_provider_server.py); None для google - адрес SDK по умолчанию.
+    # Адрес OpenAI - вместе с /v1, как OPENAI_BASE_URL у SDK (прокси, Azure)
+    DEFAULT_API_BASE_URLS = {
+        'anthropic': 'https://api.anthropic.com',
+        'openai': 'https://api.openai.com/v1',
+        'google': None
+    }
+    API_BASE_URL_ENV = {
+        'anthropic': 'ANTHROPIC_BASE_URL',
+        'openai': 'OPENAI_BASE_URL',
+        'google': 'GEMINI_BASE_URL'
+    }
+
+
+    def __init__(self, workspace=None, console_log=True, base_path=None):
+        """
+        Args:
+            workspace: параметры рабочего каталога запуска {'run_id', 'root', 'tmpfs'}
+                       (дополняют workspace из config.json и включают изоляцию запуска)
+            console_log: дублировать лог в stderr (для библиотечного вызова - False)
+            base_path: каталог шаблона, контента, config.json и кэшей (по умолчанию текущий)
+        """
+        self.base_path = base_path or os.getcwd()  # CLI - текущий каталог
+        self.config_file = os.environ.get('RWTECH_CONFIG') or os.path.join(self.base_path, 'config.json')
         self.content_file = os.path.join(self.base_path, "pptx_content", "slide_content.txt")
         self.template_file = os.path.join(self.base_path, "pptx_template", "Шаблон презентации 16х9.pptx")
-        self.result_dir = os.path.join(self.base_path, "pptx_result")
-        self.result_file = os.path.join(self.result_dir, "RWTech_Universal_Presentation.pptx")
+        self._set_result_dir(os.path.join(self.base_path, "pptx_result"))
         
         # AI illustration directories
         self.prompts_dir = os.path.join(self.base_path, "prompts_for_img")
         self.images_dir = os.path.join(self.base_path, "img_generated")
         self.logs_dir = os.path.join(self.base_path, "logs")
-        
-        # Initialize logging
+        self.image_cache_dir = os.path.join(self.base_path, "image_cache")  # Не удаляется при очистке
+        self.prompt_cache_dir = os.path.join(self.base_path, "prompt_cache")  # Рядом с prompts_for_img, не удаляется при очистке
+        self.history_dir = os.path.join(self.base_path, "history")  # Промпты и изображения прошлых запусков
+        
+        # Headless-режим: без вопросов в stdin; quiet - в stdout только путь к результату
+        self.interactive = True
+        self.quiet = False
+        
+        # Рабочий каталог запуска (изоляция одновременных запусков)
+        self.run_id = None
+        self.workspace_dir = None
+        self.scratch_dir = None
+        self.deck_name = None  # имя презентации в пакетной генерации
+        self.workspace_settings = {'enabled': False, 'root': None, 'tmpfs': False}
+        
+        # Логирование настраивается после загрузки конфигурации и выбора рабочего каталога
         self.logger = None
-        self._setup_logging()
         
         # API credentials (will be loaded from config)
         self.claude_api_key = ""
         self.openai_api_key = ""
         self.gemini_api_key = ""
+        
+        # Движок генерации AI-иллюстраций ('threads' или 'asyncio') и лимиты asyncio
+        self.generation_engine = 'threads'
+        self.async_concurrency = dict(self.ASYNC_CONCURRENCY)
+        self.rate_limits = {provider: dict(limits) for provider, limits in self.DEFAULT_RATE_LIMITS.items()}
+        self.retry_settings = {}
+        self.worker_settings = {}
+        self.worker_overrides = {}  # Значения из командной строки
+        self.generation_deadline_seconds = self.GENERATION_DEADLINE_SECONDS
+        self.run_deadline = None  # time.monotonic() дедлайна текущей генерации: ограничивает запросы и повторы
+        self._blocking_executor = None  # Пул блокирующих вызовов asyncio-движка
+        self.build_mode = 'two_pass'  # 'single_pass' - сборка с иллюстрациями и одно сохранение
+        self.template_decorations = 'per_slide'  # 'layout' - изображения шаблона один раз в макете
+        self.image_cache_settings = {'enabled': True, 'max_mb': 500}
+        self.persist_images = True  # Фоновая запись изображений в img_generated (нужна для --resume и истории)
+        self.prompt_cache_settings = {'enabled': True, 'refresh': False}
+        self.incremental_build = True  # Переиспользовать результаты прошлой сборки по манифесту
+        self.api_base_urls = dict(self.DEFAULT_API_BASE_URLS)
+        # Уменьшение AI-изображений до размера на слайде: dpi, формат ('auto', 'png', 'jpeg'), качество JPEG
+        self.image_optimization = {'enabled': True, 'dpi': self.IMAGE_DPI, 'format': 'auto', 'jpeg_quality': 85}
+        self.image_optimization_totals = {'images': 0, 'bytes_before': 0, 'bytes_after': 0}
         self._load_config()
         
+        if workspace:
+            self.workspace_settings.update({key: value for key, value in workspace.items() if value is not None})
+            self.workspace_settings['enabled'] = True
+        if self.workspace_settings.get('enabled'):
+            self._setup_workspace()
+        
+        # Initialize logging
+        self._setup_logging(console=console_log)
+        
+        # Число воркеров уточняется под выбранную модель перед генерацией
+        self.prompt_workers = self.PROMPT_WORKERS
+        self.image_workers = self.IMAGE_WORKERS
+        
+        # Политика повторов для промптов и всех бэкендов изображений
+        self.retry_policy = RetryPolicy(**self.retry_settings)
+        
+        # Лимитеры запросов, общие для всех воркеров
+        self.rate_limiters = {
+            provider: RateLimiter(provider, limits.get('requests_per_minute'), limits.get('tokens_per_minute'))
+            for provider, limits in self.rate_limits.items()
+        }
+        
         # AI settings
         self.use_ai_illustrations = False
         self.slide_interval = 5  # Every 5th slide by default
         self.image_model = 'dall-e-3'  # Default image generation model
-        
+
+        # Общие HTTP-сессии провайдеров (keep-alive, пул по числу воркеров)
+        self.provider_sessions = ProviderSessions(pool_sizes={
+            'anthropic': self.prompt_workers,
+            'openai': self.image_workers
+        })
+
+        # SDK-клиенты создаются один раз и переиспользуются всеми воркерами
+        self.sdk_clients = SDKClientRegistry()
+
+        # Изображения текущего запуска передаются в сборку через память
+        self.image_store = ImageStore(persist=self.persist_images)
+
+        # Кэш изображений между запусками (None - отключен)
+        self.image_cache = None
+        if self.image_cache_settings.get('enabled', True):
+            self.image_cache_dir = self.image_cache_settings.get('dir') or self.image_cache_dir
+            self.image_cache = ImageCache(self.image_cache_dir,
+                                          int(float(self.image_cache_settings.get('max_mb', 500)) * 1024 * 1024))
+
+        # Кэш промптов Claude; refresh - не читать старые промпты, а перезаписать их новыми
+        self.prompt_cache = None
+        self.refresh_prompts = bool(self.prompt_cache_settings.get('refresh', False))
+        if self.prompt_cache_settings.get('enabled', True):
+            self.prompt_cache_dir = self.prompt_cache_settings.get('dir') or self.prompt_cache_dir
+            self.prompt_cache = PromptCache(self.prompt_cache_dir)
+
+        # Журнал AI-генерации для продолжения прерванного запуска (--resume)
+        self.generation_journal = GenerationJournal(self.journal_file)
+        self.resume = False
+        self.resumed_prompts = {}
+
         # New execution control systems
         self.execution_stats = ExecutionStats()
         self.checkpoints = ExecutionCheckpoints(self.execution_stats, self)
         
-        # Legacy stats for backward compatibility
-        self.generation_stats = {
-            'total_slides': 0,
-            'prompts_generated': 0,
-            'prompts_failed': 0,
-            'images_generated': 0,
-            'images_failed': 0
-        }
-        
+        self.content_text = None  # Текст контента вместо content_file (generate_deck)
+        self.content_records = None  # Готовые записи слайдов вместо разбора текста (generate_deck)
         self.slides_data = []
         self.template_images = []
+        self.template_bytes = None  # Шаблон читается с диска один раз (в пакетном режиме - на все презентации)
+        self.template_prs = None
         self.prs = None  # Для хранения ссылки на презентацию
+        self.generated_images = None  # {номер слайда: путь} для сборки в один проход
+        
+        # Инкрементальная сборка: манифест прошлой сборки и отпечатки слайдов
+        self.previous_manifest = None
+        self.slide_fingerprints = {}
+        self.deck_up_to_date = False
+        # Результат проверки пакета .pptx: общий для контрольной точки и финальной валидации
+        self.package_report = None
+        
+    def _setup_workspace(self):
+        """Переносит промпты, изображения, логи и результат в каталог запуска <root>/<run_id>"""
+        settings = self.workspace_settings
+        run_id = settings.get('run_id') or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.run_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(run_id))
+        
+        root = settings.get('root') or os.path.join(self.base_path, "runs")
+        self.workspace_dir = os.path.join(os.path.abspath(root), self.run_id)
+        self.scratch_dir = self.workspace_dir
+        
+        # Промежуточные файлы (промпты, изображения) можно держать в tmpfs
+        tmpfs = settings.get('tmpfs')
+        if tmpfs:
+            tmpfs_root = tmpfs if isinstance(tmpfs, str) else "/dev/shm"
+            if os.path.isdir(tmpfs_root):
+                self.scratch_dir = os.path.join(tmpfs_root, "rwtech", self.run_id)
+            else:
+                print(f"⚠️  Каталог tmpfs не найден: {tmpfs_root}, промежуточные файлы в {self.workspace_dir}")
+        
+        self._set_result_dir(os.path.join(self.workspace_dir, "pptx_result"))
+        self.logs_dir = os.path.join(self.workspace_dir, "logs")
+        self.prompts_dir = os.path.join(self.scratch_dir, "prompts_for_img")
+        self.images_dir = os.path.join(self.scratch_dir, "img_generated")
+        print(f"📂 Рабочий каталог запуска {self.run_id}: {self.workspace_dir}")
+    
+    def _set_result_dir(self, result_dir):
+        """Задает каталог результата и пути всех файлов сборки в нем"""
+        self.result_dir = result_dir
+        self.result_file = os.path.join(self.result_dir, "RWTech_Universal_Presentation.pptx")
+        self.illustrated_file = os.path.join(self.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
+        self.manifest_file = os.path.join(self.result_dir, "RWTech_Universal_Presentation.manifest.json")
+        self.journal_file = os.path.join(self.result_dir, "generation_journal.jsonl")
+    
+    def _set_output_file(self, output_file):
+        """Итоговая презентация в заданный файл; манифест и журнал сборки - рядом с ним"""
+        output_file = os.path.abspath(output_file)
+        base_name = os.path.splitext(output_file)[0]
+        self.result_dir = os.path.dirname(output_file)
+        self.result_file = output_file
+        self.illustrated_file = output_file
+        self.manifest_file = f"{base_name}.manifest.json"
+        self.journal_file = f"{base_name}.journal.jsonl"
+        self.generation_journal = GenerationJournal(self.journal_file)
+    
+    def dry_run(self):
+        """Проверка без сборки: файлы, разбор контента и план иллюстраций (без API и python-pptx)
+        
+        Returns:
+            код завершения: 0 - контент и шаблон в порядке
+        """
+        print("🧪 Пробный запуск: проверка файлов и контента без сборки презентации")
+        try:
+            for path, label in ((self.content_file, "Файл с контентом"), (self.template_file, "Файл шаблона")):
+                if not os.path.exists(path):
+                    raise GenerationError(f"{label} не найден: {path}", exit_code=1)
+            self.parse_content()
+        except GenerationError as e:
+            print(f"ОШИБКА: {e}")
+            if self.quiet:
+                print(f"ОШИБКА: {e}", file=sys.__stderr__)
+            return e.exit_code
+        
+        slide_types = {}
+        for slide_data in self.slides_data:
+            slide_types[slide_data['type']] = slide_types.get(slide_data['type'], 0) + 1
+        print(f"✅ Слайдов: {len(self.slides_data)} ({', '.join(f'{t}: {n}' for t, n in sorted(slide_types.items()))})")
         
+        if self.use_ai_illustrations:
+            planned = [s['number'] for s in self.slides_data if self._should_generate_illustration(s['number'], s)]
+            print(f"🎨 AI-иллюстраций ({self.image_model}): {len(planned)} - слайды {planned}")
+        result_file = self._final_file() if self.use_ai_illustrations else self.result_file
+        print(f"📄 Результат: {result_file}")
+        if self.quiet:
+            print(result_file, file=sys.__stdout__)
+        return 0
+    
     def validate_files(self):
         """Проверка существования всех необходимых файлов"""
         print("Проверка файлов...")
         
         if not os.path.exists(self.content_file):
             print(f"ОШИБКА: Файл с контентом не найден: {self.content_file}")
-            sys.exit(1)
+            raise GenerationError(f"Файл с контентом не найден: {self.content_file}", exit_code=1)
             
         if not os.path.exists(self.template_file):
             print(f"ОШИБКА: Файл шаблона не найден: {self.template_file}")
-            sys.exit(1)
+            raise GenerationError(f"Файл шаблона не найден: {self.template_file}", exit_code=1)
             
+        self._ensure_directories()
+        print("Все файлы найдены ✓")
+
+    def _ensure_directories(self):
+        """Создает каталоги результата, промптов, изображений и логов"""
         # Создаем директорию результата если не существует
         if not os.path.exists(self.result_dir):
             os.makedirs(self.result_dir)
@@ -782,16 +2077,17 @@ class RWTechPPTXGenerator:
         if not os.path.exists(self.logs_dir):
             os.makedirs(self.logs_dir)
             print(f"Создана директория для логов: {self.logs_dir}")
-            
-        print("Все файлы найдены ✓")
 
     def setup_ai_illustrations(self, interactive=True):
         """Интерактивная настройка AI иллюстраций"""
         print("\n=== Настройка AI-иллюстраций ===")
         
         if not interactive:
-            print("Режим без интерактивного ввода: AI-иллюстрации отключены")
-            self.use_ai_illustrations = False
+            # Параметры заданы заранее (командная строка или generate_deck)
+            if self.use_ai_illustrations:
+                print(f"Режим без интерактивного ввода: AI-иллюстрации для каждого {self.slide_interval}-го слайда, модель {self.image_model}")
+            else:
+                print("Режим без интерактивного ввода: AI-иллюстрации отключены")
             return
             
         print("Хотите ли вы генерировать AI-иллюстрации для слайдов?")
@@ -899,8 +2195,15 @@ class RWTechPPTXGenerator:
             print("✓ Изображения будут сохранены в директории img_generated/")
             print("✓ Промпты для генерации будут сохранены в директории prompts_for_img/")
 
-    def _setup_logging(self):
-        """Настраивает систему логирования"""
+    def _setup_logging(self, console=True):
+        """Настраивает логгер генератора: файл в logs_dir и, для CLI, вывод в stderr
+        
+        Логгер не регистрируется в logging и не трогает корневой логгер приложения:
+        записи передаются родителю LOGGER_NAME, обработчики закрывает _close_logging.
+        """
+        self.log_handlers = []
+        self.logger = logging.Logger(f"{LOGGER_NAME}.{self.run_id or 'main'}", logging.INFO)
+        self.logger.parent = logging.getLogger(LOGGER_NAME)
         try:
             if not hasattr(self, 'logs_dir'):
                 self.logs_dir = os.path.join(self.base_path, "logs")
@@ -911,26 +2214,31 @@ class RWTechPPTXGenerator:
             log_filename = f"generation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
             log_path = os.path.join(self.logs_dir, log_filename)
             
-            # Настройка логгера
-            logging.basicConfig(
-                level=logging.INFO,
-                format='%(asctime)s - %(levelname)s - %(message)s',
-                handlers=[
-                    logging.FileHandler(log_path, encoding='utf-8'),
-                    logging.StreamHandler()
-                ]
-            )
+            # Настройка обработчиков
+            handlers = [logging.FileHandler(log_path, encoding='utf-8')]
+            if console:
+                handlers.append(logging.StreamHandler())
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            for handler in handlers:
+                handler.setFormatter(formatter)
+                self.logger.addHandler(handler)
+            self.log_handlers = handlers
             
-            self.logger = logging.getLogger(__name__)
             self.logger.info(f"Логирование настроено. Файл лога: {log_path}")
             
         except Exception as e:
             print(f"Предупреждение: Не удалось настроить логирование: {e}")
-            self.logger = logging.getLogger(__name__)
+
+    def _close_logging(self):
+        """Отключает и закрывает обработчики логгера генератора (файл лога можно удалять)"""
+        for handler in self.log_handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        self.log_handlers = []
 
     def _load_config(self):
         """Загружает конфигурацию из файла или переменных окружения"""
-        config_path = os.path.join(self.base_path, 'config.json')
+        config_path = self.config_file
         
         # Попытка загрузить из файла
         if os.path.exists(config_path):
@@ -941,15 +2249,41 @@ class RWTechPPTXGenerator:
                     self.openai_api_key = config.get('openai_api_key', '')
                     self.gemini_api_key = config.get('gemini_api_key', '')
                     self.image_model = config.get('image_model', 'dall-e-3')
+                    self.generation_engine = config.get('generation_engine', self.generation_engine)
+                    self.async_concurrency.update(config.get('async_concurrency', {}))
+                    for provider, limits in config.get('rate_limits', {}).items():
+                        self.rate_limits.setdefault(provider, {}).update(limits)
+                    self.retry_settings.update(config.get('retry_policy', {}))
+                    self.worker_settings.update(config.get('workers', {}))
+                    self.generation_deadline_seconds = config.get('generation_deadline_seconds', self.generation_deadline_seconds)
+                    self.build_mode = config.get('build_mode', self.build_mode)
+                    self.template_decorations = config.get('template_decorations', self.template_decorations)
+                    self.image_cache_settings.update(config.get('image_cache', {}))
+                    self.persist_images = config.get('persist_images', self.persist_images)
+                    self.prompt_cache_settings.update(config.get('prompt_cache', {}))
+                    self.incremental_build = config.get('incremental_build', self.incremental_build)
+                    self.workspace_settings.update(config.get('workspace', {}))
+                    self.image_optimization.update(config.get('image_optimization', {}))
+                    self.api_base_urls.update(config.get('api_base_urls', {}))
                     if self.logger:
                         self.logger.info("Конфигурация загружена из файла config.json")
             except Exception as e:
                 print(f"Предупреждение: Ошибка чтения config.json: {e}")
         
+        # Неположительный dpi сжал бы каждую иллюстрацию до пары пикселей
+        dpi = self.image_optimization.get('dpi')
+        if isinstance(dpi, bool) or not isinstance(dpi, (int, float)) or dpi <= 0:
+            print(f"⚠️  Некорректное image_optimization.dpi в config.json: {dpi!r}, используется {self.IMAGE_DPI}")
+            if self.logger:
+                self.logger.warning(f"Некорректное image_optimization.dpi: {dpi!r}, используется {self.IMAGE_DPI}")
+            self.image_optimization['dpi'] = self.IMAGE_DPI
+        
         # Переменные окружения имеют приоритет
         self.claude_api_key = os.environ.get('CLAUDE_API_KEY', self.claude_api_key)
         self.openai_api_key = os.environ.get('OPENAI_API_KEY', self.openai_api_key)
         self.gemini_api_key = os.environ.get('GEMINI_API_KEY', self.gemini_api_key)
+        for provider, env_name in self.API_BASE_URL_ENV.items():
+            self.api_base_urls[provider] = os.environ.get(env_name, self.api_base_urls[provider])
         
         # Если ключей нет, используем встроенные значения как fallback
         # API keys should be provided through config.json or environment variables
@@ -962,27 +2296,44 @@ class RWTechPPTXGenerator:
 
     def _save_config(self):
         """Сохраняет конфигурацию в файл"""
-        config_path = os.path.join(self.base_path, 'config.json')
-        config = {
+        config_path = self.config_file
+        
+        # Сохраняем остальные настройки, заданные в файле вручную
+        config = {}
+        if os.path.exists(config_path):
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except Exception:
+                config = {}
+        
+        config.update({
             'claude_api_key': self.claude_api_key,
             'openai_api_key': self.openai_api_key,
             'gemini_api_key': self.gemini_api_key,
             'image_model': self.image_model
-        }
+        })
         
         try:
-            with open(config_path, 'w', encoding='utf-8') as f:
+            # Атомарная запись: одновременные запуски не читают недописанный файл
+            tmp_path = f"{config_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=2)
+            os.replace(tmp_path, config_path)
             print(f"✓ Конфигурация сохранена в {config_path}")
             if self.logger:
                 self.logger.info(f"Конфигурация сохранена в {config_path}")
         except Exception as e:
             print(f"Ошибка сохранения конфигурации: {e}")
 
+    def _api_url(self, provider, path):
+        """Полный адрес эндпоинта провайдера с учетом переопределенного базового адреса"""
+        return self.api_base_urls[provider].rstrip('/') + path
+    
     def _test_claude_connection(self):
         """Тестирует соединение с Claude API"""
         try:
-            url = "https://api.anthropic.com/v1/messages"
+            url = self._api_url('anthropic', '/v1/messages')
             headers = {
                 "x-api-key": self.claude_api_key,
                 "anthropic-version": "2023-06-01",
@@ -996,7 +2347,7 @@ class RWTechPPTXGenerator:
                 "messages": [{"role": "user", "content": "Hi"}]
             }
             
-            response = requests.post(url, headers=headers, json=data, timeout=10)
+            response = self.provider_sessions.get('anthropic').post(url, headers=headers, json=data, timeout=10)
             
             return {
                 'success': response.status_code == 200,
@@ -1016,13 +2367,13 @@ class RWTechPPTXGenerator:
     def _test_openai_connection(self):
         """Тестирует соединение с OpenAI API"""
         try:
-            url = "https://api.openai.com/v1/models"
+            url = self._api_url('openai', '/models')
             headers = {
                 "Authorization": f"Bearer {self.openai_api_key}",
                 "Content-Type": "application/json"
             }
             
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.provider_sessions.get('openai').get(url, headers=headers, timeout=10)
             
             return {
                 'success': response.status_code == 200,
@@ -1042,9 +2393,7 @@ class RWTechPPTXGenerator:
     def _validate_and_update_api_keys(self, interactive=True):
         """СТРОГАЯ валидация API ключей с циклом до успеха"""
         if not interactive:
-            print("Режим без интерактивного ввода: пропуск валидации API ключей")
-            self.execution_stats.set('api_validation_success', False)
-            return False
+            return self._validate_api_keys_once()
         
         print("\n🔒 СТРОГАЯ ВАЛИДАЦИЯ API КЛЮЧЕЙ")
         print("Программа не будет продолжена без рабочих ключей!")
@@ -1193,6 +2542,31 @@ class RWTechPPTXGenerator:
         
         return True
     
+    def _validate_api_keys_once(self):
+        """Проверка API ключей без ввода с клавиатуры: ключи из config.json/окружения, одна попытка"""
+        checks = [('Claude', self.claude_api_key, self._test_claude_connection)]
+        if self.image_model in ['dall-e-3', 'gpt-image-1']:
+            checks.append(('OpenAI', self.openai_api_key, self._test_openai_connection))
+        elif self.image_model in ['gemini-2.0-flash', 'imagen-3']:
+            checks.append(('Google', self.gemini_api_key, self._test_gemini_connection))
+        
+        for name, api_key, test_connection in checks:
+            self.execution_stats.increment('api_validation_attempts')
+            if not api_key:
+                print(f"❌ API ключ {name} отсутствует (config.json или переменные окружения)")
+                self.execution_stats.set('api_validation_success', False)
+                return False
+            
+            test_result = test_connection()
+            if not test_result['success']:
+                print(f"❌ {name} API: ошибка подключения ({test_result['status_code']}): {test_result['error']}")
+                self.execution_stats.set('api_validation_success', False)
+                return False
+            print(f"✅ {name} API: подключение успешно")
+        
+        self.execution_stats.set('api_validation_success', True)
+        return True
+    
     def _request_claude_key(self):
         """Запрашивает новый ключ Claude у пользователя"""
         try:
@@ -1224,10 +2598,8 @@ class RWTechPPTXGenerator:
     def _test_gemini_connection(self):
         """Тестирует соединение с Google Gemini API"""
         try:
-            from google import genai
-            
-            # Инициализируем клиент
-            client = genai.Client(api_key=self.gemini_api_key)
+            # Инициализируем клиент (общий с генерацией изображений)
+            client = self.sdk_clients.genai_client(self.gemini_api_key, self.api_base_urls['google'])
             
             # Пробуем получить список моделей
             models = client.models.list()
@@ -1333,15 +2705,25 @@ class RWTechPPTXGenerator:
             pass
 
     def parse_content(self):
-        """Парсинг содержимого slide_content.txt"""
+        """Парсинг содержимого slide_content.txt (или текста/записей, переданных через generate_deck)"""
         print("Парсинг контента...")
         
+        if self.content_records is not None:
+            self.slides_data.extend(self._slide_record(record) for record in self.content_records)
+            if not self.slides_data:
+                raise GenerationError("Не передано ни одного слайда", exit_code=1)
+            print(f"Найдено слайдов: {len(self.slides_data)}")
+            return
+        
         try:
-            with open(self.content_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            if self.content_text is not None:
+                content = self.content_text
+            else:
+                with open(self.content_file, 'r', encoding='utf-8') as f:
+                    content = f.read()
         except Exception as e:
             print(f"ОШИБКА при чтении файла контента: {e}")
-            sys.exit(1)
+            raise GenerationError(f"Ошибка при чтении файла контента: {e}", exit_code=1)
             
         # Регулярное выражение для поиска слайдов
         slide_pattern = r'### СЛАЙД (\d+): (.+?)(?=### СЛАЙД \d+:|$)'
@@ -1349,7 +2731,7 @@ class RWTechPPTXGenerator:
         
         if not slides:
             print("ОШИБКА: Не найдено ни одного слайда в файле контента")
-            sys.exit(1)
+            raise GenerationError("Не найдено ни одного слайда в файле контента", exit_code=1)
             
         for slide_num, slide_content in slides:
             slide_data = self._parse_slide_content(int(slide_num), slide_content.strip())
@@ -1358,6 +2740,22 @@ class RWTechPPTXGenerator:
                 
         print(f"Найдено слайдов: {len(self.slides_data)}")
 
+    def _slide_record(self, record):
+        """Запись слайда из словаря (number, title, body, illustration, type)"""
+        try:
+            slide_num = int(record['number'])
+        except (KeyError, TypeError, ValueError):
+            raise GenerationError(f"Некорректная запись слайда (нужен номер): {record!r}", exit_code=1)
+        title = record.get('title', '')
+        body = record.get('body', '')
+        return {
+            'number': slide_num,
+            'title': title,
+            'body': body,
+            'illustration': record.get('illustration', ''),
+            'type': record.get('type') or self._determine_slide_type(slide_num, title, body)
+        }
+
     def _parse_slide_content(self, slide_num, content):
         """Парсинг содержимого отдельного слайда"""
         # Извлекаем заголовок
@@ -1399,17 +2797,22 @@ class RWTechPPTXGenerator:
 
     def load_template(self):
         """Загрузка шаблона и извлечение изображений"""
+        from pptx import Presentation
+        from pptx.enum.shapes import MSO_SHAPE_TYPE
         print("Загрузка шаблона...")
         
         try:
-            self.template_prs = Presentation(self.template_file)
+            if self.template_bytes is None:
+                with open(self.template_file, 'rb') as f:
+                    self.template_bytes = f.read()
+            self.template_prs = Presentation(BytesIO(self.template_bytes))
         except Exception as e:
             print(f"ОШИБКА при загрузке шаблона: {e}")
-            sys.exit(1)
+            raise GenerationError(f"Ошибка при загрузке шаблона: {e}", exit_code=1)
             
         if len(self.template_prs.slides) == 0:
             print("ОШИБКА: Шаблон не содержит слайдов")
-            sys.exit(1)
+            raise GenerationError("Шаблон не содержит слайдов", exit_code=1)
             
         # Анализируем первый слайд шаблона
         first_slide = self.template_prs.slides[0]
@@ -1431,12 +2834,18 @@ class RWTechPPTXGenerator:
         print(f"Размер слайда в шаблоне: {self.template_prs.slide_width} x {self.template_prs.slide_height}")
         print(f"Соотношение сторон шаблона: {self.template_prs.slide_width / self.template_prs.slide_height:.2f}")
 
-    def generate_presentation(self):
-        """Генерация итоговой презентации с правильным соотношением сторон"""
+    def generate_presentation(self, output_file=None):
+        """Генерация итоговой презентации с правильным соотношением сторон
+        
+        Args:
+            output_file: путь сохранения, по умолчанию result_file
+        """
+        from pptx import Presentation
+        output_file = output_file or self.result_file
         print("Генерация презентации...")
         
         # ИСПРАВЛЕНИЕ: Создаем презентацию на основе шаблона для сохранения размеров 16:9
-        self.prs = Presentation(self.template_file)
+        self.prs = Presentation(BytesIO(self.template_bytes) if self.template_bytes else self.template_file)
         
         # Проверяем размеры презентации
         print(f"Размер слайда в новой презентации: {self.prs.slide_width} x {self.prs.slide_height}")
@@ -1448,6 +2857,10 @@ class RWTechPPTXGenerator:
             self.prs.part.drop_rel(rId)
             del self.prs.slides._sldIdLst[0]
         
+        # Изображения шаблона один раз в макете - слайды наследуют их
+        if self.template_decorations == 'layout':
+            self._install_template_decorations(self.prs)
+        
         # Генерируем каждый слайд
         for idx, slide_data in enumerate(self.slides_data):
             slide_number = idx + 1  # Номер слайда (начиная с 1)
@@ -1455,20 +2868,71 @@ class RWTechPPTXGenerator:
             
         # Сохраняем презентацию
         try:
-            self.prs.save(self.result_file)
-            print(f"Презентация сохранена: {self.result_file}")
+            self.prs.save(output_file)
+            print(f"Презентация сохранена: {output_file}")
         except Exception as e:
             print(f"ОШИБКА при сохранении презентации: {e}")
-            sys.exit(1)
+            raise GenerationError(f"Ошибка при сохранении презентации: {e}", exit_code=1)
+
+    def _install_template_decorations(self, prs):
+        """Добавляет изображения шаблона в пустой макет, используемый _create_slide
 
+        У LayoutShapes нет add_picture, поэтому код опирается на внутренности oxml python-pptx
+        (cSld.spTree.add_pic, image_part.desc; проверено на 1.0.x тестом
+        tests/test_layout_decorations.py). Если они изменятся, добавленные рисунки
+        откатываются и режим переключается на 'per_slide'; возвращает успех.
+        """
+        slide_layout = prs.slide_layouts[6]  # Пустой макет
+        added = []
+        try:
+            sp_tree = slide_layout.element.cSld.spTree
+            shape_id = max([shape.shape_id for shape in slide_layout.shapes], default=0) + 1
+            for img_data in self.template_images:
+                # Часть изображения добавляется (и хэшируется) один раз на всю презентацию
+                image_part, rId = slide_layout.part.get_or_add_image_part(BytesIO(img_data['image_blob']))
+                pic = sp_tree.add_pic(
+                    shape_id,
+                    f"Template Picture {shape_id}",
+                    image_part.desc,
+                    rId,
+                    img_data['left'],
+                    img_data['top'],
+                    img_data['width'],
+                    img_data['height']
+                )
+                added.append((pic, rId))
+                shape_id += 1
+                
+                # Применяем поворот если есть
+                if img_data['rotation']:
+                    pic.rot = img_data['rotation']
+        except (AttributeError, TypeError) as e:
+            # Откатываем частично добавленные рисунки, чтобы они не задвоились на слайдах
+            for pic, rId in added:
+                pic.getparent().remove(pic)
+                slide_layout.part.drop_rel(rId)
+            self.template_decorations = 'per_slide'
+            print(f"⚠️  Не удалось добавить изображения шаблона в макет ({e}), используется режим per_slide")
+            if self.logger:
+                self.logger.warning(f"Изображения шаблона в макете не поддерживаются этой версией python-pptx: {e}")
+            return False
+        
+        if self.logger:
+            self.logger.info(f"Изображения шаблона ({len(self.template_images)}) добавлены в макет '{slide_layout.name}'")
+        return True
+    
+    def _template_pictures_for_slides(self):
+        """Изображения шаблона, которые добавляются на каждый слайд"""
+        return [] if self.template_decorations == 'layout' else self.template_images
+    
     def _create_slide(self, prs, slide_data, slide_number):
         """Создание отдельного слайда"""
         # Добавляем пустой слайд
         slide_layout = prs.slide_layouts[6]  # Пустой макет
         slide = prs.slides.add_slide(slide_layout)
         
-        # Добавляем все изображения из шаблона
-        for img_data in self.template_images:
+        # Добавляем все изображения из шаблона (в режиме 'layout' они уже в макете)
+        for img_data in self._template_pictures_for_slides():
             # Создаем поток из бинарных данных
             image_stream = BytesIO(img_data['image_blob'])
             
@@ -1493,6 +2957,8 @@ class RWTechPPTXGenerator:
 
     def _add_normal_slide_content(self, slide, slide_data, slide_number):
         """Добавление контента для обычного слайда с улучшенным стилем"""
+        from pptx.util import Pt, Inches
+        from pptx.enum.text import PP_ALIGN
         # Получаем размеры слайда
         slide_width = self.prs.slide_width
         slide_height = self.prs.slide_height
@@ -1523,12 +2989,19 @@ class RWTechPPTXGenerator:
         
         # Добавляем AI-иллюстрацию если нужно
         if self._should_generate_illustration(slide_number, slide_data):
-            image_filename = f"slide_{slide_number:02d}_illustration.png"
-            image_path = os.path.join(self.images_dir, image_filename)
-            self._add_ai_illustration_to_slide(slide, image_path, slide_data, slide_number)
+            if self.generated_images is not None:
+                # Сборка в один проход: только изображения текущего запуска
+                image_path = self.generated_images.get(slide_number)
+            else:
+                image_filename = f"slide_{slide_number:02d}_illustration.png"
+                image_path = os.path.join(self.images_dir, image_filename)
+            if image_path:
+                self._add_ai_illustration_to_slide(slide, image_path, slide_data, slide_number)
     
     def _add_styled_body_text(self, slide, body_text, is_left_aligned):
         """Добавляет стилизованный текстовый блок с улучшенным позиционированием"""
+        from pptx.util import Pt, Inches
+        from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
         slide_width = self.prs.slide_width
         slide_height = self.prs.slide_height
         
@@ -1616,6 +3089,8 @@ class RWTechPPTXGenerator:
     
     def _add_title_slide_content(self, slide, slide_data):
         """Улучшенное оформление заглавного слайда с переносом строк"""
+        from pptx.util import Pt, Inches
+        from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
         slide_width = self.prs.slide_width
         slide_height = self.prs.slide_height
         margin = slide_width * 0.05
@@ -1670,6 +3145,8 @@ class RWTechPPTXGenerator:
     
     def _add_quote_slide_content(self, slide, slide_data):
         """Улучшенное оформление слайдов с цитатами"""
+        from pptx.util import Pt, Inches
+        from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
         slide_width = self.prs.slide_width
         slide_height = self.prs.slide_height
         margin = slide_width * 0.05
@@ -1725,6 +3202,8 @@ class RWTechPPTXGenerator:
     
     def _add_generic_special_slide_content(self, slide, slide_data):
         """Обычное оформление спецслайдов (перерывы)"""
+        from pptx.util import Pt, Inches
+        from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
         slide_width = self.prs.slide_width
         slide_height = self.prs.slide_height
         margin = slide_width * 0.05
@@ -1778,18 +3257,243 @@ class RWTechPPTXGenerator:
         """
         Генерирует детальный промпт для DALL-E 3 с использованием лучших практик
         """
+        self.execution_stats.increment('prompts_attempted')
+        dalle_prompt = self._get_cached_prompt(slide_data)
+        if dalle_prompt:
+            self._record_prompt_result(slide_data, dalle_prompt)
+            return dalle_prompt
+        
+        with self.execution_stats.timer('prompt'):
+            try:
+                dalle_prompt = self._request_image_prompt(slide_data)
+            finally:
+                self._record_prompt_result(slide_data, dalle_prompt)
+        return dalle_prompt
+    
+    def _prompt_cache_key(self, slide_data):
+        """Ключ кэша промпта: содержимое слайда, версия системного промпта и модель"""
+        return PromptCache.make_key(
+            slide_data.get('title', ''),
+            slide_data.get('body', ''),
+            slide_data.get('illustration') or '',
+            self.PROMPT_VERSION,
+            self.PROMPT_MODEL
+        )
+    
+    def _get_cached_prompt(self, slide_data):
+        """Возвращает ранее проверенный промпт для неизмененного слайда"""
+        resumed_prompt = self.resumed_prompts.pop(slide_data['number'], None)
+        if resumed_prompt:
+            self._write_prompt_file(slide_data, "DALL-E Prompt", resumed_prompt)
+            print(f"📓 Промпт для слайда {slide_data['number']} восстановлен из журнала")
+            return resumed_prompt
+        
+        if self.prompt_cache is None or self.refresh_prompts:
+            return None
+        
+        cached_prompt = self.prompt_cache.get(self._prompt_cache_key(slide_data))
+        if not cached_prompt:
+            self.execution_stats.increment('prompt_cache_misses')
+            return None
+        
+        self.execution_stats.increment('prompt_cache_hits')
+        self._write_prompt_file(slide_data, "DALL-E Prompt", cached_prompt)
+        print(f"💾 Промпт для слайда {slide_data['number']} взят из кэша")
+        if self.logger:
+            self.logger.info(f"Кэш промптов: попадание для слайда {slide_data['number']}")
+        return cached_prompt
+    
+    def _write_prompt_file(self, slide_data, label, prompt):
+        """Сохраняет промпт слайда в prompts_for_img"""
+        prompt_filename = f"slide_{slide_data['number']:02d}_prompt.txt"
+        prompt_path = os.path.join(self.prompts_dir, prompt_filename)
+        
+        with open(prompt_path, 'w', encoding='utf-8') as f:
+            f.write(f"Слайд {slide_data['number']}: {slide_data['title']}\n\n")
+            f.write(f"Содержание:\n{slide_data['body']}\n\n")
+            f.write(f"{label}:\n{prompt}")
+    
+    def _record_prompt_result(self, slide_data, dalle_prompt):
+        """Единственное место учета результата генерации промпта"""
+        self.execution_stats.increment('prompts_generated' if dalle_prompt else 'prompts_failed')
+        if dalle_prompt:
+            self._journal_event('prompt', slide_data['number'], prompt=dalle_prompt)
+    
+    def _request_image_prompt(self, slide_data):
+        """Запрашивает промпт у Claude, при ошибке использует шаблоны"""
         try:
-            import requests
+            url, headers, data = self._build_prompt_request(slide_data)
+            estimated_tokens = self._estimate_prompt_tokens(data)
             
-            url = "https://api.anthropic.com/v1/messages"
-            headers = {
-                "x-api-key": self.claude_api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json"
-            }
+            response = self._post_with_retry('anthropic', url, headers, data, timeout=30,
+                                             tokens=estimated_tokens, slide_number=slide_data['number'])
+            
+            if response.status_code == 200:
+                result = response.json()
+                self._settle_prompt_tokens(estimated_tokens, result)
+                return self._handle_prompt_response(slide_data, result)
+            else:
+                self.logger.error(f"Ошибка Claude API: {response.status_code}")
+                # Fallback к шаблонам при ошибке API
+                return self._generate_fallback_prompt(slide_data)
+                
+        except Exception as e:
+            self.logger.error(f"Ошибка генерации промпта: {e}")
+            # Fallback к шаблонам при ошибке
+            return self._generate_fallback_prompt(slide_data)
+    
+    def _estimate_prompt_tokens(self, data):
+        """Грубая оценка токенов запроса к Claude для лимитера (вход + max_tokens)"""
+        chars = len(data.get('system', '')) + sum(len(m['content']) for m in data.get('messages', []))
+        return chars // 3 + data.get('max_tokens', 0)
+    
+    def _settle_prompt_tokens(self, estimated_tokens, result):
+        """Передает лимитеру фактический расход токенов из ответа Claude"""
+        usage = result.get('usage') or {}
+        if usage:
+            actual = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+            self.rate_limiters['anthropic'].settle(estimated_tokens, actual)
+    
+    def _post_with_retry(self, provider, url, headers, data, timeout, tokens=0, slide_number=None, stream=False):
+        """POST через лимитер провайдера с повторами временных сбоев по политике повторов
+        
+        stream=True - тело ответа не загружается целиком (читается через iter_content)
+        """
+        limiter = self.rate_limiters[provider]
+        session = self.provider_sessions.get(provider)
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            limiter.acquire(tokens)
+            attempt_timeout = self._request_timeout(timeout)
+            self.execution_stats.increment('total_api_calls')
+            try:
+                response = session.post(url, headers=headers, json=data, timeout=attempt_timeout, stream=stream)
+            except Exception as e:
+                if not (self.retry_policy.is_retryable_exception(e) and
+                        self.retry_policy.try_spend(attempt, slide_number)):
+                    raise
+                delay = self._register_retry(provider, slide_number, attempt, type(e).__name__)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            
+            pause = limiter.update_from_headers(response.headers, response.status_code)
+            if not (self.retry_policy.is_retryable_status(response.status_code) and
+                    self.retry_policy.try_spend(attempt, slide_number)):
+                return response
+            delay = self._register_retry(provider, slide_number, attempt, f"HTTP {response.status_code}", pause)
+            if delay is None:
+                return response
+            response.close()  # Возвращаем соединение в пул до повтора
+            # Пауза лимитера (Retry-After) отсчитывается в acquire, здесь добираем backoff
+            time.sleep(max(0.0, delay - pause))
+    
+    async def _post_with_retry_async(self, client, provider, url, headers, data, timeout, tokens=0, slide_number=None,
+                                     stream=False):
+        """Асинхронный вариант _post_with_retry для asyncio-движка (stream=True - читать через aiter_bytes)"""
+        import asyncio
+        limiter = self.rate_limiters[provider]
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            await limiter.acquire_async(tokens)
+            attempt_timeout = self._request_timeout(timeout)
+            self.execution_stats.increment('total_api_calls')
+            try:
+                if stream:
+                    request = client.build_request('POST', url, headers=headers, json=data, timeout=attempt_timeout)
+                    response = await client.send(request, stream=True)
+                else:
+                    response = await client.post(url, headers=headers, json=data, timeout=attempt_timeout)
+            except Exception as e:
+                if not (self.retry_policy.is_retryable_exception(e) and
+                        self.retry_policy.try_spend(attempt, slide_number)):
+                    raise
+                delay = self._register_retry(provider, slide_number, attempt, type(e).__name__)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
             
-            # Улучшенный системный промпт с детальными инструкциями
-            system_prompt = """Ты эксперт по созданию промптов для DALL-E 3. Создавай промпты, которые генерируют высококачественные, профессиональные изображения для бизнес-презентаций.
+            pause = limiter.update_from_headers(response.headers, response.status_code)
+            if not (self.retry_policy.is_retryable_status(response.status_code) and
+                    self.retry_policy.try_spend(attempt, slide_number)):
+                return response
+            delay = self._register_retry(provider, slide_number, attempt, f"HTTP {response.status_code}", pause)
+            if delay is None:
+                return response
+            await response.aclose()
+            await asyncio.sleep(max(0.0, delay - pause))
+    
+    def _call_sdk_with_retry(self, provider, call, slide_number=None):
+        """Вызов SDK через лимитер провайдера с повторами временных сбоев"""
+        limiter = self.rate_limiters[provider]
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            limiter.acquire()
+            self._request_timeout(None)  # После дедлайна новые вызовы SDK не начинаются
+            self.execution_stats.increment('total_api_calls')
+            try:
+                return call()
+            except Exception as e:
+                if not (self.retry_policy.is_retryable_exception(e) and
+                        self.retry_policy.try_spend(attempt, slide_number)):
+                    raise
+                response = getattr(e, 'response', None)
+                status_code = getattr(e, 'status_code', None) or getattr(e, 'code', None)
+                pause = limiter.update_from_headers(getattr(response, 'headers', None), status_code)
+                delay = self._register_retry(provider, slide_number, attempt, type(e).__name__, pause)
+                if delay is None:
+                    raise
+                time.sleep(max(0.0, delay - pause))
+    
+    def _request_timeout(self, timeout):
+        """Таймаут очередной попытки запроса, не выходящий за дедлайн генерации
+        
+        Raises:
+            TimeoutError: дедлайн уже прошел - новую попытку не начинаем
+        """
+        remaining = self._remaining_time(self.run_deadline)
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise TimeoutError("превышен дедлайн генерации")
+        return remaining if timeout is None else min(timeout, remaining)
+    
+    def _register_retry(self, provider, slide_number, attempt, reason, pause=0.0):
+        """Учитывает повтор в статистике и возвращает задержку перед ним; None - повтор не успевает до дедлайна"""
+        delay = max(self.retry_policy.backoff(attempt), pause)
+        remaining = self._remaining_time(self.run_deadline)
+        if remaining is not None and delay >= remaining:
+            print(f"⏰ {provider}: повтор для слайда {slide_number} не успевает до дедлайна генерации ({reason})")
+            if self.logger:
+                self.logger.warning(f"Повтор запроса к {provider} для слайда {slide_number} отменен: дедлайн генерации")
+            return None
+        self.execution_stats.increment('total_retries')
+        print(f"🔁 {provider}: повтор {attempt}/{self.retry_policy.max_attempts - 1} "
+              f"для слайда {slide_number} через {delay:.1f} с ({reason})")
+        if self.logger:
+            self.logger.warning(f"Повтор запроса к {provider} для слайда {slide_number}: "
+                                f"попытка {attempt + 1}, причина {reason}, задержка {delay:.1f} с")
+        return delay
+    
+    def _build_prompt_request(self, slide_data):
+        """Формирует запрос к Claude API для генерации промпта слайда"""
+        url = self._api_url('anthropic', '/v1/messages')
+        headers = {
+            "x-api-key": self.claude_api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+
+        # Улучшенный системный промпт с детальными инструкциями
+        system_prompt = """Ты эксперт по созданию промптов для DALL-E 3. Создавай промпты, которые генерируют высококачественные, профессиональные изображения для бизнес-презентаций.
 
 КРИТИЧЕСКИ ВАЖНЫЕ ТРЕБОВАНИЯ:
 1. ВСЕ изображения должны быть на АБСОЛЮТНО БЕЛОМ ФОНЕ - цвет #FFFFFF в RGB (255, 255, 255)
@@ -1817,10 +3521,10 @@ class RWTechPPTXGenerator:
 4. Технические параметры качества
 5. Освещение и детализация"""
 
-            # Расширенный пользовательский промпт с контекстом
-            illustration_hint = f"\n\nОПИСАНИЕ ИЛЛЮСТРАЦИИ ИЗ ФАЙЛА: {slide_data.get('illustration', 'Не указано')}" if slide_data.get('illustration') else ""
-            
-            user_prompt = f"""Презентация: Учебные материалы АО "Гознак" по искусственному интеллекту
+        # Расширенный пользовательский промпт с контекстом
+        illustration_hint = f"\n\nОПИСАНИЕ ИЛЛЮСТРАЦИИ ИЗ ФАЙЛА: {slide_data.get('illustration', 'Не указано')}" if slide_data.get('illustration') else ""
+
+        user_prompt = f"""Презентация: Учебные материалы АО "Гознак" по искусственному интеллекту
             
 Слайд №{slide_data['number']}
 Заголовок: {slide_data['title']}
@@ -1846,55 +3550,43 @@ class RWTechPPTXGenerator:
 
 Промпт должен быть на английском языке, детальным и генерировать изображение, которое РЕАЛЬНО ПОМОГАЕТ понять содержание слайда."""
 
-            data = {
-                "model": "claude-3-5-sonnet-20241022",
-                "max_tokens": 2048,
-                "temperature": 0.9,
-                "system": system_prompt,
-                "messages": [
-                    {
-                        "role": "user", 
-                        "content": user_prompt
-                    }
-                ]
-            }
-            
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                raw_prompt = result['content'][0]['text']
-                
-                # Постобработка промпта
-                enhanced_prompt = self._enhance_dalle_prompt(raw_prompt, slide_data)
-                
-                # Валидация качества промпта
-                validated_prompt = self._validate_prompt_quality(enhanced_prompt)
-                
-                # Сохраняем промпт в файл
-                prompt_filename = f"slide_{slide_data['number']:02d}_prompt.txt"
-                prompt_path = os.path.join(self.prompts_dir, prompt_filename)
-                
-                with open(prompt_path, 'w', encoding='utf-8') as f:
-                    f.write(f"Слайд {slide_data['number']}: {slide_data['title']}\n\n")
-                    f.write(f"Содержание:\n{slide_data['body']}\n\n")
-                    f.write(f"DALL-E Prompt:\n{validated_prompt}")
-                
-                # Обновляем статистику
-                self.execution_stats.increment('prompts_generated')
-                self.generation_stats['prompts_generated'] += 1
-                
-                self.logger.info(f"Промпт для слайда {slide_data['number']} создан: {validated_prompt[:100]}...")
-                return validated_prompt
-            else:
-                self.logger.error(f"Ошибка Claude API: {response.status_code}")
-                # Fallback к шаблонам при ошибке API
-                return self._generate_fallback_prompt(slide_data)
-                
-        except Exception as e:
-            self.logger.error(f"Ошибка генерации промпта: {e}")
-            # Fallback к шаблонам при ошибке
-            return self._generate_fallback_prompt(slide_data)
+        data = {
+            "model": self.PROMPT_MODEL,
+            "max_tokens": 2048,
+            "temperature": 0.9,
+            "system": system_prompt,
+            "messages": [
+                {
+                    "role": "user", 
+                    "content": user_prompt
+                }
+            ]
+        }
+        
+        return url, headers, data
+    
+    def _handle_prompt_response(self, slide_data, result):
+        """Обрабатывает успешный ответ Claude: улучшение, валидация и сохранение промпта"""
+        raw_prompt = result['content'][0]['text']
+        
+        # Постобработка промпта
+        enhanced_prompt = self._enhance_dalle_prompt(raw_prompt, slide_data)
+        
+        # Валидация качества промпта
+        validated_prompt = self._validate_prompt_quality(enhanced_prompt)
+        
+        # Сохраняем промпт в файл
+        self._write_prompt_file(slide_data, "DALL-E Prompt", validated_prompt)
+        
+        # В кэш попадают только промпты Claude (шаблонные при следующем запуске запрашиваются заново)
+        if self.prompt_cache is not None:
+            try:
+                self.prompt_cache.put(self._prompt_cache_key(slide_data), validated_prompt, slide_data['number'])
+            except Exception as e:
+                self.logger.warning(f"Ошибка записи в кэш промптов: {e}")
+        
+        self.logger.info(f"Промпт для слайда {slide_data['number']} создан: {validated_prompt[:100]}...")
+        return validated_prompt
     
     def _generate_fallback_prompt(self, slide_data):
         """
@@ -1910,17 +3602,7 @@ class RWTechPPTXGenerator:
         validated_prompt = self._validate_prompt_quality(enhanced_prompt)
         
         # Сохраняем промпт в файл
-        prompt_filename = f"slide_{slide_data['number']:02d}_prompt.txt"
-        prompt_path = os.path.join(self.prompts_dir, prompt_filename)
-        
-        with open(prompt_path, 'w', encoding='utf-8') as f:
-            f.write(f"Слайд {slide_data['number']}: {slide_data['title']}\n\n")
-            f.write(f"Содержание:\n{slide_data['body']}\n\n")
-            f.write(f"TEMPLATE Prompt:\n{validated_prompt}")
-        
-        # Обновляем статистику
-        self.execution_stats.increment('prompts_generated')
-        self.generation_stats['prompts_generated'] += 1
+        self._write_prompt_file(slide_data, "TEMPLATE Prompt", validated_prompt)
         
         self.logger.info(f"Шаблонный промпт для слайда {slide_data['number']} создан: {validated_prompt[:100]}...")
         return validated_prompt
@@ -2166,6 +3848,78 @@ class RWTechPPTXGenerator:
     
     def _generate_image_with_dalle(self, prompt, slide_number):
         """Генерирует изображение с помощью выбранной модели (DALL-E 3 или GPT-Image-1)"""
+        self.execution_stats.increment('images_attempted')
+        image_path = self._get_cached_image(prompt, slide_number)
+        if image_path:
+            self._record_image_result(slide_number, image_path)
+            return image_path
+        
+        with self.execution_stats.timer(f'image ({self.image_model})'):
+            try:
+                image_path = self._generate_image_with_model(prompt, slide_number)
+            finally:
+                self._record_image_result(slide_number, image_path)
+        self._store_cached_image(prompt, image_path)
+        return image_path
+    
+    def _image_cache_key(self, prompt):
+        """Ключ кэша изображения: модель, размер, качество и очищенный промпт"""
+        size, quality = self.IMAGE_CACHE_PARAMS.get(self.image_model, ('', ''))
+        clean_prompt = self._extract_clean_prompt_for_dalle(prompt)
+        return ImageCache.make_key(self.image_model, size, quality, clean_prompt)
+    
+    def _get_cached_image(self, prompt, slide_number):
+        """Берет изображение слайда из кэша до обращения к API"""
+        if self.image_cache is None:
+            return None
+        
+        image_path = os.path.join(self.images_dir, f"slide_{slide_number:02d}_illustration.png")
+        try:
+            image_data = self.image_cache.read(self._image_cache_key(prompt))
+            image_path = self.image_store.put(image_path, image_data) if image_data else None
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Ошибка чтения кэша изображений для слайда {slide_number}: {e}")
+            image_path = None
+        
+        if image_path:
+            self.execution_stats.increment('image_cache_hits')
+            print(f"💾 Изображение для слайда {slide_number} взято из кэша")
+            if self.logger:
+                self.logger.info(f"Кэш изображений: попадание для слайда {slide_number}")
+        else:
+            self.execution_stats.increment('image_cache_misses')
+        return image_path
+    
+    def _store_cached_image(self, prompt, image_path):
+        """Сохраняет новое изображение в кэш"""
+        if self.image_cache is None or not image_path:
+            return
+        try:
+            evicted = self.image_cache.put(self._image_cache_key(prompt), self.image_store.get(image_path))
+            if evicted:
+                self.execution_stats.increment('image_cache_evictions', evicted)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Ошибка записи в кэш изображений: {e}")
+    
+    def _record_image_result(self, slide_number, image_path):
+        """Единственное место учета результата генерации изображения"""
+        self.execution_stats.increment('images_generated' if image_path else 'images_failed')
+        if image_path:
+            self._journal_event('image', slide_number, image_path=image_path)
+    
+    def _journal_event(self, event, slide_number, **fields):
+        """Записывает готовый результат слайда в журнал генерации"""
+        try:
+            self.generation_journal.append(event, slide_number,
+                                           fingerprint=self.slide_fingerprints.get(slide_number), **fields)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Не удалось записать журнал генерации для слайда {slide_number}: {e}")
+    
+    def _generate_image_with_model(self, prompt, slide_number):
+        """Выбирает бэкенд генерации изображения по image_model"""
         # Используем цветной вывод из ColorfulUI.print_image_generation вместо этого
         
         # Извлекаем только английскую часть промпта для OpenAI API
@@ -2187,7 +3941,39 @@ class RWTechPPTXGenerator:
     
     def _generate_with_dalle_3(self, clean_prompt, slide_number):
         """Генерирует изображение с помощью DALL-E 3"""
-        url = "https://api.openai.com/v1/images/generations"
+        import requests
+        url, headers, data = self._build_dalle_3_request(clean_prompt)
+        
+        try:
+            response = self._post_with_retry('openai', url, headers, data, timeout=120,
+                                             slide_number=slide_number, stream=True)
+            
+            if response.status_code == 200:
+                with response:
+                    decoder = self._decode_image_stream(response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE))
+                return self._save_dalle_3_image(decoder.close(), slide_number)
+            else:
+                self._handle_dalle_3_error(slide_number, response.status_code, response.text,
+                                           response.headers, url, clean_prompt)
+                return None
+                
+        except requests.exceptions.Timeout:
+            self._record_dalle_3_failure(slide_number, "DALL-E API Timeout",
+                                         f"Таймаут при генерации изображения для слайда {slide_number}")
+            return None
+            
+        except requests.exceptions.ConnectionError:
+            self._record_dalle_3_failure(slide_number, "DALL-E API Connection Error",
+                                         f"Ошибка соединения с DALL-E API для слайда {slide_number}")
+            return None
+            
+        except Exception as e:
+            self._record_dalle_3_failure(slide_number, "Unexpected DALL-E API Error", None, e)
+            return None
+    
+    def _build_dalle_3_request(self, clean_prompt):
+        """Формирует запрос к DALL-E 3 API"""
+        url = self._api_url('openai', '/images/generations')
         headers = {
             'Authorization': f'Bearer {self.openai_api_key}',
             'Content-Type': 'application/json'
@@ -2202,109 +3988,82 @@ class RWTechPPTXGenerator:
             'response_format': 'b64_json'
         }
         
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=120)
-            
-            if response.status_code == 200:
-                result = response.json()
-                image_b64 = result['data'][0]['b64_json']
-                
-                # Сохраняем изображение
-                image_filename = f"slide_{slide_number:02d}_illustration.png"
-                image_path = os.path.join(self.images_dir, image_filename)
-                
-                with open(image_path, 'wb') as f:
-                    f.write(base64.b64decode(image_b64))
-                
-                print(f"✓ Изображение сохранено: {image_filename}")
-                
-                # Обновляем статистику
-                self.execution_stats.increment('images_generated')
-                self.generation_stats['images_generated'] += 1
-                
-                if self.logger:
-                    self.logger.info(f"Изображение для слайда {slide_number} успешно создано")
-                
-                return image_path
-                
-            else:
-                # Детальная информация об ошибке
-                error_info = {
-                    'slide_number': slide_number,
-                    'status_code': response.status_code,
-                    'response_text': response.text,
-                    'headers': dict(response.headers),
-                    'request_url': url,
-                    'prompt_preview': prompt[:100] + '...' if len(prompt) > 100 else prompt
-                }
-                
-                self._log_error("DALL-E API Error", error_info)
-                
-                # Обновляем статистику
-                self.execution_stats.increment('images_failed')
-                self.execution_stats.increment('total_errors')
-                self.generation_stats['images_failed'] += 1
-                
-                print(f"\n❌ Ошибка DALL-E API для слайда {slide_number}:")
-                print(f"   Статус: {response.status_code}")
-                print(f"   Endpoint: {url}")
-                
-                if response.status_code == 401:
-                    print("   → Ошибка авторизации: проверьте OpenAI API ключ")
-                elif response.status_code == 429:
-                    print("   → Превышен лимит запросов или недостаточно кредитов")
-                elif response.status_code == 400:
-                    print("   → Ошибка в промпте или параметрах")
-                    print(f"   → Ответ: {response.text[:200]}...")
-                else:
-                    print(f"   → HTTP {response.status_code}: {response.text[:200]}...")
-                    
-                return None
-                
-        except requests.exceptions.Timeout:
-            error_msg = f"Таймаут при генерации изображения для слайда {slide_number}"
-            print(f"❌ {error_msg}")
-            self._log_error("DALL-E API Timeout", {'slide_number': slide_number, 'error': error_msg})
-            
-            # Обновляем статистику
-            self.execution_stats.increment('images_failed')
-            self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
-            return None
-            
-        except requests.exceptions.ConnectionError:
-            error_msg = f"Ошибка соединения с DALL-E API для слайда {slide_number}"
-            print(f"❌ {error_msg}")
-            self._log_error("DALL-E API Connection Error", {'slide_number': slide_number, 'error': error_msg})
-            
-            # Обновляем статистику
-            self.execution_stats.increment('images_failed')
-            self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
-            return None
-            
-        except Exception as e:
-            error_msg = f"Неожиданная ошибка при генерации изображения для слайда {slide_number}: {type(e).__name__}: {str(e)}"
-            print(f"❌ {error_msg}")
-            self._log_error("Unexpected DALL-E API Error", {
+        return url, headers, data
+    
+    @staticmethod
+    def _decode_image_stream(chunks):
+        """Потоково декодирует b64_json из кусков тела ответа"""
+        decoder = Base64FieldDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+        return decoder
+    
+    def _save_dalle_3_image(self, image_data, slide_number):
+        """Передает изображение DALL-E 3 в хранилище в памяти; запись на диск идет в фоне"""
+        image_filename = f"slide_{slide_number:02d}_illustration.png"
+        image_path = self.image_store.put(os.path.join(self.images_dir, image_filename), image_data)
+        
+        print(f"✓ Изображение сохранено: {image_filename}")
+        
+        if self.logger:
+            self.logger.info(f"Изображение для слайда {slide_number} успешно создано")
+        
+        return image_path
+    
+    def _handle_dalle_3_error(self, slide_number, status_code, response_text, response_headers, url, clean_prompt):
+        """Логирует HTTP-ошибку DALL-E 3 API и обновляет статистику"""
+        # Детальная информация об ошибке
+        error_info = {
+            'slide_number': slide_number,
+            'status_code': status_code,
+            'response_text': response_text,
+            'headers': dict(response_headers),
+            'request_url': url,
+            'prompt_preview': clean_prompt[:100] + '...' if len(clean_prompt) > 100 else clean_prompt
+        }
+        
+        self._log_error("DALL-E API Error", error_info)
+        
+        # Обновляем статистику
+        self.execution_stats.increment('total_errors')
+        
+        print(f"\n❌ Ошибка DALL-E API для слайда {slide_number}:")
+        print(f"   Статус: {status_code}")
+        print(f"   Endpoint: {url}")
+        
+        if status_code == 401:
+            print("   → Ошибка авторизации: проверьте OpenAI API ключ")
+        elif status_code == 429:
+            print("   → Превышен лимит запросов или недостаточно кредитов")
+        elif status_code == 400:
+            print("   → Ошибка в промпте или параметрах")
+            print(f"   → Ответ: {response_text[:200]}...")
+        else:
+            print(f"   → HTTP {status_code}: {response_text[:200]}...")
+    
+    def _record_dalle_3_failure(self, slide_number, error_type, error_msg, exc=None):
+        """Логирует сбой запроса к DALL-E 3 (таймаут, соединение, прочее) и обновляет статистику"""
+        if exc is not None:
+            error_msg = f"Неожиданная ошибка при генерации изображения для слайда {slide_number}: {type(exc).__name__}: {str(exc)}"
+            details = {
                 'slide_number': slide_number, 
-                'error_type': type(e).__name__, 
-                'error_message': str(e)
-            })
-            
-            # Обновляем статистику
-            self.execution_stats.increment('images_failed')
-            self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
-            return None
+                'error_type': type(exc).__name__, 
+                'error_message': str(exc)
+            }
+        else:
+            details = {'slide_number': slide_number, 'error': error_msg}
+        
+        print(f"❌ {error_msg}")
+        self._log_error(error_type, details)
+        
+        # Обновляем статистику
+        self.execution_stats.increment('total_errors')
     
     def _generate_with_gpt_image_1(self, clean_prompt, slide_number):
         """Генерирует изображение с помощью GPT-Image-1"""
         try:
-            from openai import OpenAI
-            
-            # Инициализируем клиент OpenAI
-            client = OpenAI(api_key=self.openai_api_key)
+            # Общий клиент OpenAI из реестра SDK
+            client = self.sdk_clients.openai_client(self.openai_api_key, self.api_base_urls['openai'])
             
             # Параметры для GPT-Image-1 (оптимизированы для презентаций)
             generation_params = {
@@ -2322,32 +4081,28 @@ class RWTechPPTXGenerator:
             if self.logger:
                 self.logger.info(f"GPT-Image-1 запрос для слайда {slide_number}: {generation_params}")
             
-            # Генерируем изображение
-            response = client.images.generate(**generation_params)
+            # Генерируем изображение; ответ читается потоком, b64_json декодируется по кускам
+            def request_image():
+                with client.images.with_streaming_response.generate(**generation_params) as response:
+                    return self._decode_image_stream(response.iter_bytes(self.STREAM_CHUNK_SIZE))
             
-            # Получаем base64 данные
-            image_b64 = response.data[0].b64_json
+            decoder = self._call_sdk_with_retry('openai', request_image, slide_number)
             
             # Сохраняем изображение
             image_filename = f"slide_{slide_number:02d}_illustration.png"
             image_path = os.path.join(self.images_dir, image_filename)
             
-            # Декодируем и сохраняем
-            image_bytes = base64.b64decode(image_b64)
-            with open(image_path, 'wb') as f:
-                f.write(image_bytes)
+            # Декодированные байты - в память; запись на диск идет в фоне
+            self.image_store.put(image_path, decoder.close())
             
             print(f"✓ Изображение GPT-Image-1 сохранено: {image_filename}")
             
-            # Логируем использование токенов если доступно
-            if hasattr(response, 'usage') and response.usage:
+            # Логируем использование токенов если доступно (usage - в остатке ответа после b64_json)
+            total_tokens = re.search(r'"total_tokens"\s*:\s*(\d+)', decoder.metadata())
+            if total_tokens:
                 if self.logger:
-                    self.logger.info(f"GPT-Image-1 токены для слайда {slide_number}: {response.usage}")
-                print(f"   Использовано токенов: {response.usage.total_tokens}")
-            
-            # Обновляем статистику
-            self.execution_stats.increment('images_generated')
-            self.generation_stats['images_generated'] += 1
+                    self.logger.info(f"GPT-Image-1 токены для слайда {slide_number}: {total_tokens.group(1)}")
+                print(f"   Использовано токенов: {total_tokens.group(1)}")
             
             if self.logger:
                 self.logger.info(f"Изображение GPT-Image-1 для слайда {slide_number} успешно создано")
@@ -2360,9 +4115,7 @@ class RWTechPPTXGenerator:
             self._log_error("OpenAI Library Error", {'slide_number': slide_number, 'error': error_msg})
             
             # Обновляем статистику
-            self.execution_stats.increment('images_failed')
             self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
             return None
             
         except Exception as e:
@@ -2375,18 +4128,14 @@ class RWTechPPTXGenerator:
             })
             
             # Обновляем статистику
-            self.execution_stats.increment('images_failed')
             self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
             return None
     
     def _generate_with_imagen_3(self, clean_prompt, slide_number):
         """Генерирует изображение с помощью Google Imagen 3"""
         try:
-            from google import genai
-            from google.genai import types
-            from PIL import Image
-            from io import BytesIO
+            types = self.sdk_clients.genai_types()
+            Image = self.sdk_clients.module('PIL.Image')
             
             # Проверяем наличие API ключа
             if not hasattr(self, 'gemini_api_key') or not self.gemini_api_key:
@@ -2395,13 +4144,11 @@ class RWTechPPTXGenerator:
                 self._log_error("Imagen 3 API Key Error", {'slide_number': slide_number, 'error': error_msg})
                 
                 # Обновляем статистику
-                self.execution_stats.increment('images_failed')
                 self.execution_stats.increment('total_errors')
-                self.generation_stats['images_failed'] += 1
                 return None
             
-            # Инициализируем клиент Gemini
-            client = genai.Client(api_key=self.gemini_api_key)
+            # Общий клиент Gemini из реестра SDK
+            client = self.sdk_clients.genai_client(self.gemini_api_key, self.api_base_urls['google'])
             
             # Параметры для Imagen 3 (оптимизированы для презентаций)
             config = types.GenerateImagesConfig(
@@ -2414,10 +4161,14 @@ class RWTechPPTXGenerator:
                 self.logger.info(f"Imagen 3 запрос для слайда {slide_number}: {clean_prompt[:100]}...")
             
             # Генерируем изображение через Imagen 3
-            response = client.models.generate_images(
-                model='imagen-3.0-generate-002',
-                prompt=clean_prompt,
-                config=config
+            response = self._call_sdk_with_retry(
+                'google',
+                lambda: client.models.generate_images(
+                    model='imagen-3.0-generate-002',
+                    prompt=clean_prompt,
+                    config=config
+                ),
+                slide_number
             )
             
             if not response.generated_images:
@@ -2435,16 +4186,20 @@ class RWTechPPTXGenerator:
             image_filename = f"slide_{slide_number:02d}_illustration.png"
             image_path = os.path.join(self.images_dir, image_filename)
             
-            # Конвертируем байты в изображение и сохраняем
-            image = Image.open(BytesIO(image_bytes))
-            image.save(image_path, 'PNG')
+            # Формат определяется по сигнатуре: поддерживаемый python-pptx передается без перекодирования,
+            # уменьшение до размера на слайде выполняет _prepare_image_for_slide
+            image_format = ImageStore.sniff_format(image_bytes)
+            if image_format not in self.PPTX_IMAGE_FORMATS:
+                stream = BytesIO()
+                with Image.open(BytesIO(image_bytes)) as image:
+                    image.save(stream, 'PNG')
+                image_bytes = stream.getvalue()
+                if self.logger:
+                    self.logger.info(f"Изображение Imagen 3 для слайда {slide_number} ({image_format}) сконвертировано в PNG")
+            self.image_store.put(image_path, image_bytes)
             
             print(f"✓ Изображение Imagen 3 сохранено: {image_filename}")
             
-            # Обновляем статистику
-            self.execution_stats.increment('images_generated')
-            self.generation_stats['images_generated'] += 1
-            
             if self.logger:
                 self.logger.info(f"Изображение Imagen 3 для слайда {slide_number} успешно создано")
             
@@ -2456,9 +4211,7 @@ class RWTechPPTXGenerator:
             self._log_error("Imagen 3 Library Error", {'slide_number': slide_number, 'error': error_msg})
             
             # Обновляем статистику
-            self.execution_stats.increment('images_failed')
             self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
             return None
             
         except Exception as e:
@@ -2471,9 +4224,7 @@ class RWTechPPTXGenerator:
             })
             
             # Обновляем статистику
-            self.execution_stats.increment('images_failed')
             self.execution_stats.increment('total_errors')
-            self.generation_stats['images_failed'] += 1
             return None
     
     def _generate_with_gemini_flash(self, clean_prompt, slide_number):
@@ -2490,9 +4241,92 @@ class RWTechPPTXGenerator:
         # Redirect to Imagen 3 which actually works
         return self._generate_with_imagen_3(clean_prompt, slide_number)
     
+    def _prepare_image_for_slide(self, image_path, width, height):
+        """Уменьшает изображение до размера на слайде (EMU) с заданным dpi и перекодирует его
+        
+        Returns:
+            BytesIO с изображением для add_picture (из памяти, без чтения файла)
+        """
+        image_data = self.image_store.get(image_path)
+        if image_data is None:
+            return image_path
+        settings = self.image_optimization
+        if not settings.get('enabled'):
+            return BytesIO(image_data)
+        try:
+            from PIL import Image
+        except ImportError:
+            return BytesIO(image_data)
+        
+        try:
+            original_size = len(image_data)
+            with Image.open(BytesIO(image_data)) as image:
+                # Целевой размер в пикселях: EMU -> дюймы -> пиксели при заданном dpi
+                dpi = settings.get('dpi', self.IMAGE_DPI)
+                target_width = max(1, round(width / 914400 * dpi))
+                target_height = max(1, round(height / 914400 * dpi))
+                scale = max(target_width / image.width, target_height / image.height)
+                
+                # Без уменьшения изображение в допустимом формате вставляется как есть - пиксели не декодируются.
+                # Допустим заданный format; для 'auto' - JPEG (прозрачности в нем нет, 'auto' тоже дал бы JPEG)
+                source_format = (image.format or '').lower()
+                configured_format = settings.get('format', 'auto')
+                keeps_format = source_format == configured_format or (
+                    configured_format == 'auto' and source_format == 'jpeg')
+                if scale >= 1 and keeps_format:
+                    return BytesIO(image_data)
+                
+                image.load()
+                if scale < 1:
+                    image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                         Image.LANCZOS)
+                
+                # JPEG только для изображений без прозрачности
+                has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                if has_alpha and image.mode in ('RGBA', 'LA'):
+                    has_alpha = image.getchannel('A').getextrema()[0] < 255
+                image_format = configured_format
+                if image_format == 'auto':
+                    image_format = 'png' if has_alpha else 'jpeg'
+                
+                stream = BytesIO()
+                if image_format == 'jpeg':
+                    image.convert('RGB').save(stream, 'JPEG', quality=settings.get('jpeg_quality', 85),
+                                              optimize=True, dpi=(dpi, dpi))
+                else:
+                    # optimize=True кодирует в несколько раз дольше и дает лишь несколько процентов
+                    image.save(stream, 'PNG', compress_level=6, dpi=(dpi, dpi))
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Не удалось оптимизировать изображение {image_path}: {e}")
+            return BytesIO(image_data)
+        
+        # Перекодирование не всегда выигрывает (например, уже сжатый маленький файл);
+        # явно заданный format соблюдается и ценой размера
+        if stream.tell() >= original_size and (configured_format == 'auto' or source_format == image_format):
+            return BytesIO(image_data)
+        
+        totals = self.image_optimization_totals
+        totals['images'] += 1
+        totals['bytes_before'] += original_size
+        totals['bytes_after'] += stream.tell()
+        if self.logger:
+            self.logger.info(f"Изображение {os.path.basename(image_path)} оптимизировано: "
+                             f"{original_size // 1024} КБ -> {stream.tell() // 1024} КБ ({image_format}, {dpi} dpi)")
+        stream.seek(0)
+        return stream
+    
+    def _report_image_optimization(self):
+        """Печатает итог оптимизации изображений и сбрасывает счетчики"""
+        totals = self.image_optimization_totals
+        if totals['images']:
+            print(f"🗜️  Изображения уменьшены до размера на слайде: {totals['images']} шт., "
+                  f"{totals['bytes_before'] / (1024 * 1024):.1f} MB -> {totals['bytes_after'] / (1024 * 1024):.1f} MB")
+        self.image_optimization_totals = {'images': 0, 'bytes_before': 0, 'bytes_after': 0}
+    
     def _add_ai_illustration_to_slide(self, slide, image_path, slide_data, slide_number):
         """Добавляет AI-иллюстрацию на слайд с адаптивным позиционированием"""
-        if not os.path.exists(image_path):
+        if not self.image_store.exists(image_path):
             return
             
         slide_width = self.prs.slide_width
@@ -2521,9 +4355,9 @@ class RWTechPPTXGenerator:
         img_top = title_height + (available_height - img_height) / 2
         
         try:
-            # Добавляем изображение
+            # Добавляем изображение, уменьшенное до размера на слайде
             pic = slide.shapes.add_picture(
-                image_path,
+                self._prepare_image_for_slide(image_path, img_width, img_height),
                 img_left,
                 img_top,
                 img_width,
@@ -2551,7 +4385,10 @@ class RWTechPPTXGenerator:
         if not self.checkpoints.validate_checkpoint('api_validation'):
             print("⛔ ОСТАНОВКА: API ключи не прошли валидацию")
             self._cleanup_partial_results()
-            sys.exit(1)
+            raise GenerationError("API ключи не прошли валидацию", exit_code=1)
+        
+        # Новые бюджеты повторов на этот запуск
+        self.retry_policy.reset()
         
         # Определяем слайды для обработки
         slides_to_process = []
@@ -2566,7 +4403,6 @@ class RWTechPPTXGenerator:
         # Инициализируем статистику
         total_slides = len(slides_to_process)
         self.execution_stats.set('slides_to_process', total_slides)
-        self.generation_stats['total_slides'] = total_slides
         
         print(f"📊 Запланировано к обработке: {total_slides} слайдов")
         print(f"📋 Слайды: {[s['number'] for s in slides_to_process]}")
@@ -2578,13 +4414,13 @@ class RWTechPPTXGenerator:
         if not prompts_success:
             print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Генерация промптов провалилась")
             self._cleanup_partial_results()
-            sys.exit(2)
+            raise GenerationError("Генерация промптов провалилась", exit_code=2)
         
         # Контрольная точка 2: Проверка промптов
         if not self.checkpoints.validate_checkpoint('prompts_generation'):
             print("\n⛔ ОСТАНОВКА: Недостаточно успешных промптов")
             self._cleanup_partial_results()
-            sys.exit(3)
+            raise GenerationError("Недостаточно успешных промптов", exit_code=3)
         
         # ЭТАП 2: Генерация изображений
         print(f"\n🔸 ЭТАП 2: Генерация изображений с DALL-E 3")
@@ -2593,13 +4429,13 @@ class RWTechPPTXGenerator:
         if not images_success:
             print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Генерация изображений провалилась")
             self._cleanup_partial_results()
-            sys.exit(4)
+            raise GenerationError("Генерация изображений провалилась", exit_code=4)
         
         # Контрольная точка 3: Проверка изображений
         if not self.checkpoints.validate_checkpoint('images_generation'):
             print("\n⛔ ОСТАНОВКА: Недостаточно успешных изображений")
             self._cleanup_partial_results()
-            sys.exit(5)
+            raise GenerationError("Недостаточно успешных изображений", exit_code=5)
         
         # ЭТАП 3: Вставка изображений в презентацию
         print(f"\n🔸 ЭТАП 3: Вставка изображений в презентацию")
@@ -2608,19 +4444,23 @@ class RWTechPPTXGenerator:
         if not update_success:
             print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Не удалось вставить изображения в презентацию")
             self._cleanup_partial_results()
-            sys.exit(6)
+            raise GenerationError("Не удалось вставить изображения в презентацию", exit_code=6)
         
         # Контрольная точка 4: Проверка обновления презентации
         if not self.checkpoints.validate_checkpoint('presentation_update'):
             print("\n⛔ ОСТАНОВКА: Ошибка валидации обновления презентации")
             self._cleanup_partial_results()
-            sys.exit(6)
+            raise GenerationError("Ошибка валидации обновления презентации", exit_code=6)
         
         print(f"\n✅ Все этапы генерации AI-иллюстраций завершены успешно")
         return True
     
-    def _process_ai_illustrations_parallel(self):
-        """ПАРАЛЛЕЛЬНАЯ генерация AI-иллюстраций с оптимизацией производительности"""
+    def _process_ai_illustrations_parallel(self, engine='threads'):
+        """ПАРАЛЛЕЛЬНАЯ генерация AI-иллюстраций с оптимизацией производительности
+        
+        Args:
+            engine: 'threads' - потоки с очередями, 'asyncio' - асинхронный движок
+        """
         if not self.use_ai_illustrations:
             return True
             
@@ -2630,7 +4470,10 @@ class RWTechPPTXGenerator:
         if not self.checkpoints.validate_checkpoint('api_validation'):
             print("⛔ ОСТАНОВКА: API ключи не прошли валидацию")
             self._cleanup_partial_results()
-            sys.exit(1)
+            raise GenerationError("API ключи не прошли валидацию", exit_code=1)
+        
+        # Новые бюджеты повторов на этот запуск
+        self.retry_policy.reset()
         
         # Определяем слайды для обработки
         slides_to_process = []
@@ -2645,23 +4488,42 @@ class RWTechPPTXGenerator:
         # Инициализируем статистику
         total_slides = len(slides_to_process)
         self.execution_stats.set('slides_to_process', total_slides)
-        self.generation_stats['total_slides'] = total_slides
         
         print(f"📊 Запланировано к обработке: {total_slides} слайдов")
         print(f"📋 Слайды: {[s['number'] for s in slides_to_process]}")
         
-        # Инициализируем очереди для параллельной обработки
-        prompt_queue = queue.Queue()
-        image_queue = queue.Queue()
-        results = {}
+        # Неизмененные слайды берут промпт и изображение из прошлой сборки (манифест)
+        self.parallel_results = {}
+        reused = self._reuse_unchanged_illustrations(slides_to_process)
+        reused.update(self._prepare_generation_journal(slides_to_process, reused))
+        slides_to_generate = [s for s in slides_to_process if s['number'] not in reused]
+        if reused:
+            print(f"♻️  Иллюстрации прошлой сборки: {len(reused)}, к генерации: {len(slides_to_generate)}")
+        
+        # Число воркеров под выбранную модель и движок
+        self._configure_workers(engine)
+        print(f"⚙️  Воркеры: промпты - {self.prompt_workers}, изображения ({self.image_model}) - {self.image_workers}")
+        
+        if not slides_to_generate:
+            success = True
+        elif engine == 'asyncio':
+            # Каждый слайд - отдельная корутина промпт → изображение → сохранение
+            success = self._run_async_generation(slides_to_generate)
+        else:
+            # Инициализируем очереди для параллельной обработки
+            prompt_queue = queue.Queue()
+            image_queue = queue.Queue()
+            results = {}
+            
+            # Запускаем параллельную обработку
+            success = self._run_parallel_generation(slides_to_generate, prompt_queue, image_queue, results)
         
-        # Запускаем параллельную обработку
-        success = self._run_parallel_generation(slides_to_process, prompt_queue, image_queue, results)
+        self.parallel_results = {**reused, **(self.parallel_results or {})}
         
         if not success:
             print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Параллельная генерация провалилась")
             self._cleanup_partial_results()
-            sys.exit(2)
+            raise GenerationError("Параллельная генерация провалилась", exit_code=2)
         
         # ЭТАП 3: Вставка изображений в презентацию
         print(f"\n🔸 ЭТАП 3: Вставка изображений в презентацию")
@@ -2670,17 +4532,85 @@ class RWTechPPTXGenerator:
         if not update_success:
             print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Не удалось вставить изображения в презентацию")
             self._cleanup_partial_results()
-            sys.exit(6)
+            raise GenerationError("Не удалось вставить изображения в презентацию", exit_code=6)
         
         # Контрольная точка 4: Проверка обновления презентации
         if not self.checkpoints.validate_checkpoint('presentation_update'):
             print("\n⛔ ОСТАНОВКА: Ошибка валидации обновления презентации")
             self._cleanup_partial_results()
-            sys.exit(6)
+            raise GenerationError("Ошибка валидации обновления презентации", exit_code=6)
+        
+        for slide_number in sorted(self.parallel_results):
+            self._journal_event('inserted', slide_number)
         
         print(f"\n✅ Все этапы параллельной генерации AI-иллюстраций завершены успешно")
         return True
     
+    def _configure_workers(self, engine='threads'):
+        """Определяет число воркеров промптов и изображений с проверкой лимитов провайдеров"""
+        image_provider = self.IMAGE_MODEL_PROVIDERS.get(self.image_model, 'openai')
+        
+        # В asyncio-движке по умолчанию действуют лимиты async_concurrency
+        if engine == 'asyncio':
+            defaults = {
+                'prompt': self.async_concurrency.get('anthropic', self.PROMPT_WORKERS),
+                'image': self.async_concurrency.get(image_provider, self.IMAGE_WORKERS)
+            }
+        else:
+            defaults = {'prompt': self.PROMPT_WORKERS, 'image': self.IMAGE_WORKERS}
+        
+        # Для изображений в config.json можно задать число или словарь по image_model
+        image_setting = self.worker_settings.get('image')
+        if isinstance(image_setting, dict):
+            image_setting = image_setting.get(self.image_model)
+        
+        # Приоритет: командная строка, затем config.json, затем значения по умолчанию
+        stages = {
+            'prompt': ('prompt', 'anthropic', self.worker_settings.get('prompt')),
+            'image': (self.image_model, image_provider, image_setting)
+        }
+        
+        counts = {}
+        for stage, (limit_key, provider, requested) in stages.items():
+            if self.worker_overrides.get(stage) is not None:
+                requested = self.worker_overrides[stage]
+            if requested is None:
+                requested = defaults[stage]
+            try:
+                count = int(requested)
+            except (TypeError, ValueError):
+                print(f"⚠️ Некорректное число воркеров для {limit_key}: {requested!r}, используется {defaults[stage]}")
+                count = int(defaults[stage])
+            
+            # Больше одновременных запросов, чем запросов в минуту, не имеет смысла
+            limit = self.MAX_WORKERS.get(limit_key, self.MAX_WORKERS['prompt'])
+            requests_per_minute = self.rate_limits.get(provider, {}).get('requests_per_minute')
+            if requests_per_minute:
+                limit = min(limit, int(requests_per_minute))
+            
+            if not 1 <= count <= limit:
+                clamped = min(max(count, 1), limit)
+                print(f"⚠️ Число воркеров для {limit_key} ({count}) вне допустимого диапазона 1..{limit}, используется {clamped}")
+                if self.logger:
+                    self.logger.warning(f"Число воркеров для {limit_key} ограничено: {count} -> {clamped}")
+                count = clamped
+            counts[stage] = count
+        
+        self.prompt_workers = counts['prompt']
+        self.image_workers = counts['image']
+        
+        # Пул соединений и лимиты asyncio следуют числу воркеров
+        self.provider_sessions.configure_pool('anthropic', self.prompt_workers)
+        self.provider_sessions.configure_pool(image_provider, self.image_workers)
+        if engine == 'asyncio':
+            self.async_concurrency['anthropic'] = self.prompt_workers
+            self.async_concurrency[image_provider] = self.image_workers
+        
+        self.execution_stats.set('generation_engine', engine)
+        self.execution_stats.set('image_model', self.image_model)
+        self.execution_stats.set('prompt_workers', self.prompt_workers)
+        self.execution_stats.set('image_workers', self.image_workers)
+    
     def _run_parallel_generation(self, slides_to_process, prompt_queue, image_queue, results):
         """Запускает параллельную генерацию промптов и изображений"""
         
@@ -2693,70 +4623,75 @@ class RWTechPPTXGenerator:
         prompt_progress = {'completed': 0, 'total': len(slides_to_process)}
         image_progress = {'completed': 0, 'total': 0}
         
+        # Future каждого слайда завершается и при успехе, и при ошибке
+        prompt_futures = {s['number']: concurrent.futures.Future() for s in slides_to_process}
+        image_futures = {s['number']: concurrent.futures.Future() for s in slides_to_process}
+        stop_event = threading.Event()
+        deadline = self._generation_deadline()
+        self.run_deadline = deadline
+        
         def prompt_worker():
             """Воркер для генерации промптов"""
             while True:
+                slide_data = prompt_queue.get()
+                if slide_data is None:  # Сигнал завершения
+                    break
+                
+                slide_number = slide_data['number']
+                dalle_prompt = None
                 try:
-                    slide_data = prompt_queue.get(timeout=1)
-                    if slide_data is None:  # Сигнал завершения
-                        break
-                    
-                    # Генерируем промпт
-                    with prompt_lock:
-                        self.execution_stats.increment('prompts_attempted')
+                    if stop_event.is_set():
+                        continue
                     
+                    # Генерируем промпт (статистику промптов ведет _generate_image_prompt)
                     dalle_prompt = self._generate_image_prompt(slide_data)
                     
                     if dalle_prompt:
                         with prompt_lock:
-                            self.execution_stats.increment('prompts_generated')
                             prompt_progress['completed'] += 1
                         
+                        with image_lock:
+                            image_progress['total'] += 1
+                        
                         # Сразу отправляем задачу на генерацию изображения
                         image_queue.put({
                             'slide_data': slide_data,
                             'prompt': dalle_prompt
                         })
-                        
-                        with image_lock:
-                            image_progress['total'] += 1
                             
-                        print(f"✓ Промпт готов для слайда {slide_data['number']}, отправлен на генерацию изображения")
+                        print(f"✓ Промпт готов для слайда {slide_number}, отправлен на генерацию изображения")
                     else:
-                        with prompt_lock:
-                            self.execution_stats.increment('prompts_failed')
-                            print(f"❌ Ошибка генерации промпта для слайда {slide_data['number']}")
-                    
-                    prompt_queue.task_done()
-                    time.sleep(1)  # Задержка между запросами к Claude API
+                        print(f"❌ Ошибка генерации промпта для слайда {slide_number}")
                     
-                except queue.Empty:
-                    continue
                 except Exception as e:
-                    print(f"❌ Ошибка в prompt_worker: {e}")
-                    break
+                    print(f"❌ Ошибка в prompt_worker для слайда {slide_number}: {e}")
+                finally:
+                    # Без промпта изображение для слайда не будет сгенерировано
+                    if not dalle_prompt:
+                        image_futures[slide_number].set_result(None)
+                    prompt_futures[slide_number].set_result(dalle_prompt)
+                    prompt_queue.task_done()
         
         def image_worker():
             """Воркер для генерации изображений"""
             while True:
+                prompt_data = image_queue.get()
+                if prompt_data is None:  # Сигнал завершения
+                    break
+                
+                slide_data = prompt_data['slide_data']
+                prompt = prompt_data['prompt']
+                slide_number = slide_data['number']
+                image_path = None
                 try:
-                    prompt_data = image_queue.get(timeout=5)
-                    if prompt_data is None:  # Сигнал завершения
-                        break
-                    
-                    slide_data = prompt_data['slide_data']
-                    prompt = prompt_data['prompt']
-                    slide_number = slide_data['number']
-                    
-                    with image_lock:
-                        self.execution_stats.increment('images_attempted')
+                    if stop_event.is_set():
+                        continue
                     
-                    # Генерируем изображение
+                    # Генерируем изображение (статистику изображений ведет _generate_image_with_dalle)
                     image_path = self._generate_image_with_dalle(prompt, slide_number)
                     
                     if image_path:
                         with image_lock:
-                            self.execution_stats.increment('images_generated')
                             image_progress['completed'] += 1
                         
                         with results_lock:
@@ -2768,18 +4703,13 @@ class RWTechPPTXGenerator:
                         
                         print(f"✓ Изображение готово для слайда {slide_number}")
                     else:
-                        with image_lock:
-                            self.execution_stats.increment('images_failed')
-                            print(f"❌ Ошибка генерации изображения для слайда {slide_number}")
-                    
-                    image_queue.task_done()
-                    time.sleep(2)  # Задержка между запросами к DALL-E API
+                        print(f"❌ Ошибка генерации изображения для слайда {slide_number}")
                     
-                except queue.Empty:
-                    continue
                 except Exception as e:
-                    print(f"❌ Ошибка в image_worker: {e}")
-                    break
+                    print(f"❌ Ошибка в image_worker для слайда {slide_number}: {e}")
+                finally:
+                    image_futures[slide_number].set_result(image_path)
+                    image_queue.task_done()
         
         # Заполняем очередь промптов
         for slide_data in slides_to_process:
@@ -2788,24 +4718,133 @@ class RWTechPPTXGenerator:
         # Запускаем воркеры
         print(f"\n🔸 ПАРАЛЛЕЛЬНАЯ ГЕНЕРАЦИЯ: Запуск воркеров")
         
-        # 1 воркер для промптов (ограничение Claude API)
-        prompt_thread = threading.Thread(target=prompt_worker, name="PromptWorker")
-        prompt_thread.daemon = True
-        prompt_thread.start()
+        # Воркеры для промптов (число задается настройкой workers)
+        prompt_threads = []
+        for i in range(self.prompt_workers):
+            thread = threading.Thread(target=prompt_worker, name=f"PromptWorker-{i+1}")
+            thread.daemon = True
+            thread.start()
+            prompt_threads.append(thread)
         
-        # 2 воркера для изображений (можно больше запросов к DALL-E)
+        # Воркеры для изображений (лимит зависит от модели и тарифа провайдера)
         image_threads = []
-        for i in range(2):
+        for i in range(self.image_workers):
             thread = threading.Thread(target=image_worker, name=f"ImageWorker-{i+1}")
             thread.daemon = True
             thread.start()
             image_threads.append(thread)
         
-        # Ждем завершения генерации промптов
-        print(f"📝 Генерация промптов...")
-        while prompt_progress['completed'] < prompt_progress['total']:
-            time.sleep(1)
-            print(f"   Промпты: {prompt_progress['completed']}/{prompt_progress['total']}")
+        try:
+            # Ждем завершения генерации промптов (просыпаемся на каждом завершенном слайде)
+            print(f"📝 Генерация промптов...")
+            if not self._wait_for_futures(prompt_futures.values(), deadline, "Промпты"):
+                return False
+            
+            # Проверяем успешность промптов
+            prompts_success_rate = self.execution_stats.get('prompts_generated') / len(slides_to_process)
+            if prompts_success_rate < 0.8:
+                print(f"❌ Успешность промптов {prompts_success_rate:.1%} ниже требуемых 80%")
+                return False
+            
+            print(f"✅ Генерация промптов завершена: {prompts_success_rate:.1%} успешности")
+            
+            # Ждем завершения генерации изображений
+            print(f"🎨 Генерация изображений...")
+            pending_images = [image_futures[n] for n, future in prompt_futures.items() if future.result()]
+            if not self._wait_for_futures(pending_images, deadline, "Изображения"):
+                return False
+        finally:
+            # Останавливаем воркеры (оставшиеся в очередях задачи пропускаются)
+            stop_event.set()
+            for _ in prompt_threads:
+                prompt_queue.put(None)
+            for _ in image_threads:
+                image_queue.put(None)
+            
+            # Ждем завершения потоков: общее ожидание не дольше WORKER_JOIN_TIMEOUT и не за дедлайном.
+            # Потоки-демоны с запросом в полете дорабатывают в фоне (запрос ограничен дедлайном)
+            join_timeout = self.WORKER_JOIN_TIMEOUT
+            if deadline is not None:
+                join_timeout = min(join_timeout, self._remaining_time(deadline))
+            join_until = time.monotonic() + join_timeout
+            for thread in prompt_threads + image_threads:
+                thread.join(timeout=max(0.0, join_until - time.monotonic()))
+        
+        # Проверяем успешность изображений
+        images_success_rate = self.execution_stats.get('images_generated') / image_progress['total']
+        if images_success_rate < 0.8:
+            print(f"❌ Успешность изображений {images_success_rate:.1%} ниже требуемых 80%")
+            return False
+        
+        print(f"✅ Генерация изображений завершена: {images_success_rate:.1%} успешности")
+        
+        # Сохраняем результаты для следующего этапа
+        self.parallel_results = results
+        
+        return True
+    
+    def _generation_deadline(self):
+        """Возвращает момент (time.monotonic), к которому генерация должна завершиться"""
+        if not self.generation_deadline_seconds:
+            return None
+        return time.monotonic() + float(self.generation_deadline_seconds)
+    
+    def _remaining_time(self, deadline):
+        """Возвращает оставшееся до дедлайна время в секундах (None - без ограничения)"""
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+    
+    def _wait_for_futures(self, futures, deadline, label):
+        """Ждет завершения всех future с выводом прогресса; False при превышении дедлайна"""
+        futures = list(futures)
+        completed = 0
+        try:
+            for _ in concurrent.futures.as_completed(futures, timeout=self._remaining_time(deadline)):
+                completed += 1
+                print(f"   {label}: {completed}/{len(futures)}")
+        except concurrent.futures.TimeoutError:
+            print(f"⏰ Превышено время генерации ({self.generation_deadline_seconds} с): {label.lower()} {completed}/{len(futures)}")
+            if self.logger:
+                self.logger.error(f"Превышен дедлайн генерации: {label} {completed}/{len(futures)}")
+            return False
+        return True
+    
+    def _run_async_generation(self, slides_to_process):
+        """Запускает asyncio-движок генерации промптов и изображений"""
+        import asyncio
+        return asyncio.run(self._async_generation_main(slides_to_process))
+    
+    async def _async_generation_main(self, slides_to_process):
+        """Выполняет цепочки всех слайдов одновременно с лимитами по провайдерам"""
+        import asyncio
+        
+        limits = {provider: max(1, int(limit)) for provider, limit in self.async_concurrency.items()}
+        semaphores = {provider: asyncio.Semaphore(limit) for provider, limit in limits.items()}
+        results = {}
+        
+        print(f"\n🔸 ASYNCIO-ГЕНЕРАЦИЯ: {len(slides_to_process)} слайдов, лимиты запросов: {limits}")
+        
+        self.run_deadline = self._generation_deadline()
+        # Блокирующие вызовы - в своем пуле: asyncio.run ждет только пул по умолчанию,
+        # поэтому после дедлайна вызовы в полете не задерживают выход из движка
+        self._blocking_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=sum(limits.values()), thread_name_prefix='async-blocking')
+        client = self._create_async_http_client(sum(limits.values()))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(
+                self._async_slide_chain(client, semaphores, slide_data, results)
+                for slide_data in slides_to_process
+            )), timeout=self._remaining_time(self.run_deadline))
+        except asyncio.TimeoutError:
+            print(f"⏰ Превышено время генерации ({self.generation_deadline_seconds} с)")
+            if self.logger:
+                self.logger.error("Превышен дедлайн asyncio-генерации")
+            return False
+        finally:
+            if client is not None:
+                await client.aclose()
+            self._shutdown_blocking_executor()
         
         # Проверяем успешность промптов
         prompts_success_rate = self.execution_stats.get('prompts_generated') / len(slides_to_process)
@@ -2815,24 +4854,9 @@ class RWTechPPTXGenerator:
         
         print(f"✅ Генерация промптов завершена: {prompts_success_rate:.1%} успешности")
         
-        # Ждем завершения генерации изображений
-        print(f"🎨 Генерация изображений...")
-        while image_progress['completed'] < image_progress['total']:
-            time.sleep(2)
-            print(f"   Изображения: {image_progress['completed']}/{image_progress['total']}")
-        
-        # Останавливаем воркеры
-        prompt_queue.put(None)
-        for _ in image_threads:
-            image_queue.put(None)
-        
-        # Ждем завершения потоков
-        prompt_thread.join(timeout=10)
-        for thread in image_threads:
-            thread.join(timeout=10)
-        
         # Проверяем успешность изображений
-        images_success_rate = self.execution_stats.get('images_generated') / image_progress['total']
+        images_attempted = self.execution_stats.get('images_attempted')
+        images_success_rate = (self.execution_stats.get('images_generated') / images_attempted) if images_attempted else 0.0
         if images_success_rate < 0.8:
             print(f"❌ Успешность изображений {images_success_rate:.1%} ниже требуемых 80%")
             return False
@@ -2844,6 +4868,165 @@ class RWTechPPTXGenerator:
         
         return True
     
+    def _create_async_http_client(self, max_connections):
+        """Создает асинхронный HTTP-клиент (httpx) или None, если httpx не установлен"""
+        try:
+            import httpx
+        except ImportError:
+            print("⚠️  httpx не установлен: HTTP-запросы asyncio-движка выполняются в пуле потоков")
+            print("   Установите: pip install httpx")
+            return None
+        
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=120
+        )
+    
+    async def _run_blocking(self, func, *args):
+        """Выполняет блокирующую функцию в пуле потоков, не останавливая цикл событий"""
+        import asyncio
+        import functools
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._blocking_executor, functools.partial(func, *args))
+    
+    def _shutdown_blocking_executor(self):
+        """Останавливает пул блокирующих вызовов без ожидания: невыполненные задачи отменяются"""
+        executor, self._blocking_executor = self._blocking_executor, None
+        if executor is None:
+            return
+        try:
+            executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:  # Python < 3.9: cancel_futures нет
+            executor.shutdown(wait=False)
+    
+    async def _async_slide_chain(self, client, semaphores, slide_data, results):
+        """Цепочка одного слайда: промпт → изображение → сохранение"""
+        slide_number = slide_data['number']
+        
+        async with semaphores['anthropic']:
+            dalle_prompt = await self._generate_image_prompt_async(client, slide_data)
+        
+        if not dalle_prompt:
+            print(f"❌ Ошибка генерации промпта для слайда {slide_number}")
+            return False
+        
+        print(f"✓ Промпт готов для слайда {slide_number}, отправлен на генерацию изображения")
+        
+        provider = self.IMAGE_MODEL_PROVIDERS.get(self.image_model, 'openai')
+        async with semaphores[provider]:
+            image_path = await self._generate_image_async(client, dalle_prompt, slide_number)
+        
+        if not image_path:
+            print(f"❌ Ошибка генерации изображения для слайда {slide_number}")
+            return False
+        
+        results[slide_number] = {
+            'slide_data': slide_data,
+            'prompt': dalle_prompt,
+            'image_path': image_path
+        }
+        print(f"✓ Изображение готово для слайда {slide_number}")
+        return True
+    
+    async def _generate_image_prompt_async(self, client, slide_data):
+        """Асинхронная версия _generate_image_prompt"""
+        if client is None:
+            return await self._run_blocking(self._generate_image_prompt, slide_data)
+        
+        self.execution_stats.increment('prompts_attempted')
+        dalle_prompt = await self._run_blocking(self._get_cached_prompt, slide_data)
+        if dalle_prompt:
+            self._record_prompt_result(slide_data, dalle_prompt)
+            return dalle_prompt
+        
+        with self.execution_stats.timer('prompt'):
+            try:
+                dalle_prompt = await self._request_image_prompt_async(client, slide_data)
+            finally:
+                self._record_prompt_result(slide_data, dalle_prompt)
+        return dalle_prompt
+    
+    async def _request_image_prompt_async(self, client, slide_data):
+        """Асинхронная версия _request_image_prompt"""
+        try:
+            url, headers, data = self._build_prompt_request(slide_data)
+            estimated_tokens = self._estimate_prompt_tokens(data)
+            response = await self._post_with_retry_async(client, 'anthropic', url, headers, data, timeout=30,
+                                                         tokens=estimated_tokens, slide_number=slide_data['number'])
+            
+            if response.status_code == 200:
+                result = response.json()
+                self._settle_prompt_tokens(estimated_tokens, result)
+                return await self._run_blocking(self._handle_prompt_response, slide_data, result)
+            
+            self.logger.error(f"Ошибка Claude API: {response.status_code}")
+        except Exception as e:
+            self.logger.error(f"Ошибка генерации промпта: {e}")
+        
+        # Fallback к шаблонам при ошибке
+        return await self._run_blocking(self._generate_fallback_prompt, slide_data)
+    
+    async def _generate_image_async(self, client, prompt, slide_number):
+        """Асинхронная генерация изображения выбранной моделью"""
+        if client is None or self.image_model != 'dall-e-3':
+            # SDK-бэкенды (GPT-Image-1, Imagen 3) синхронные - выполняем их в пуле потоков
+            return await self._run_blocking(self._generate_image_with_dalle, prompt, slide_number)
+        
+        self.execution_stats.increment('images_attempted')
+        image_path = await self._run_blocking(self._get_cached_image, prompt, slide_number)
+        if image_path:
+            self._record_image_result(slide_number, image_path)
+            return image_path
+        
+        with self.execution_stats.timer(f'image ({self.image_model})'):
+            try:
+                image_path = await self._generate_dalle_3_async(client, prompt, slide_number)
+            finally:
+                self._record_image_result(slide_number, image_path)
+        await self._run_blocking(self._store_cached_image, prompt, image_path)
+        return image_path
+    
+    async def _generate_dalle_3_async(self, client, prompt, slide_number):
+        """Асинхронный запрос к DALL-E 3 через httpx"""
+        import httpx
+        
+        clean_prompt = self._extract_clean_prompt_for_dalle(prompt)
+        if self.logger:
+            self.logger.info(f"Отправка в {self.image_model} для слайда {slide_number}: {clean_prompt[:100]}...")
+        
+        url, headers, data = self._build_dalle_3_request(clean_prompt)
+        try:
+            response = await self._post_with_retry_async(client, 'openai', url, headers, data, timeout=120,
+                                                         slide_number=slide_number, stream=True)
+            
+            try:
+                if response.status_code == 200:
+                    decoder = Base64FieldDecoder()
+                    async for chunk in response.aiter_bytes(self.STREAM_CHUNK_SIZE):
+                        decoder.feed(chunk)
+                    return self._save_dalle_3_image(decoder.close(), slide_number)
+                await response.aread()
+            finally:
+                await response.aclose()
+            
+            self._handle_dalle_3_error(slide_number, response.status_code, response.text,
+                                       response.headers, url, clean_prompt)
+            return None
+            
+        except httpx.TimeoutException:
+            self._record_dalle_3_failure(slide_number, "DALL-E API Timeout",
+                                         f"Таймаут при генерации изображения для слайда {slide_number}")
+            return None
+            
+        except httpx.TransportError:
+            self._record_dalle_3_failure(slide_number, "DALL-E API Connection Error",
+                                         f"Ошибка соединения с DALL-E API для слайда {slide_number}")
+            return None
+            
+        except Exception as e:
+            self._record_dalle_3_failure(slide_number, "Unexpected DALL-E API Error", None, e)
+            return None
+    
     def _generate_all_prompts(self, slides_to_process):
         """Генерирует промпты для всех слайдов с контролем качества"""
         total_slides = len(slides_to_process)
@@ -2853,8 +5036,6 @@ class RWTechPPTXGenerator:
         successful_prompts = []
         
         for i, slide_data in enumerate(slides_to_process):
-            self.execution_stats.increment('prompts_attempted')
-            
             # Цветное сообщение о генерации промпта
             ColorfulUI.print_prompt_generation(slide_data['number'], total_slides)
             
@@ -2866,11 +5047,8 @@ class RWTechPPTXGenerator:
                     'prompt': dalle_prompt
                 })
             
-            # Обновляем прогресс-бар
+            # Обновляем прогресс-бар (темп запросов задает лимитер провайдера)
             progress_bar.update(i + 1)
-            
-            # Задержка между запросами
-            time.sleep(1)
         
         # Проверяем результат
         success_rate = self.execution_stats.get('prompts_generated') / len(slides_to_process)
@@ -2903,19 +5081,14 @@ class RWTechPPTXGenerator:
             prompt = prompt_data['prompt']
             slide_number = slide_data['number']
             
-            self.execution_stats.increment('images_attempted')
-            
             # Цветное сообщение о генерации изображения
             ColorfulUI.print_image_generation(slide_number, prompts_count, self.image_model)
             
             # Генерируем изображение
             image_path = self._generate_image_with_dalle(prompt, slide_number)
             
-            # Обновляем прогресс-бар
+            # Обновляем прогресс-бар (темп запросов задает лимитер провайдера)
             progress_bar.update(i + 1)
-            
-            # Задержка между запросами
-            time.sleep(2)
         
         # Проверяем результат
         success_rate = self.execution_stats.get('images_generated') / prompts_count
@@ -2930,6 +5103,13 @@ class RWTechPPTXGenerator:
         
         return True
     
+    def _release_images(self):
+        """Дожидается фоновой записи изображений, освобождает память и поток записи"""
+        for error in self.image_store.close():
+            print(f"⚠️  Не удалось записать изображение на диск: {error}")
+            if self.logger:
+                self.logger.warning(f"Ошибка фоновой записи изображения: {error}")
+    
     def _cleanup_partial_results(self, save_history=True):
         """
         Очищает частично созданные файлы
@@ -2939,6 +5119,9 @@ class RWTechPPTXGenerator:
         """
         print("\n🧹 Обработка результатов генерации...")
         
+        # Фоновая запись изображений должна закончиться до копирования в историю и удаления каталогов
+        self._release_images()
+        
         # Сначала пытаемся сохранить в историю
         if save_history and (os.path.exists(self.prompts_dir) or os.path.exists(self.images_dir)):
             history_saved = self._save_generation_history()
@@ -2946,6 +5129,11 @@ class RWTechPPTXGenerator:
             if history_saved:
                 print("📁 Файлы сохранены в историю перед очисткой")
         
+        # Пока журнал генерации не закрыт, промпты и изображения нужны для --resume
+        if self.generation_journal.exists():
+            print("📓 Промпты и изображения сохранены для продолжения: запустите с --resume")
+            return
+        
         # Теперь очищаем временные директории
         try:
             import shutil
@@ -2958,6 +5146,10 @@ class RWTechPPTXGenerator:
             if os.path.exists(self.images_dir):
                 shutil.rmtree(self.images_dir)
                 print("✓ Временные изображения удалены")
+            
+            # Промежуточный каталог запуска вне рабочего каталога (tmpfs)
+            if self.scratch_dir and self.scratch_dir != self.workspace_dir and os.path.isdir(self.scratch_dir):
+                shutil.rmtree(self.scratch_dir)
                 
         except Exception as e:
             print(f"⚠️  Ошибка при очистке: {e}")
@@ -2967,6 +5159,10 @@ class RWTechPPTXGenerator:
         Обновляет презентацию, вставляя AI-изображения
         КРИТИЧЕСКИ ВАЖНО: этот метод должен действительно вставлять изображения
         """
+        from pptx import Presentation
+        if self.build_mode == 'single_pass':
+            return self._build_presentation_with_images()
+        
         try:
             print("📎 Вставка изображений в презентацию...")
             
@@ -2986,7 +5182,7 @@ class RWTechPPTXGenerator:
                 image_filename = f"slide_{slide_num:02d}_illustration.png"
                 image_path = os.path.join(self.images_dir, image_filename)
                 
-                if os.path.exists(image_path):
+                if self.image_store.exists(image_path):
                     generated_images[slide_num] = {
                         'path': image_path,
                         'filename': image_filename,
@@ -3039,7 +5235,7 @@ class RWTechPPTXGenerator:
                     
                     # КРИТИЧЕСКИ ВАЖНО: Реально добавляем изображение
                     picture = slide.shapes.add_picture(
-                        image_path,
+                        self._prepare_image_for_slide(image_path, image_width, image_height),
                         left=image_left,
                         top=image_top,
                         width=image_width,
@@ -3063,9 +5259,10 @@ class RWTechPPTXGenerator:
             # Сохраняем обновленную презентацию
             if images_inserted > 0:
                 # Новое имя файла с суффиксом
-                illustrated_path = os.path.join(self.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
+                illustrated_path = self.illustrated_file
                 prs.save(illustrated_path)
                 print(f"✓ Презентация с иллюстрациями сохранена: {illustrated_path}")
+                self._report_image_optimization()
                 
                 # Обновляем статистику
                 self.execution_stats.set('images_inserted', images_inserted)
@@ -3086,6 +5283,35 @@ class RWTechPPTXGenerator:
                 self.logger.error(traceback.format_exc())
             return False
 
+    def _build_presentation_with_images(self):
+        """Собирает презентацию с AI-изображениями в один проход и сохраняет ее один раз"""
+        print("📎 Сборка презентации с иллюстрациями (один проход)...")
+        
+        results = getattr(self, 'parallel_results', None) or {}
+        self.generated_images = {
+            slide_number: result['image_path']
+            for slide_number, result in results.items()
+            if result.get('image_path') and self.image_store.exists(result['image_path'])
+        }
+        print(f"Найдено {len(self.generated_images)} изображений для вставки")
+        
+        try:
+            self.execution_stats.set('images_inserted', 0)
+            self.generate_presentation(output_file=self.illustrated_file)
+        finally:
+            self.generated_images = None
+        
+        images_inserted = self.execution_stats.get('images_inserted')
+        if images_inserted == 0:
+            print("❌ Ни одно изображение не было вставлено")
+            return False
+        
+        print(f"✓ Презентация с иллюстрациями сохранена: {self.illustrated_file}")
+        self._report_image_optimization()
+        if self.logger:
+            self.logger.info(f"Презентация с иллюстрациями собрана в один проход: {self.illustrated_file}")
+        return True
+    
     def _save_generation_history(self):
         """
         Сохраняет промпты и изображения в историю для возможного повторного использования
@@ -3097,11 +5323,14 @@ class RWTechPPTXGenerator:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             # Создаем директорию истории
-            history_base = os.path.join(self.base_path, "history")
+            history_base = self.history_dir
             os.makedirs(history_base, exist_ok=True)
             
             # Создаем директорию для текущей генерации
-            generation_dir = os.path.join(history_base, f"generation_{timestamp}")
+            history_name = f"generation_{timestamp}_{self.run_id}" if self.run_id else f"generation_{timestamp}"
+            if self.deck_name:
+                history_name = f"{history_name}_{self.deck_name}"
+            generation_dir = os.path.join(history_base, history_name)
             os.makedirs(generation_dir, exist_ok=True)
             
             # Сохраняем метаданные генерации
@@ -3140,7 +5369,7 @@ class RWTechPPTXGenerator:
                 files_saved = True
             
             # Копируем финальную презентацию если она есть
-            illustrated_path = os.path.join(self.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
+            illustrated_path = self.illustrated_file
             if os.path.exists(illustrated_path):
                 shutil.copy2(
                     illustrated_path, 
@@ -3183,6 +5412,220 @@ class RWTechPPTXGenerator:
                 self.logger.error(f"Ошибка сохранения истории: {e}")
             return False
 
+    def _template_fingerprint(self):
+        """sha256 файла шаблона"""
+        if self.template_bytes is not None:
+            return hashlib.sha256(self.template_bytes).hexdigest()
+        with open(self.template_file, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    
+    def _build_settings(self):
+        """Настройки, влияющие на итоговый файл презентации"""
+        return {
+            'use_ai_illustrations': self.use_ai_illustrations,
+            'slide_interval': self.slide_interval if self.use_ai_illustrations else None,
+            'image_model': self.image_model if self.use_ai_illustrations else None,
+            'build_mode': self.build_mode,
+            'template_decorations': self.template_decorations,
+            'image_optimization': dict(self.image_optimization) if self.use_ai_illustrations else None
+        }
+    
+    def _slide_fingerprint(self, slide_data, template_hash):
+        """Отпечаток слайда: разобранная запись, иллюстрация, шаблон и версия раскладки"""
+        illustrated = self._should_generate_illustration(slide_data['number'], slide_data)
+        record = {key: slide_data.get(key) for key in ('number', 'title', 'body', 'illustration', 'type')}
+        payload = json.dumps({
+            'slide': record,
+            'illustrated': illustrated,
+            'image_model': self.image_model if illustrated else None,
+            'template': template_hash,
+            'layout_version': self.LAYOUT_VERSION
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _plan_incremental_build(self):
+        """Сравнивает отпечатки слайдов с манифестом прошлой сборки"""
+        template_hash = self._template_fingerprint()
+        self.slide_fingerprints = {
+            slide_data['number']: self._slide_fingerprint(slide_data, template_hash)
+            for slide_data in self.slides_data
+        }
+        self.template_hash = template_hash
+        self.previous_manifest = None
+        self.deck_up_to_date = False
+        
+        if not self.incremental_build or self.refresh_prompts or not os.path.exists(self.manifest_file):
+            return
+        
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Манифест прошлой сборки не прочитан: {e}")
+            return
+        
+        if manifest.get('manifest_version') != self.MANIFEST_VERSION:
+            return
+        self.previous_manifest = manifest
+        
+        previous_slides = manifest.get('slides', {})
+        changed = [
+            number for number, fingerprint in self.slide_fingerprints.items()
+            if previous_slides.get(str(number), {}).get('fingerprint') != fingerprint
+        ]
+        print(f"♻️  Инкрементальная сборка: изменено слайдов {len(changed)} из {len(self.slide_fingerprints)}")
+        if changed and self.logger:
+            self.logger.info(f"Изменённые слайды: {changed}")
+        
+        # Презентация целиком актуальна: те же слайды, настройки и неизмененный итоговый файл
+        output_file = manifest.get('output_file')
+        self.deck_up_to_date = bool(
+            not changed and
+            len(previous_slides) == len(self.slide_fingerprints) and
+            manifest.get('settings') == self._build_settings() and
+            output_file and os.path.exists(output_file) and
+            os.path.getsize(output_file) == manifest.get('output_size')
+        )
+        if self.deck_up_to_date:
+            self.execution_stats.set('slides_reused', len(self.slide_fingerprints))
+            self.execution_stats.set('images_inserted', manifest.get('images_inserted', 0))
+    
+    def _reuse_unchanged_illustrations(self, slides_to_process):
+        """Берет промпты и изображения неизмененных слайдов из кэшей по манифесту"""
+        reused = {}
+        if not self.previous_manifest or self.image_cache is None:
+            return reused
+        
+        previous_slides = self.previous_manifest.get('slides', {})
+        for slide_data in slides_to_process:
+            slide_number = slide_data['number']
+            entry = previous_slides.get(str(slide_number), {})
+            if entry.get('fingerprint') != self.slide_fingerprints.get(slide_number) or not entry.get('image_key'):
+                continue
+            
+            image_data = self.image_cache.read(entry['image_key'])
+            if not image_data:
+                continue
+            image_path = self.image_store.put(
+                os.path.join(self.images_dir, f"slide_{slide_number:02d}_illustration.png"), image_data)
+            
+            prompt = None
+            if self.prompt_cache is not None and entry.get('prompt_key'):
+                prompt = self.prompt_cache.get(entry['prompt_key'])
+                if prompt:
+                    self._write_prompt_file(slide_data, "DALL-E Prompt", prompt)
+            
+            reused[slide_number] = {
+                'slide_data': slide_data,
+                'prompt': prompt,
+                'image_path': image_path,
+                'image_key': entry['image_key'],
+                'prompt_key': entry.get('prompt_key')
+            }
+        
+        self.execution_stats.increment('slides_reused', len(reused))
+        return reused
+    
+    def _prepare_generation_journal(self, slides_to_process, reused):
+        """Начинает журнал генерации, а в режиме --resume восстанавливает из него готовые результаты"""
+        restored = {}
+        self.resumed_prompts = {}
+        header = {
+            'created': datetime.now().isoformat(),
+            'settings': self._build_settings(),
+            'template_hash': getattr(self, 'template_hash', None)
+        }
+        
+        if self.resume:
+            journal_header, journal_slides = self.generation_journal.load()
+            if journal_header is None:
+                print("⚠️  Журнал генерации не найден, генерация начинается заново")
+            elif (journal_header.get('settings') != header['settings'] or
+                  journal_header.get('template_hash') != header['template_hash']):
+                print("⚠️  Настройки или шаблон изменились после прерванного запуска, журнал не используется")
+            else:
+                for slide_data in slides_to_process:
+                    slide_number = slide_data['number']
+                    if slide_number in reused:
+                        continue
+                    
+                    # Результаты слайда, изменившегося после прерванного запуска, не используются
+                    fingerprint = self.slide_fingerprints.get(slide_number)
+                    state = journal_slides.get(slide_number, {})
+                    prompt_record = state.get('prompt')
+                    image_record = state.get('image')
+                    if not prompt_record or prompt_record.get('fingerprint') != fingerprint:
+                        continue
+                    
+                    if (image_record and image_record.get('fingerprint') == fingerprint and
+                            os.path.exists(image_record.get('image_path', ''))):
+                        restored[slide_number] = {
+                            'slide_data': slide_data,
+                            'prompt': prompt_record['prompt'],
+                            'image_path': image_record['image_path']
+                        }
+                    else:
+                        self.resumed_prompts[slide_number] = prompt_record['prompt']
+                
+                print(f"📓 Продолжение по журналу: готовых изображений {len(restored)}, "
+                      f"промптов без изображения {len(self.resumed_prompts)}")
+                self.execution_stats.set('slides_resumed', len(restored))
+                self.generation_journal.active = True
+                return restored
+        elif self.generation_journal.exists():
+            print("⚠️  Найден журнал незавершенной генерации - для продолжения запустите с --resume")
+        
+        self.generation_journal.start(header)
+        return restored
+    
+    def _write_manifest(self, output_file):
+        """Записывает манифест сборки рядом с результатом"""
+        if self.deck_up_to_date:
+            return
+        
+        results = getattr(self, 'parallel_results', None) or {}
+        slides = {}
+        for slide_data in self.slides_data:
+            slide_number = slide_data['number']
+            entry = {'fingerprint': self.slide_fingerprints.get(slide_number)}
+            result = results.get(slide_number)
+            if result:
+                entry['image_key'] = result.get('image_key') or (
+                    self._image_cache_key(result['prompt']) if result.get('prompt') else None)
+                entry['prompt_key'] = result.get('prompt_key') or self._prompt_cache_key(slide_data)
+            slides[str(slide_number)] = entry
+        
+        manifest = {
+            'manifest_version': self.MANIFEST_VERSION,
+            'created': datetime.now().isoformat(),
+            'template_hash': getattr(self, 'template_hash', None),
+            'layout_version': self.LAYOUT_VERSION,
+            'settings': self._build_settings(),
+            'output_file': output_file,
+            'output_size': os.path.getsize(output_file),
+            'images_inserted': self.execution_stats.get('images_inserted'),
+            'slides': slides
+        }
+        
+        try:
+            tmp_path = f"{self.manifest_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.manifest_file)
+        except Exception as e:
+            print(f"⚠️  Не удалось сохранить манифест сборки: {e}")
+    
+    def inspect_package(self, path):
+        """Проверка пакета .pptx; результат кэшируется, пока файл не изменился"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if self.package_report is None or self.package_report[0] != key:
+            report = PackageValidator(path).validate()
+            self.logger.info(f"Проверка пакета {os.path.basename(path)}: {report['slide_count']} слайдов, "
+                             f"{report['media_count']} медиа, {report['elapsed'] * 1000:.1f} мс")
+            self.package_report = (key, report)
+        return self.package_report[1]
+    
     def validate_final_result(self):
         """Комплексная проверка финального результата"""
         print(f"\n🔍 ФИНАЛЬНАЯ ВАЛИДАЦИЯ РЕЗУЛЬТАТА")
@@ -3196,7 +5639,7 @@ class RWTechPPTXGenerator:
         }
         
         # Определяем какой файл проверять
-        illustrated_path = os.path.join(self.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
+        illustrated_path = self.illustrated_file
         final_file = illustrated_path if (self.use_ai_illustrations and os.path.exists(illustrated_path)) else self.result_file
         
         # 1. Проверка существования файла
@@ -3210,8 +5653,9 @@ class RWTechPPTXGenerator:
         # 2. Проверка размера файла
         try:
             file_size = os.path.getsize(final_file)
-            # Минимум 100KB для презентации с изображениями (тестовые изображения могут быть маленькими)
-            min_size = 100 * 1024
+            # Минимум 100KB для презентации с изображениями (тестовые изображения могут быть маленькими),
+            # без иллюстраций размер зависит от числа слайдов (generate_deck принимает любой контент)
+            min_size = 100 * 1024 if self.use_ai_illustrations else 10 * 1024
             validation_results['file_size_ok'] = file_size > min_size
             
             if validation_results['file_size_ok']:
@@ -3224,13 +5668,18 @@ class RWTechPPTXGenerator:
             print(f"❌ Ошибка при проверке размера файла: {e}")
             return False
         
-        # 3. Проверка структуры презентации
+        # 3. Проверка структуры презентации (zip-пакет; после контрольной точки - из кэша)
         try:
-            prs = Presentation(final_file)
+            package = self.inspect_package(final_file)
+            if not package['ok']:
+                print(f"❌ Пакет презентации поврежден:")
+                for error in package['errors'][:5]:
+                    print(f"   • {error}")
+                return False
             
             # Проверка количества слайдов
             expected_slides = len(self.slides_data)
-            actual_slides = len(prs.slides)
+            actual_slides = package['slide_count']
             validation_results['slide_count_correct'] = actual_slides == expected_slides
             
             if validation_results['slide_count_correct']:
@@ -3244,17 +5693,14 @@ class RWTechPPTXGenerator:
                 images_found = 0
                 ai_images_found = 0
                 
-                for i, slide in enumerate(prs.slides):
-                    for shape in slide.shapes:
-                        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                            images_found += 1
-                            # Проверяем, является ли это AI-изображением
-                            slide_number = i + 1
-                            if self._should_generate_illustration(slide_number, self.slides_data[i]):
-                                ai_images_found += 1
+                for i, pictures in enumerate(package['pictures']):
+                    images_found += pictures
+                    # Проверяем, является ли это AI-изображением
+                    slide_number = i + 1
+                    if self._should_generate_illustration(slide_number, self.slides_data[i]):
+                        ai_images_found += pictures
                 
                 expected_ai_images = self.execution_stats.get('images_generated')
-                expected_total_images = expected_ai_images + (len(self.template_images) * len(prs.slides))
                 
                 validation_results['images_inserted'] = ai_images_found >= expected_ai_images
                 
@@ -3269,7 +5715,8 @@ class RWTechPPTXGenerator:
                 print("✅ AI-изображения не использовались (это ОК)")
             
             validation_results['no_corruption'] = True
-            print("✅ Файл презентации читается без ошибок")
+            print(f"✅ Пакет презентации целостен: {package['media_count']} медиафайлов, "
+                  f"проверка {package['elapsed'] * 1000:.0f} мс")
             
         except Exception as e:
             print(f"❌ Ошибка при валидации презентации: {e}")
@@ -3291,6 +5738,18 @@ class RWTechPPTXGenerator:
         
         return all_passed
 
+    @property
+    def generation_stats(self):
+        """Legacy stats for backward compatibility (строится из ExecutionStats)"""
+        stats = self.execution_stats.snapshot()
+        return {
+            'total_slides': stats['slides_to_process'],
+            'prompts_generated': stats['prompts_generated'],
+            'prompts_failed': stats['prompts_failed'],
+            'images_generated': stats['images_generated'],
+            'images_failed': stats['images_failed']
+        }
+    
     def _show_final_report(self):
         """Показывает финальный отчет о генерации AI-иллюстраций"""
         stats = self.generation_stats
@@ -3319,8 +5778,256 @@ class RWTechPPTXGenerator:
         except:
             pass  # Игнорируем ошибки с форматированием
 
-    def run(self):
-        """Запуск всего процесса генерации"""
+    def _build_deck(self, engine=None):
+        """Этапы 3-7 для одного файла контента: сборка, AI-иллюстрации, валидация, история
+        
+        Returns:
+            путь к итоговому файлу презентации
+        """
+        # ЭТАП 3: Обработка контента (шаблон загружается один раз на процесс)
+        self.parse_content()
+        if self.template_prs is None:
+            self.load_template()
+        self._plan_incremental_build()
+        
+        if self.deck_up_to_date:
+            print("♻️  Презентация актуальна: контент, шаблон и настройки не изменились, пересборка пропущена")
+        
+        # ЭТАП 4: Генерация базовой презентации
+        # (при сборке в один проход презентация создается после генерации иллюстраций)
+        if self.deck_up_to_date:
+            pass
+        elif not (self.use_ai_illustrations and self.build_mode == 'single_pass'):
+            ColorfulUI.print_rw_tech_step("Создание базовой презентации", "Генерация 60 слайдов с корпоративным дизайном")
+            self.generate_presentation()
+        
+        # ЭТАП 5: Параллельная генерация AI-иллюстраций (критический этап)
+        if self.use_ai_illustrations and not self.deck_up_to_date:
+            ColorfulUI.print_ascii_step(5, "AI-генерация иллюстраций", "Создание изображений с помощью ИИ")
+            ai_success = self._process_ai_illustrations_parallel(engine=engine or self.generation_engine)
+            # _process_ai_illustrations_parallel выбрасывает GenerationError при критических ошибках
+            
+            # Сборка в один проход без слайдов для иллюстраций - создаем обычную презентацию
+            if self.prs is None:
+                self.generate_presentation()
+        
+        # ЭТАП 6: Финальная валидация
+        ColorfulUI.print_ascii_step("ВАЛИДАЦИЯ", "Проверка результата", "Комплексная проверка созданной презентации")
+        validation_success = self.validate_final_result()
+        
+        if not validation_success:
+            print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Финальная валидация не пройдена")
+            self._cleanup_partial_results()
+            raise GenerationError("Финальная валидация не пройдена", exit_code=7)  # Код ошибки валидации
+        
+        # Контрольная точка: финальная валидация
+        if not self.checkpoints.validate_checkpoint('final_validation'):
+            print("\n⛔ ОСТАНОВКА: Финальная валидация не пройдена")
+            raise GenerationError("Финальная валидация не пройдена", exit_code=8)
+        
+        final_file = self._final_file()
+        self._write_manifest(final_file)
+        
+        # ЭТАП 7: Сохранение истории (при успехе)
+        if self.use_ai_illustrations:
+            print(f"\n🔸 ЭТАП ФИНАЛ: Сохранение истории")
+            self._release_images()  # История копирует img_generated - дожидаемся фоновой записи
+            self._save_generation_history()
+            
+            # Запуск завершен - журнал для --resume больше не нужен
+            self.generation_journal.remove()
+            
+            # Очищаем временные файлы ПОСЛЕ сохранения истории
+            self._cleanup_partial_results(save_history=False)  # История уже сохранена
+        
+        return final_file
+
+    def _final_file(self):
+        """Итоговый файл: презентация с иллюстрациями, если она создана"""
+        illustrated_path = self.illustrated_file
+        return illustrated_path if (self.use_ai_illustrations and os.path.exists(illustrated_path)) else self.result_file
+    
+    def _new_deck(self, name, content_file, result_dir):
+        """Генератор одной презентации пакета: общие шаблон, сессии, лимиты и кэши, свое состояние сборки"""
+        deck = copy.copy(self)
+        deck.deck_name = name
+        deck.content_file = content_file
+        deck._set_result_dir(result_dir)
+        
+        # Свои промпты и изображения: файлы, оставленные для --resume, не перезаписываются
+        # следующей презентацией; промежуточным каталогом запуска владеет пакет
+        deck.prompts_dir = os.path.join(self.prompts_dir, name)
+        deck.images_dir = os.path.join(self.images_dir, name)
+        deck.scratch_dir = None
+        
+        deck.execution_stats = ExecutionStats()
+        for key in ('api_validation_attempts', 'api_validation_success'):
+            deck.execution_stats.set(key, self.execution_stats.get(key))
+        deck.checkpoints = ExecutionCheckpoints(deck.execution_stats, deck)
+        deck.generation_journal = GenerationJournal(deck.journal_file)
+        
+        deck.slides_data = []
+        deck.prs = None
+        deck.generated_images = None
+        deck.parallel_results = {}
+        deck.previous_manifest = None
+        deck.slide_fingerprints = {}
+        deck.deck_up_to_date = False
+        deck.package_report = None
+        deck.image_optimization_totals = {'images': 0, 'bytes_before': 0, 'bytes_after': 0}
+        deck.image_store = ImageStore(persist=self.image_store.persist)
+        deck.resumed_prompts = {}
+        return deck
+    
+    @staticmethod
+    def _collect_batch_inputs(source):
+        """Список (имя, файл контента): *.txt каталога или манифест (JSON-список либо пути построчно)"""
+        if os.path.isdir(source):
+            entries = [
+                {'content': os.path.join(source, name)}
+                for name in sorted(os.listdir(source)) if name.endswith('.txt')
+            ]
+        else:
+            base_dir = os.path.dirname(os.path.abspath(source))
+            with open(source, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if source.endswith('.json'):
+                entries = [entry if isinstance(entry, dict) else {'content': entry} for entry in json.loads(text)]
+            else:
+                entries = [
+                    {'content': line.strip()} for line in text.splitlines()
+                    if line.strip() and not line.strip().startswith('#')
+                ]
+            for entry in entries:
+                entry['content'] = os.path.join(base_dir, entry['content'])
+        
+        inputs = []
+        used_names = set()
+        for entry in entries:
+            name = entry.get('name') or os.path.splitext(os.path.basename(entry['content']))[0]
+            unique_name, suffix = name, 2
+            while unique_name in used_names:
+                unique_name = f"{name}_{suffix}"
+                suffix += 1
+            used_names.add(unique_name)
+            inputs.append((unique_name, entry['content']))
+        return inputs
+    
+    def run_batch(self, source, output_dir=None, engine=None):
+        """Пакетная генерация: по презентации на каждый файл контента в одном процессе
+        
+        Шаблон загружается и API-ключи проверяются один раз; сессии провайдеров,
+        лимиты запросов и кэши общие для всех презентаций пакета.
+        
+        Args:
+            source: каталог с файлами контента (*.txt) или файл-манифест
+            output_dir: каталог результатов (в нем подкаталог на каждую презентацию)
+            engine: движок AI-генерации ('threads' или 'asyncio')
+        
+        Returns:
+            код завершения: 0 - все презентации созданы, 9 - часть презентаций с ошибками
+        """
+        ASCIIArt.print_header()
+        output_dir = output_dir or self.result_dir
+        results = []
+        
+        try:
+            inputs = self._collect_batch_inputs(source)
+            if not inputs:
+                print(f"ОШИБКА: Не найдено файлов контента для пакетной генерации: {source}")
+                return 1
+            print(f"📚 Пакетная генерация: {len(inputs)} презентаций → {output_dir}")
+            
+            if not os.path.exists(self.template_file):
+                print(f"ОШИБКА: Файл шаблона не найден: {self.template_file}")
+                return 1
+            
+            # Настройка AI и валидация API - один раз на весь пакет
+            self.setup_ai_illustrations(interactive=self.interactive)
+            if self.use_ai_illustrations:
+                print(f"\n🔒 СТРОГАЯ ВАЛИДАЦИЯ API")
+                if not self._validate_and_update_api_keys(interactive=self.interactive):
+                    print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Невалидные API ключи")
+                    return 10
+            self.load_template()
+            
+            for index, (name, content_file) in enumerate(inputs, 1):
+                print(f"\n{'='*60}")
+                print(f"📚 ПРЕЗЕНТАЦИЯ {index}/{len(inputs)}: {name}")
+                print(f"{'='*60}")
+                
+                deck = self._new_deck(name, content_file, os.path.join(output_dir, name))
+                started = time.time()
+                final_file = None
+                try:
+                    deck.validate_files()
+                    final_file = deck._build_deck(engine)
+                    exit_code = 0
+                except GenerationError as e:
+                    # Критическая ошибка одной презентации не останавливает пакет
+                    print(f"❌ {name}: {e}")
+                    if self.quiet:
+                        print(f"ОШИБКА: {name}: {e}", file=sys.__stderr__)
+                    exit_code = e.exit_code
+                if self.quiet and final_file:
+                    print(final_file, file=sys.__stdout__)
+                
+                results.append({
+                    'name': name,
+                    'exit_code': exit_code,
+                    'file': final_file,
+                    'slides': len(deck.slides_data),
+                    'stats': deck.execution_stats.snapshot(),
+                    'duration': time.time() - started
+                })
+        except KeyboardInterrupt:
+            print("\n⚠️  Пакетная генерация прервана пользователем")
+        finally:
+            # Освобождаем пул соединений с API провайдеров
+            self.provider_sessions.close()
+            self.sdk_clients.close()
+            self._cleanup_batch_scratch()
+        
+        self._print_batch_report(results)
+        return 0 if results and all(result['exit_code'] == 0 for result in results) else 9
+    
+    def _cleanup_batch_scratch(self):
+        """Удаляет опустевшие общие каталоги промптов и изображений пакета (каталоги для --resume остаются)"""
+        candidates = [self.prompts_dir, self.images_dir]
+        if self.scratch_dir and self.scratch_dir != self.workspace_dir:
+            candidates.append(self.scratch_dir)
+        for path in candidates:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass  # не существует или не пуст
+    
+    def _print_batch_report(self, results):
+        """Итоговый отчет пакетной генерации"""
+        print("\n" + "="*60)
+        print("📚 ОТЧЕТ ПАКЕТНОЙ ГЕНЕРАЦИИ")
+        print("="*60)
+        
+        for result in results:
+            stats = result['stats']
+            status = "✅" if result['exit_code'] == 0 else f"❌ (код {result['exit_code']})"
+            print(f"{status} {result['name']}: слайдов {result['slides']}, "
+                  f"изображений {stats['images_inserted']}, {result['duration']:.1f} с")
+            if result['file']:
+                print(f"   {result['file']}")
+        
+        succeeded = sum(1 for result in results if result['exit_code'] == 0)
+        api_calls = sum(result['stats']['total_api_calls'] for result in results)
+        cache_hits = sum(result['stats']['image_cache_hits'] + result['stats']['prompt_cache_hits'] for result in results)
+        print(f"\nУспешно: {succeeded}/{len(results)}, API вызовов: {api_calls}, попаданий в кэши: {cache_hits}")
+    
+    def run(self, engine=None):
+        """Запуск всего процесса генерации
+        
+        Args:
+            engine: движок AI-генерации ('threads' или 'asyncio'),
+                    по умолчанию берется из config.json (generation_engine)
+        """
         # Красивый ASCII заголовок RW Tech
         ASCIIArt.print_header()
         
@@ -3333,64 +6040,32 @@ class RWTechPPTXGenerator:
         try:
             # ЭТАП 1: Базовая валидация
             self.validate_files()
-            self.setup_ai_illustrations()
+            self.setup_ai_illustrations(interactive=self.interactive)
             
             # ЭТАП 2: Строгая валидация API ключей
             if self.use_ai_illustrations:
                 print(f"\n🔒 СТРОГАЯ ВАЛИДАЦИЯ API")
-                api_valid = self._validate_and_update_api_keys(interactive=True)
+                api_valid = self._validate_and_update_api_keys(interactive=self.interactive)
                 if not api_valid:
                     print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Невалидные API ключи")
                     print("Программа не может продолжить с AI-иллюстрациями")
                     self._cleanup_partial_results()
-                    sys.exit(10)  # Код ошибки для невалидных API ключей
-            
-            # ЭТАП 3: Обработка контента
-            self.parse_content()
-            self.load_template()
-            
-            # ЭТАП 4: Генерация базовой презентации
-            ColorfulUI.print_rw_tech_step("Создание базовой презентации", "Генерация 60 слайдов с корпоративным дизайном")
-            self.generate_presentation()
-            
-            # ЭТАП 5: Параллельная генерация AI-иллюстраций (критический этап)
-            if self.use_ai_illustrations:
-                ColorfulUI.print_ascii_step(5, "AI-генерация иллюстраций", "Создание изображений с помощью ИИ")
-                ai_success = self._process_ai_illustrations_parallel()
-                # _process_ai_illustrations_parallel уже содержит sys.exit() при критических ошибках
-            
-            # ЭТАП 6: Финальная валидация
-            ColorfulUI.print_ascii_step("ВАЛИДАЦИЯ", "Проверка результата", "Комплексная проверка созданной презентации")
-            validation_success = self.validate_final_result()
-            
-            if not validation_success:
-                print("\n⛔ КРИТИЧЕСКАЯ ОШИБКА: Финальная валидация не пройдена")
-                self._cleanup_partial_results()
-                sys.exit(7)  # Код ошибки валидации
+                    raise GenerationError("Невалидные API ключи", exit_code=10)  # Код ошибки для невалидных API ключей
             
-            # Контрольная точка: финальная валидация
-            if not self.checkpoints.validate_checkpoint('final_validation'):
-                print("\n⛔ ОСТАНОВКА: Финальная валидация не пройдена")
-                sys.exit(8)
-            
-            # ЭТАП 7: Сохранение истории (при успехе)
-            if self.use_ai_illustrations:
-                print(f"\n🔸 ЭТАП ФИНАЛ: Сохранение истории")
-                self._save_generation_history()
-                
-                # Очищаем временные файлы ПОСЛЕ сохранения истории
-                self._cleanup_partial_results(save_history=False)  # История уже сохранена
+            # ЭТАПЫ 3-7: Обработка контента, сборка, AI-иллюстрации и валидация
+            self._build_deck(engine)
             
             # УСПЕХ: Все проверки пройдены
             execution_success = self.execution_stats.print_final_report()
+            # Критерии отчета (валидация API, вставленные изображения) относятся только к AI-режиму
+            execution_success = execution_success or not self.use_ai_illustrations
             
             # Красивый баннер успешного завершения RW Tech
             ASCIIArt.print_success_banner()
             print(f"✅ Создано слайдов: {len(self.slides_data)}")
             
             # Определяем итоговый файл
-            illustrated_path = os.path.join(self.result_dir, "RWTech_Universal_Presentation_Illustrated.pptx")
-            final_file = illustrated_path if (self.use_ai_illustrations and os.path.exists(illustrated_path)) else self.result_file
+            final_file = self._final_file()
             
             print(f"✅ Файл сохранен: {final_file}")
             print(f"✅ Размер файла: {os.path.getsize(final_file) / (1024*1024):.2f} MB")
@@ -3402,7 +6077,7 @@ class RWTechPPTXGenerator:
                 print(f"✅ Вставлено в презентацию: {stats.get('images_inserted')}")
                 
                 # Показываем историю
-                history_base = os.path.join(self.base_path, "history")
+                history_base = self.history_dir
                 if os.path.exists(history_base):
                     history_dirs = [d for d in os.listdir(history_base) if d.startswith('generation_')]
                     if history_dirs:
@@ -3418,12 +6093,20 @@ class RWTechPPTXGenerator:
                 except:
                     pass
             
+            if self.quiet:
+                print(final_file, file=sys.__stdout__)
+            
             if execution_success:
                 sys.exit(0)  # Полный успех
             else:
                 print("\n⚠️  Программа завершена с предупреждениями")
                 sys.exit(9)  # Успех с предупреждениями
             
+        except GenerationError as e:
+            # Сообщение об ошибке уже выведено этапом, на котором она возникла (в quiet-режиме - в stderr)
+            if self.quiet:
+                print(f"ОШИБКА: {e}", file=sys.__stderr__)
+            sys.exit(e.exit_code)
         except KeyboardInterrupt:
             print()
             print("\033[1;33m")  # Ярко-желтый
@@ -3438,6 +6121,8 @@ class RWTechPPTXGenerator:
     ╚════════════════════════════════════════════════════════════════╝
             """)
             print("\033[0m")
+            if self.generation_journal.exists():
+                print("📓 Готовые промпты и изображения записаны в журнал - продолжите запуск с --resume")
             sys.exit(1)
         except Exception as e:
             print()
@@ -3454,9 +6139,231 @@ class RWTechPPTXGenerator:
             """)
             print("\033[0m")
             print(f"Детали ошибки: {e}")
+            if self.quiet:
+                print(f"ОШИБКА: {e}", file=sys.__stderr__)
             sys.exit(1)
+        finally:
+            # Освобождаем пул соединений с API провайдеров
+            self.provider_sessions.close()
+            self.sdk_clients.close()
+
+
+def generate_deck(content, template=None, output=None, use_ai=False, slide_interval=5,
+                  image_model=None, engine=None, options=None, workspace=None):
+    """Генерирует презентацию без интерактивного ввода и завершения процесса
+    
+    Args:
+        content: текст в формате slide_content.txt или список записей слайдов
+                 (словари number, title, body, illustration, type)
+        template: путь к шаблону .pptx или его содержимое (bytes); по умолчанию шаблон проекта
+        output: поток для записи .pptx; если не задан, байты возвращаются в результате
+        use_ai: генерировать AI-иллюстрации (ключи из config.json или переменных окружения)
+        slide_interval: иллюстрация на каждом N-м слайде
+        image_model: модель изображений (по умолчанию из config.json)
+        engine: движок AI-генерации ('threads' или 'asyncio')
+        options: атрибуты генератора (build_mode, template_decorations, worker_overrides, ...)
+        workspace: параметры рабочего каталога запуска; по умолчанию временный каталог,
+                   удаляемый после генерации
+    
+    Returns:
+        {'pptx': bytes или None (если задан output), 'slides': число слайдов, 'stats': статистика}
+    
+    Raises:
+        GenerationError: при любой критической ошибке генерации
+    """
+    # Вывод этапов не засоряет stdout приложения: сообщения остаются в логе генератора
+    with _silenced_output():
+        temp_root = None
+        if workspace is None:
+            temp_root = tempfile.mkdtemp(prefix="rwtech_")
+            workspace = {'root': temp_root}
+        
+        generator = None
+        try:
+            # Шаблон, config.json и кэши - из каталога проекта, а не из текущего каталога процесса
+            generator = RWTechPPTXGenerator(workspace=workspace, console_log=False, base_path=PROJECT_DIR)
+            generator.history_dir = os.path.join(generator.workspace_dir, "history")
+            for name, value in (options or {}).items():
+                if not hasattr(generator, name):
+                    raise GenerationError(f"Неизвестный параметр генератора: {name}", exit_code=1)
+                setattr(generator, name, value)
+            
+            if isinstance(content, str):
+                generator.content_text = content
+            else:
+                generator.content_records = list(content)
+            
+            if isinstance(template, (bytes, bytearray)):
+                generator.template_bytes = bytes(template)
+            elif template is not None:
+                generator.template_file = os.fspath(template)
+            
+            generator.use_ai_illustrations = use_ai
+            generator.slide_interval = slide_interval
+            if image_model:
+                generator.image_model = image_model
+            
+            generator._ensure_directories()
+            if use_ai and not generator._validate_and_update_api_keys(interactive=False):
+                raise GenerationError("API ключи не прошли валидацию", exit_code=10)
+            
+            final_file = generator._build_deck(engine)
+            with open(final_file, 'rb') as f:
+                pptx_bytes = f.read()
+            if output is not None:
+                output.write(pptx_bytes)
+            
+            return {
+                'pptx': None if output is not None else pptx_bytes,
+                'slides': len(generator.slides_data),
+                'stats': generator.execution_stats.snapshot()
+            }
+        finally:
+            if generator is not None:
+                generator._release_images()
+                generator.provider_sessions.close()
+                generator.sdk_clients.close()
+                generator._close_logging()
+            if temp_root:
+                shutil.rmtree(temp_root, ignore_errors=True)
+
+
+def main(argv=None):
+    """Точка входа командной строки"""
+    import argparse
+    import contextlib
+    
+    parser = argparse.ArgumentParser(description="RWTech PPTX Generator - генерация презентаций с AI-иллюстрациями")
+    parser.add_argument('--headless', action='store_true',
+                        help="без вопросов в stdin, анимаций и пауз (подразумевается --ai/--no-ai/--quiet)")
+    parser.add_argument('--ai', dest='ai', action='store_true', default=None,
+                        help="генерировать AI-иллюстрации (headless)")
+    parser.add_argument('--no-ai', dest='ai', action='store_false',
+                        help="без AI-иллюстраций (headless)")
+    parser.add_argument('--interval', type=int, default=None,
+                        help="AI-иллюстрация на каждом N-м слайде (по умолчанию 5)")
+    parser.add_argument('--model', choices=sorted(RWTechPPTXGenerator.IMAGE_MODEL_PROVIDERS), default=None,
+                        help="модель генерации изображений")
+    parser.add_argument('--content', metavar='PATH', default=None,
+                        help="файл контента (по умолчанию pptx_content/slide_content.txt)")
+    parser.add_argument('--template', metavar='PATH', default=None,
+                        help="шаблон презентации .pptx")
+    parser.add_argument('--out', metavar='PATH', default=None,
+                        help="путь итоговой презентации")
+    parser.add_argument('--quiet', action='store_true',
+                        help="вывести только путь к результату (ошибки - в stderr)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="только проверить файлы и контент, без сборки и обращений к API (headless)")
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default=None,
+                        help="движок генерации AI-иллюстраций (по умолчанию из config.json)")
+    parser.add_argument('--prompt-workers', type=int, default=None,
+                        help="число одновременных запросов генерации промптов")
+    parser.add_argument('--image-workers', type=int, default=None,
+                        help="число одновременных запросов генерации изображений")
+    parser.add_argument('--single-pass', action='store_true',
+                        help="собрать презентацию с иллюстрациями за один проход (одно сохранение)")
+    parser.add_argument('--layout-decorations', action='store_true',
+                        help="разместить изображения шаблона один раз в макете слайда")
+    parser.add_argument('--no-image-cache', action='store_true',
+                        help="не использовать кэш изображений между запусками")
+    parser.add_argument('--api-base-url', metavar='URL', default=None,
+                        help="базовый адрес для всех AI-провайдеров, для OpenAI добавляется /v1 (например, http://127.0.0.1:8765 для mock_provider_server.py)")
+    parser.add_argument('--no-persist-images', action='store_true',
+                        help="не записывать AI-изображения в img_generated (без --resume и истории изображений)")
+    parser.add_argument('--image-dpi', type=int, default=None,
+                        help="разрешение AI-изображений на слайде, dpi (по умолчанию: 150)")
+    parser.add_argument('--no-image-optimization', action='store_true',
+                        help="вставлять AI-изображения в исходном размере, без уменьшения и перекодирования")
+    parser.add_argument('--refresh-prompts', action='store_true',
+                        help="запросить новые промпты у Claude, перезаписав кэш промптов")
+    parser.add_argument('--clear-prompt-cache', action='store_true',
+                        help="удалить кэш промптов перед запуском")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="пересобрать все слайды, не используя манифест прошлой сборки")
+    parser.add_argument('--resume', action='store_true',
+                        help="продолжить прерванную AI-генерацию по журналу, запрашивая только недостающее")
+    parser.add_argument('--batch', metavar='PATH', default=None,
+                        help="пакетная генерация: каталог с файлами контента (*.txt) или файл-манифест")
+    parser.add_argument('--batch-output', metavar='DIR', default=None,
+                        help="каталог результатов пакетной генерации (по умолчанию pptx_result)")
+    parser.add_argument('--run-id', default=None,
+                        help="идентификатор запуска: отдельный рабочий каталог <root>/<run-id> (для --resume укажите прежний)")
+    parser.add_argument('--workspace-root', metavar='DIR', default=None,
+                        help="корень рабочих каталогов запусков (по умолчанию runs/)")
+    parser.add_argument('--tmpfs', nargs='?', const=True, default=None, metavar='DIR',
+                        help="держать промежуточные промпты и изображения в tmpfs (по умолчанию /dev/shm)")
+    args = parser.parse_args(argv)
+    if args.interval is not None and args.interval <= 0:
+        parser.error("--interval должен быть положительным числом")
+    if args.image_dpi is not None and args.image_dpi <= 0:
+        parser.error("--image-dpi должен быть положительным числом")
+    headless = args.headless or args.ai is not None or args.quiet or args.dry_run
+    if headless:
+        ColorfulUI.ANIMATIONS = False
+    
+    workspace = None
+    if args.run_id or args.workspace_root or args.tmpfs:
+        workspace = {'run_id': args.run_id, 'root': args.workspace_root, 'tmpfs': args.tmpfs}
+    
+    # --quiet: сообщения этапов и консольный лог подавляются на весь запуск;
+    # пути результатов и ошибки выводятся в sys.__stdout__ / sys.__stderr__
+    output = contextlib.ExitStack()
+    if args.quiet:
+        devnull = output.enter_context(open(os.devnull, 'w', encoding='utf-8'))
+        output.enter_context(contextlib.redirect_stdout(devnull))
+        output.enter_context(contextlib.redirect_stderr(devnull))
+    
+    with output:
+        generator = RWTechPPTXGenerator(workspace=workspace)
+        generator.quiet = args.quiet
+        
+        if headless:
+            generator.interactive = False
+            generator.use_ai_illustrations = bool(args.ai)
+        if args.interval is not None:
+            generator.slide_interval = args.interval
+        if args.model:
+            generator.image_model = args.model
+        if args.content:
+            generator.content_file = os.path.abspath(args.content)
+        if args.template:
+            generator.template_file = os.path.abspath(args.template)
+        if args.out:
+            generator._set_output_file(args.out)
+        if args.prompt_workers is not None:
+            generator.worker_overrides['prompt'] = args.prompt_workers
+        if args.image_workers is not None:
+            generator.worker_overrides['image'] = args.image_workers
+        if args.single_pass:
+            generator.build_mode = 'single_pass'
+        if args.layout_decorations:
+            generator.template_decorations = 'layout'
+        if args.no_image_cache:
+            generator.image_cache = None
+        if args.api_base_url:
+            # Один хост для всех провайдеров; у OpenAI путь API начинается с /v1
+            base_url = args.api_base_url.rstrip('/')
+            generator.api_base_urls = {'anthropic': base_url, 'openai': f"{base_url}/v1", 'google': base_url}
+        if args.no_persist_images:
+            generator.image_store.persist = False
+        if args.image_dpi is not None:
+            generator.image_optimization['dpi'] = args.image_dpi
+        if args.no_image_optimization:
+            generator.image_optimization['enabled'] = False
+        if args.refresh_prompts:
+            generator.refresh_prompts = True
+        if args.clear_prompt_cache and generator.prompt_cache is not None:
+            generator.prompt_cache.clear()
+        if args.full_rebuild:
+            generator.incremental_build = False
+        if args.resume:
+            generator.resume = True
+        if args.dry_run:
+            sys.exit(generator.dry_run())
+        if args.batch:
+            sys.exit(generator.run_batch(args.batch, output_dir=args.batch_output, engine=args.engine))
+        generator.run(engine=args.engine)
 
 
 if __name__ == "__main__":
-    generator = RWTechPPTXGenerator()
-    generator.run()
\ No newline at end of file
+    main()
\ No newline at end of file
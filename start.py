@@ -12,6 +12,7 @@ RW Tech PPTX Generator - Main Startup File
 import sys
 import os
 import platform
+import importlib.util
 from datetime import datetime
 
 def check_python_version():
@@ -43,11 +44,11 @@ def check_dependencies():
     
     missing_packages = []
     
+    # find_spec проверяет наличие пакета без его импорта (импорт pptx/requests занимает время)
     for package_name, import_name in required_packages:
-        try:
-            __import__(import_name)
+        if importlib.util.find_spec(import_name) is not None:
             print(f"✓ {package_name} - установлен")
-        except ImportError:
+        else:
             print(f"❌ {package_name} - НЕ установлен")
             missing_packages.append(package_name)
     
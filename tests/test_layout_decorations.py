@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Изображения шаблона в макете (template_decorations='layout') на установленной версии python-pptx
+
+_install_template_decorations опирается на внутренности oxml python-pptx; тест ловит
+их изменение при обновлении библиотеки раньше, чем тихий переход на 'per_slide'.
+"""
+
+import os
+import sys
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rwtech_pptx_generator as generator_module  # noqa: E402
+
+CONTENT_FILE = os.path.join(generator_module.PROJECT_DIR, "pptx_content", "slide_content.txt")
+PICTURE = 13  # MSO_SHAPE_TYPE.PICTURE
+
+
+def test_template_pictures_installed_in_layout(monkeypatch, tmp_path):
+    """Рисунки шаблона попадают в пустой макет один раз, а не на каждый слайд"""
+    from pptx import Presentation
+
+    monkeypatch.setenv('RWTECH_CONFIG', str(tmp_path / "config.json"))
+    with open(CONTENT_FILE, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    result = generator_module.generate_deck(
+        content,
+        workspace={'root': str(tmp_path / "runs")},
+        options={'template_decorations': 'layout'}
+    )
+
+    prs = Presentation(BytesIO(result['pptx']))
+    layout_pictures = [shape for shape in prs.slide_layouts[6].shapes if shape.shape_type == PICTURE]
+    slide_pictures = [shape for slide in prs.slides for shape in slide.shapes if shape.shape_type == PICTURE]
+    shape_ids = [shape.shape_id for shape in prs.slide_layouts[6].shapes]
+
+    assert layout_pictures, "режим 'layout' откатился на 'per_slide'"
+    assert not slide_pictures
+    assert len(shape_ids) == len(set(shape_ids))
+    assert all(picture.image.blob for picture in layout_pictures)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Смоук-тест AI-генерации против mock_provider_server.py: без сети и настоящих ключей API
+
+Запуск:
+    python -m pytest -q tests/
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rwtech_pptx_generator as generator_module  # noqa: E402
+from mock_provider_server import MockProviderServer, ProviderBehavior  # noqa: E402
+
+CONTENT_FILE = os.path.join(generator_module.PROJECT_DIR, "pptx_content", "slide_content.txt")
+
+
+def test_ai_deck_survives_429_burst(monkeypatch, tmp_path):
+    """Колода с иллюстрациями DALL-E 3 собирается, а всплеск 429 отрабатывается повторами"""
+    # Ключи - из окружения, config.json разработчика не читается
+    monkeypatch.setenv('RWTECH_CONFIG', str(tmp_path / "config.json"))
+    monkeypatch.setenv('CLAUDE_API_KEY', 'mock-key')
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock-key')
+
+    # Каждый второй запрос к OpenAI (начиная с первого запроса изображения) - 429
+    behaviors = {'openai': ProviderBehavior(burst_every=2, burst_length=1, retry_after=0.05)}
+    with open(CONTENT_FILE, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    with MockProviderServer(behaviors=behaviors, image_kb=64, seed=1) as server:
+        result = generator_module.generate_deck(
+            content,
+            use_ai=True,
+            slide_interval=20,
+            image_model='dall-e-3',
+            engine='threads',
+            workspace={'root': str(tmp_path / "runs")},
+            options={
+                'api_base_urls': {'anthropic': server.base_url,
+                                  'openai': f"{server.base_url}/v1",
+                                  'google': server.base_url},
+                'retry_policy': generator_module.RetryPolicy(base_delay=0.05, max_delay=0.2),
+                'image_cache': None,
+                'prompt_cache': None,
+            }
+        )
+        requests_stats = server.snapshot()
+
+    stats = result['stats']
+    assert result['pptx'][:2] == b'PK'
+    assert result['slides'] == 60
+    assert stats['images_inserted'] == 3
+    assert stats['total_retries'] > 0
+    assert requests_stats['openai']['rate_limited'] > 0
+    assert requests_stats['anthropic']['ok'] >= 3